@@ -0,0 +1,250 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # only needed to export
+    pa = None
+
+# Same default as app.py, without importing the app
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.environ.get('GAMS_DATABASE') or os.path.join(BASE_DIR, 'GAMS_database.db')
+EXPORT_DIR = os.path.join(BASE_DIR, 'analytics')
+MANIFEST = '_manifest.json'
+
+# Each dataset: how its rows split into partitions, a fingerprint query
+# whose rows change whenever a row of the partition they fall in does
+# (a date stands in for its term), the rows of one partition, and the
+# column types. 'key' and 'label' columns are
+# dictionary-encoded, which is what keeps ids and statuses small: as
+# Parquet dictionary pages (read back as plain columns, so partitions
+# combine freely), or as dictionary arrays in Arrow IPC files.
+# Partition columns are stored only in the directory names.
+DATASETS = {
+    'attendance': {
+        'partition': ('term', 'subject_id'),
+        # Per day rather than per term: this order streams off ix_attendance_subject_date
+        'fingerprint': """
+            SELECT date, subject_id, COUNT(*), TOTAL(id), TOTAL(version), MAX(updated_at)
+            FROM attendance GROUP BY subject_id, date ORDER BY subject_id, date
+        """,
+        'rows': """
+            SELECT id, student_id, teacher_id, subject_id, class_id, date, status, updated_at, version
+            FROM attendance
+            WHERE subject_id = :subject_id AND date >= :start AND date < :end
+            ORDER BY date, student_id
+        """,
+        'columns': [('id', 'int'), ('student_id', 'key'), ('teacher_id', 'key'), ('subject_id', 'key'),
+                    ('class_id', 'key'), ('date', 'date'), ('status', 'label'), ('updated_at', 'timestamp'),
+                    ('version', 'int')],
+    },
+    'grade': {
+        'partition': ('term', 'subject_id'),
+        'fingerprint': """
+            SELECT substr(date, 1, 10) AS day, subject_id,
+                   COUNT(*), TOTAL(id), TOTAL(version), TOTAL(grade), TOTAL(category_id), MAX(date)
+            FROM grade GROUP BY subject_id, day ORDER BY subject_id, day
+        """,
+        'rows': """
+            SELECT id, student_id, teacher_id, subject_id, category_id, grade, date, version
+            FROM grade
+            WHERE subject_id = :subject_id
+              AND (date >= :start AND date < :end OR :start IS NULL AND date IS NULL)
+            ORDER BY student_id, category_id
+        """,
+        'columns': [('id', 'int'), ('student_id', 'key'), ('teacher_id', 'key'), ('subject_id', 'key'),
+                    ('category_id', 'key'), ('grade', 'float'), ('date', 'timestamp'), ('version', 'int')],
+    },
+    'grade_category': {
+        'partition': (),
+        'fingerprint': """
+            SELECT COUNT(*), TOTAL(id), group_concat(id || ':' || name || ':' || subject_id || ':' || teacher_id)
+            FROM grade_category
+        """,
+        'rows': "SELECT id, name, teacher_id, subject_id, created_date FROM grade_category ORDER BY id",
+        'columns': [('id', 'int'), ('name', 'label'), ('teacher_id', 'key'), ('subject_id', 'key'),
+                    ('created_date', 'timestamp')],
+    },
+    # Subject enrollments, plus section membership with the section's subject
+    'enrollment': {
+        'partition': ('subject_id',),
+        'fingerprint': """
+            SELECT subject_id, COUNT(*), TOTAL(id), TOTAL(student_id), TOTAL(class_id) FROM (
+                SELECT subject_id, id, student_id, 0 AS class_id FROM student_subject
+                UNION ALL
+                SELECT c.subject_id, -cs.id, cs.student_id, cs.class_id
+                FROM class_student cs JOIN class c ON c.id = cs.class_id
+            ) GROUP BY subject_id ORDER BY subject_id
+        """,
+        'rows': """
+            SELECT student_id, subject_id, NULL AS class_id, date_joined
+            FROM student_subject WHERE subject_id = :subject_id
+            UNION ALL
+            SELECT cs.student_id, c.subject_id, cs.class_id, cs.date_joined
+            FROM class_student cs JOIN class c ON c.id = cs.class_id WHERE c.subject_id = :subject_id
+            ORDER BY student_id
+        """,
+        'columns': [('student_id', 'key'), ('subject_id', 'key'), ('class_id', 'key'), ('date_joined', 'date')],
+    },
+}
+
+def _term_of(day):
+    """attendance_bitmap.term_for() on a stored date string: January-June is T1"""
+    if day is None:
+        return 'undated'
+    return f"{day[:4]}-T{1 if day[5:7] <= '06' else 2}"
+
+def _term_range(term):
+    """[start, end) date strings for a term, as compared against stored dates"""
+    if term == 'undated':
+        return None, None
+    year, half = int(term[:4]), term[-1]
+    if half == '1':
+        return f'{year:04d}-01-01', f'{year:04d}-07-01'
+    return f'{year:04d}-07-01', f'{year + 1:04d}-01-01'
+
+DICTIONARY_KINDS = ('key', 'label')
+
+def _column(values, kind, dictionary):
+    if kind in DICTIONARY_KINDS:
+        array = pa.array(values, pa.int64() if kind == 'key' else pa.string())
+        return array.dictionary_encode() if dictionary else array
+    if kind == 'date':
+        return pc.cast(pa.array(values, pa.string()), pa.date32())
+    if kind == 'timestamp':
+        return pc.cast(pa.array(values, pa.string()), pa.timestamp('us'))
+    return pa.array(values, pa.float64() if kind == 'float' else pa.int64())
+
+def _table(rows, columns, dictionary):
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pa.table({
+        name: _column(list(column), kind, dictionary) for (name, kind), column in zip(columns, values)
+    })
+
+def _write(table, path, fmt, dictionary_columns):
+    """Write next to the old file and swap it in, so readers never see half a partition"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.tmp'
+    if fmt == 'parquet':
+        pq.write_table(table, temporary, compression='zstd', use_dictionary=dictionary_columns)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.OSFile(temporary, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    os.replace(temporary, path)
+
+def _partition_dir(out_dir, dataset, names, values):
+    """Hive-style directories (term=2024-T2/subject_id=3) that dataset readers understand"""
+    return os.path.join(out_dir, dataset, *(f'{name}={value}' for name, value in zip(names, values)))
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def export(db_path=DB_PATH, out_dir=EXPORT_DIR, fmt='parquet', datasets=None, full=False):
+    """Rewrite only the partitions whose fingerprint changed since the last export.
+
+    Fingerprints and rows are read in one read transaction, so the files
+    always match the fingerprints recorded for them. A dataset last
+    exported in another format is rewritten whole. Returns
+    {dataset: (partitions, rewritten, removed, rows written)}.
+    """
+    if pa is None:
+        raise RuntimeError('The analytics export needs pyarrow: pip install pyarrow')
+    extension = 'parquet' if fmt == 'parquet' else 'arrow'
+    manifest = _load_manifest(out_dir)
+    # Manifests from before formats were kept per dataset had one for all
+    formats = manifest.setdefault('formats', dict.fromkeys(manifest.get('datasets', {}), manifest.pop('format', None)))
+    summary = {}
+
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30.0)
+    try:
+        conn.execute('BEGIN')
+        for dataset in datasets or DATASETS:
+            spec = DATASETS[dataset]
+            names = spec['partition']
+            rewrite_all = full or formats.get(dataset) != fmt
+            previous = {} if rewrite_all else manifest.get('datasets', {}).get(dataset, {})
+            if rewrite_all:
+                shutil.rmtree(os.path.join(out_dir, dataset), ignore_errors=True)
+
+            hashes = {}
+            partitions = {}
+            for row in conn.execute(spec['fingerprint']):
+                values, rest = list(row[:len(names)]), row[len(names):]
+                if 'term' in names:
+                    values[names.index('term')] = _term_of(values[names.index('term')])
+                key = '/'.join(f'{name}={value}' for name, value in zip(names, values))
+                if key not in hashes:
+                    hashes[key] = hashlib.sha1()
+                    partitions[key] = dict(zip(names, values))
+                hashes[key].update(repr(rest).encode())
+            current = {key: digest.hexdigest() for key, digest in hashes.items()}
+
+            rewritten = written = 0
+            for key, fingerprint in current.items():
+                if previous.get(key) == fingerprint:
+                    continue
+                params = dict(partitions[key])
+                if 'term' in params:
+                    params['start'], params['end'] = _term_range(params['term'])
+                rows = conn.execute(spec['rows'], params).fetchall()
+                columns = [(name, kind) for name, kind in spec['columns'] if name not in names]
+                table = _table(rows, spec['columns'], dictionary=fmt == 'arrow').select([name for name, _ in columns])
+                directory = _partition_dir(out_dir, dataset, names, partitions[key].values())
+                _write(table, os.path.join(directory, f'part.{extension}'), fmt,
+                       [name for name, kind in columns if kind in DICTIONARY_KINDS])
+                rewritten += 1
+                written += len(rows)
+
+            removed = [key for key in previous if key not in current]
+            for key in removed:
+                shutil.rmtree(os.path.join(out_dir, dataset, key), ignore_errors=True)
+
+            manifest.setdefault('datasets', {})[dataset] = current
+            formats[dataset] = fmt
+            summary[dataset] = (len(current), rewritten, len(removed), written)
+    finally:
+        conn.close()
+
+    manifest['exported_at'] = time.time()
+    _save_manifest(out_dir, manifest)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export attendance, grades, categories and enrollment to partitioned columnar files.')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite database file')
+    parser.add_argument('--out', default=EXPORT_DIR, help='Export directory')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet',
+                        help='Parquet, or Arrow IPC files')
+    parser.add_argument('--dataset', action='append', choices=sorted(DATASETS), help='Only these datasets')
+    parser.add_argument('--full', action='store_true', help='Rewrite every partition')
+    args = parser.parse_args()
+
+    try:
+        start = time.perf_counter()
+        summary = export(args.db, args.out, args.format, args.dataset, args.full)
+        for dataset, (partitions, rewritten, removed, rows) in summary.items():
+            print(f"{dataset:<16} {partitions:>5} partitions, {rewritten:>5} rewritten ({rows} rows), {removed} removed")
+        print(f"Exported to {args.out} in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"Error during export: {str(e)}")
+        raise
@@ -4,10 +4,31 @@ from datetime import datetime
 from models import db, User, Student, Teacher, Attendance, Grade, Class, ClassStudent, Subject, StudentSubject, GradeCategory, init_db
 import os
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from roster_cache import roster_cache
+from teacher_summary import teacher_summary
+from change_journal import change_journal
+from identity_cache import identity_cache
+import assets
+from compression import CompressionMiddleware
+import attendance_bitmap
+import attendance_rollup
+import search_index
+import attendance_sheet
+import attendance_sync
+import transcripts
+import migrations
+from rate_limit import rate_limiter
+import metrics
+from profiling import request_profiler
+from slow_queries import slow_query_log
+from write_queue import write_queue
+from tenants import tenant_router
 
 # Get absolute path for database file
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'GAMS_database.db')
+DB_PATH = os.environ.get('GAMS_DATABASE') or os.path.join(BASE_DIR, 'GAMS_database.db')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this to a secure secret key
@@ -17,23 +38,84 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
     'pool_recycle': 300,
 }
+app.config['ROSTER_CACHE_TTL'] = 300  # seconds; bounds staleness across worker processes
+app.config['TEACHER_SUMMARY_TTL'] = 60  # seconds; dashboard figures are also dropped on the teacher's own writes
+app.config['CHANGE_JOURNAL_FLUSH_INTERVAL'] = 2.0  # seconds between journal batch writes
+app.config['SESSION_IDENTITY_CACHE'] = False  # serve current_user from a signed session record
+app.config['SESSION_IDENTITY_TTL'] = 60  # seconds before the record is re-read from the DB
+app.config['COMPRESS_MIN_SIZE'] = 500  # bytes; smaller responses are sent uncompressed
+app.config['COMPRESS_LEVEL'] = 6
+app.config['ATTENDANCE_PAGE_SIZE'] = 50  # roster rows rendered per page
+app.config['ATTENDANCE_SYNC_MAX_BATCHES'] = 200  # offline batches accepted per sync request
+app.config['RATE_LIMIT_ENABLED'] = True
+app.config['RATE_LIMIT_BACKEND'] = 'memory'  # use 'sqlite' to share limits across worker processes
+app.config['METRICS_DIR'] = os.environ.get('GAMS_METRICS_DIR')  # shared by all workers; defaults to a temp dir
+app.config['METRICS_FLUSH_INTERVAL'] = 5.0  # seconds between per-process snapshots
+app.config['METRICS_TOKEN'] = os.environ.get('GAMS_METRICS_TOKEN')  # bearer token required by /metrics when set
+app.config['PROFILE_ENABLED'] = os.environ.get('GAMS_PROFILE') == '1'  # off: no profiling hooks are installed
+app.config['PROFILE_DIR'] = os.environ.get('GAMS_PROFILE_DIR')  # defaults to a temp dir
+app.config['PROFILE_TOKEN'] = os.environ.get('GAMS_PROFILE_TOKEN')  # lets 'X-Profile: <token>' profile any user's request
+app.config['PROFILE_MODE'] = 'cprofile'  # or 'sample' for collapsed stacks
+app.config['PROFILE_SAMPLE_RATE'] = 0.0  # fraction of requests profiled without the header
+app.config['PROFILE_ENDPOINTS'] = None  # restrict sampling to these endpoints, e.g. {'student_grades'}
+app.config['SLOW_QUERY_LOG'] = True  # report with: python slow_queries.py --top 10
+app.config['SLOW_QUERY_THRESHOLD_MS'] = 100
+app.config['WRITE_QUEUE_ENABLED'] = os.environ.get('GAMS_WRITE_QUEUE') == '1'  # serialize writes through one thread
+app.config['WRITE_QUEUE_WINDOW'] = 0.01  # seconds of writes grouped into one commit
+app.config['WRITE_QUEUE_MAX_BATCH'] = 64
+app.config['TENANT_MODE'] = os.environ.get('GAMS_TENANT_MODE')  # 'subdomain' or 'path' to serve several schools
+app.config['TENANT_DOMAIN'] = os.environ.get('GAMS_TENANT_DOMAIN')  # subdomain mode: <school>.<domain>
+app.config['TENANT_PATH_PREFIX'] = '/s'  # path mode: /s/<school>/...
+app.config['TENANT_DIR'] = os.environ.get('GAMS_TENANT_DIR')  # one <school>.db per school; defaults to ./tenants
+app.config['TENANT_ENGINE_CACHE'] = 16  # school databases kept open per process
 
 # Initialize extensions
 db.init_app(app)
+tenant_router.init_app(app)
+tenant_router.on_engine(lambda engine: metrics.instrument_engine(engine, pool_gauges=False))
+tenant_router.on_engine(request_profiler.attach)
+tenant_router.on_engine(slow_query_log.attach)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+roster_cache.ttl = app.config['ROSTER_CACHE_TTL']
+teacher_summary.ttl = app.config['TEACHER_SUMMARY_TTL']
+metrics.init_app(app)
+identity_cache.init_app(app)
+assets.init_app(app)
+rate_limiter.init_app(app)
+write_queue.init_app(app)
+app.wsgi_app = CompressionMiddleware(
+    app.wsgi_app,
+    min_size=app.config['COMPRESS_MIN_SIZE'],
+    level=app.config['COMPRESS_LEVEL']
+)
 
 # Initialize database
 with app.app_context():
+    metrics.instrument_engine(db.engine)
+    request_profiler.init_app(app, db.engine)
+    slow_query_log.init_app(app, db.engine)
+    # New tables come from create_all; changes to existing ones are migrations
     db.create_all()
+    migrations.upgrade(db.engine)
     # Only initialize if no users exist
     if not User.query.first():
         init_db(app)  # This will handle subject creation and other initialization
+    search_index.install()
+
+change_journal.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    if identity_cache.enabled:
+        identity = identity_cache.load(user_id)
+        if identity:
+            return identity
+    user = db.session.get(User, int(user_id))
+    if user and identity_cache.enabled:
+        identity_cache.store(user)
+    return user
 
 @app.route('/')
 def index():
@@ -94,6 +176,7 @@ def login():
 @login_required
 def logout():
     logout_user()
+    identity_cache.clear()
     return redirect(url_for('index'))
 
 @app.route('/dashboard')
@@ -102,7 +185,10 @@ def dashboard():
     if current_user.role == 'admin':
         return render_template('admin_dashboard.html')
     elif current_user.role == 'teacher':
-        return render_template('teacher_dashboard.html', active_page='dashboard')
+        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+        # Cached per teacher; recomputed after their own attendance or grade saves
+        summary = teacher_summary.get(teacher) if teacher else None
+        return render_template('teacher_dashboard.html', active_page='dashboard', summary=summary)
     else:
         student = Student.query.filter_by(user_id=current_user.id).first()
         return render_template('student_dashboard.html', student=student, user=current_user)
@@ -150,6 +236,34 @@ def attendance():
         attendance_by_subject=attendance_by_subject
     )
 
+@app.route('/attendance/calendar')
+@login_required
+def attendance_calendar():
+    if current_user.role != 'student':
+        return jsonify({'error': 'Students only'}), 403
+    
+    student = Student.query.filter_by(user_id=current_user.id).first()
+    if not student:
+        return jsonify({'error': 'Student record not found'}), 404
+    
+    term = request.args.get('term') or attendance_bitmap.term_for(datetime.now().date())
+    subject_names = {subject.id: subject.name for subject in student.subjects}
+    summary = attendance_bitmap.student_summary(student.id, term)
+    
+    return jsonify({
+        'term': term,
+        'subjects': [
+            {
+                'subject': subject_names.get(subject_id, subject_id),
+                'percentage': round(data['percentage'], 1),
+                'streak': data['streak'],
+                'counts': data['counts'],
+                'calendar': [[day.isoformat(), status] for day, status in data['calendar']]
+            }
+            for subject_id, data in summary.items()
+        ]
+    })
+
 @app.route('/student/register', methods=['GET', 'POST'])
 def student_register():
     if request.method == 'POST':
@@ -302,10 +416,19 @@ def teacher_attendance():
             flash('Subject not found.', 'error')
             return redirect(url_for('dashboard'))
         
-        # Get students who have selected this teacher's subject
-        students = Student.query.join(StudentSubject).join(Subject).filter(
-            Subject.id == teacher.subject_id
-        ).all()
+        # Sections of this subject taught by the teacher
+        classes = Class.query.filter_by(
+            teacher_id=teacher.id,
+            subject_id=teacher.subject_id
+        ).order_by(Class.name).all()
+        
+        class_id = request.args.get('class_id', type=int)
+        if class_id is not None and class_id not in {c.id for c in classes}:
+            flash('Class not found.', 'error')
+            return redirect(url_for('teacher_attendance'))
+        
+        # Cached roster of the selected section, or of the whole subject
+        students = roster_cache.get(teacher.subject_id, class_id)
         
         if request.method == 'POST':
             try:
@@ -313,57 +436,83 @@ def teacher_attendance():
                 
                 if not date:
                     flash('Please select a date.', 'error')
-                    return redirect(url_for('teacher_attendance'))
-                
-                # Begin a new transaction
-                db.session.begin_nested()
+                    return redirect(url_for('teacher_attendance', class_id=class_id))
                 
-                # Process attendance for each student
+                # Read the submitted rows here; the write may run on the writer thread
+                submitted = {}
                 for student in students:
                     status = request.form.get(f'status_{student.id}')
-                    notes = request.form.get(f'notes_{student.id}')
+                    if status is not None:
+                        # Rows on other pages of the roster are not submitted
+                        submitted[student.id] = (status, request.form.get(f'notes_{student.id}'))
+                
+                def save_attendance():
+                    # Load existing records for this roster and date in one query
+                    existing = {
+                        record.student_id: record
+                        for record in Attendance.query.filter(
+                            Attendance.teacher_id == teacher.id,
+                            Attendance.subject_id == teacher.subject_id,
+                            Attendance.date == date,
+                            Attendance.student_id.in_(list(submitted))
+                        )
+                    }
                     
-                    # Check if attendance record already exists
-                    attendance = Attendance.query.filter_by(
-                        student_id=student.id,
-                        teacher_id=teacher.id,
-                        subject_id=teacher.subject_id,
-                        date=date
-                    ).first()
+                    # Process attendance for each student
+                    marked = []
+                    for student_id, (status, notes) in submitted.items():
+                        marked.append((student_id, status))
+                        
+                        attendance = existing.get(student_id)
+                        if attendance:
+                            # Update existing record
+                            attendance.status = status
+                            attendance.notes = notes
+                            if class_id is not None:
+                                attendance.class_id = class_id
+                        else:
+                            # Create new record
+                            attendance = Attendance(
+                                student_id=student_id,
+                                teacher_id=teacher.id,
+                                subject_id=teacher.subject_id,
+                                class_id=class_id,
+                                date=date,
+                                status=status,
+                                notes=notes
+                            )
+                            db.session.add(attendance)
                     
-                    if attendance:
-                        # Update existing record
-                        attendance.status = status
-                        attendance.notes = notes
-                    else:
-                        # Create new record
-                        attendance = Attendance(
-                            student_id=student.id,
-                            teacher_id=teacher.id,
-                            subject_id=teacher.subject_id,
-                            date=date,
-                            status=status,
-                            notes=notes
-                        )
-                        db.session.add(attendance)
+                    # Keep the packed per-term copy and the daily rollup in the same transaction
+                    attendance_bitmap.record_marks(teacher.subject_id, date, marked)
+                    attendance_rollup.refresh_day(teacher.subject_id, date)
+                    return marked
                 
-                # Commit the transaction
-                db.session.commit()
+                marked = write_queue.run(save_attendance)
+                for student_id, status in marked:
+                    change_journal.record_attendance(teacher.id, teacher.subject_id, student_id, date, status)
                 flash('Attendance saved successfully.', 'success')
-                return redirect(url_for('teacher_attendance'))
+                return redirect(url_for('teacher_attendance', class_id=class_id))
             
+            except StaleDataError:
+                flash('Someone else changed this attendance while you were saving. Please review and try again.', 'error')
+                return redirect(url_for('teacher_attendance', class_id=class_id))
             except Exception as e:
-                db.session.rollback()
                 flash('Error saving attendance. Please try again.', 'error')
                 app.logger.error(f'Error saving attendance: {str(e)}')
-                return redirect(url_for('teacher_attendance'))
+                return redirect(url_for('teacher_attendance', class_id=class_id))
         
+        page_size = app.config['ATTENDANCE_PAGE_SIZE']
         return render_template(
             'teacher_attendance.html',
             current_date=datetime.now(),
-            students=students,
+            students=students[:page_size],
+            total_students=len(students),
+            page_size=page_size,
             teacher=teacher,
-            subject=subject
+            subject=subject,
+            classes=classes,
+            class_id=class_id
         )
     
     except Exception as e:
@@ -371,6 +520,160 @@ def teacher_attendance():
         flash('An error occurred. Please try again.', 'error')
         return redirect(url_for('dashboard'))
 
+@app.route('/teacher/attendance/roster')
+@login_required
+def teacher_attendance_roster():
+    if not current_user.is_teacher:
+        return jsonify({'error': 'Teachers only'}), 403
+    
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    if not teacher:
+        return jsonify({'error': 'Teacher record not found'}), 404
+    
+    class_id = request.args.get('class_id', type=int)
+    if class_id is not None and not Class.query.filter_by(id=class_id, teacher_id=teacher.id).first():
+        return jsonify({'error': 'Class not found'}), 404
+    
+    try:
+        date = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        date = datetime.now().date()
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', app.config['ATTENDANCE_PAGE_SIZE'], type=int), 1), 500)
+    
+    roster = roster_cache.get(teacher.subject_id, class_id)
+    page_students = roster[(page - 1) * per_page:page * per_page]
+    
+    # Existing marks for just this page
+    records = {
+        record.student_id: record
+        for record in Attendance.query.filter(
+            Attendance.teacher_id == teacher.id,
+            Attendance.subject_id == teacher.subject_id,
+            Attendance.date == date,
+            Attendance.student_id.in_([student.id for student in page_students])
+        )
+    }
+    
+    return jsonify({
+        'date': date.isoformat(),
+        'page': page,
+        'per_page': per_page,
+        'total': len(roster),
+        'students': [
+            {
+                'id': student.id,
+                'student_id': student.student_id,
+                'name': f'{student.first_name} {student.last_name}',
+                'status': records[student.id].status if student.id in records else None,
+                'notes': records[student.id].notes if student.id in records else None,
+                'version': records[student.id].version if student.id in records else 0
+            }
+            for student in page_students
+        ]
+    })
+
+@app.route('/teacher/attendance/trend')
+@login_required
+def teacher_attendance_trend():
+    if not current_user.is_teacher:
+        return jsonify({'error': 'Teachers only'}), 403
+    
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    if not teacher:
+        return jsonify({'error': 'Teacher record not found'}), 404
+    
+    try:
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end = datetime.now().date()
+    days = request.args.get('days', 90, type=int)
+    
+    # 7/30/90-day rolling rates from the daily rollup, never the attendance table
+    return jsonify(attendance_rollup.trend(teacher.subject_id, end, days))
+
+@app.route('/teacher/attendance/submit', methods=['POST'])
+@login_required
+def teacher_attendance_submit():
+    if not current_user.is_teacher:
+        return jsonify({'error': 'Teachers only'}), 403
+    
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    if not teacher:
+        return jsonify({'error': 'Teacher record not found'}), 404
+    
+    payload = request.get_json(silent=True) or {}
+    class_id = payload.get('class_id')
+    if class_id is not None and not Class.query.filter_by(id=class_id, teacher_id=teacher.id).first():
+        return jsonify({'error': 'Class not found'}), 404
+    
+    try:
+        date = datetime.strptime(payload.get('date', ''), '%Y-%m-%d').date()
+        exceptions = attendance_sheet.parse_exceptions(payload.get('exceptions'))
+        versions = attendance_sheet.parse_versions(payload.get('exceptions'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e) or 'Invalid payload'}), 400
+    
+    roster_ids = {student.id for student in roster_cache.get(teacher.subject_id, class_id)}
+    unknown = [student_id for student_id in exceptions if student_id not in roster_ids]
+    if unknown:
+        return jsonify({'error': 'Students not on this roster', 'student_ids': unknown}), 400
+    
+    try:
+        changed, conflicts = write_queue.run(
+            attendance_sheet.apply_sheet,
+            teacher, date, payload.get('default', 'present'), exceptions,
+            class_id=class_id, keep_existing=bool(payload.get('keep_existing')), versions=versions
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except StaleDataError:
+        return jsonify({'error': 'Attendance changed while saving, please reload and try again'}), 409
+    except Exception as e:
+        app.logger.error(f'Error saving attendance: {str(e)}')
+        return jsonify({'error': 'Error saving attendance'}), 500
+    
+    for student_id, status in changed:
+        change_journal.record_attendance(teacher.id, teacher.subject_id, student_id, date, status)
+    
+    return jsonify({
+        'date': date.isoformat(),
+        'roster': len(roster_ids),
+        'changed': len(changed),
+        'conflicts': conflicts
+    })
+
+@app.route('/teacher/attendance/sync', methods=['POST'])
+@login_required
+def teacher_attendance_sync():
+    if not current_user.is_teacher:
+        return jsonify({'error': 'Teachers only'}), 403
+    
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    if not teacher:
+        return jsonify({'error': 'Teacher record not found'}), 404
+    
+    payload = request.get_json(silent=True) or {}
+    batches = payload.get('batches')
+    if not isinstance(batches, list) or not batches:
+        return jsonify({'error': 'No batches supplied'}), 400
+    if len(batches) > app.config['ATTENDANCE_SYNC_MAX_BATCHES']:
+        return jsonify({'error': 'Too many batches in one sync'}), 413
+    
+    roster_ids = {student.id for student in roster_cache.get(teacher.subject_id)}
+    try:
+        acks, changed = write_queue.run(attendance_sync.apply_batches, teacher, batches, roster_ids)
+    except Exception as e:
+        app.logger.error(f'Error syncing attendance: {str(e)}')
+        return jsonify({'error': 'Error syncing attendance, please retry'}), 500
+    
+    for date, marks in changed.items():
+        for student_id, status in marks:
+            change_journal.record_attendance(teacher.id, teacher.subject_id, student_id, date, status)
+    
+    return jsonify({'acks': acks})
+
 @app.route('/teacher/grade_categories', methods=['GET', 'POST'])
 @login_required
 def teacher_grade_categories():
@@ -460,6 +763,8 @@ def teacher_grades(category_id):
         if request.method == 'POST':
             student_id = request.form.get('student_id')
             grade_value = request.form.get('grade')
+            # Version of the grade the form was rendered with; 0 if there was none
+            seen_version = request.form.get('version', type=int)
             
             if not student_id or not grade_value:
                 flash('Missing required fields.', 'error')
@@ -470,34 +775,48 @@ def teacher_grades(category_id):
                 if not (0 <= grade_value <= 100):
                     raise ValueError("Grade must be between 0 and 100")
                 
-                # Check if grade exists
-                grade = Grade.query.filter_by(
-                    student_id=student_id,
-                    category_id=category_id
-                ).first()
-                
-                if grade:
-                    # Update existing grade
-                    grade.grade = grade_value
-                    grade.date = datetime.utcnow()
-                else:
-                    # Create new grade
-                    grade = Grade(
+                def save_grade():
+                    # Check if grade exists
+                    grade = Grade.query.filter_by(
                         student_id=student_id,
-                        teacher_id=teacher.id,
-                        subject_id=subject.id,
-                        category_id=category_id,
-                        grade=grade_value
-                    )
-                    db.session.add(grade)
+                        category_id=category_id
+                    ).first()
+                    
+                    if seen_version is not None and seen_version != (grade.version if grade else 0):
+                        # Changed since this page was loaded; report instead of overwriting
+                        return False, grade.grade if grade else None
+                    
+                    if grade:
+                        # Update existing grade
+                        grade.grade = grade_value
+                        grade.date = datetime.utcnow()
+                    else:
+                        # Create new grade
+                        grade = Grade(
+                            student_id=student_id,
+                            teacher_id=teacher.id,
+                            subject_id=subject.id,
+                            category_id=category_id,
+                            grade=grade_value
+                        )
+                        db.session.add(grade)
+                    return True, grade_value
                 
-                db.session.commit()
-                flash('Grade saved successfully!', 'success')
+                saved, current = write_queue.run(save_grade)
+                if not saved:
+                    current = 'not graded' if current is None else f'{current:.2f}%'
+                    flash(f'This grade was changed by someone else (now {current}). '
+                          f'Your value of {grade_value:.2f}% was not saved; review it and submit again.', 'error')
+                else:
+                    change_journal.record_grade(teacher.id, subject.id, student_id, category_id, grade_value)
+                    flash('Grade saved successfully!', 'success')
                 
             except ValueError as e:
                 flash(str(e), 'error')
+            except (StaleDataError, IntegrityError):
+                # IntegrityError: another save inserted this student's first grade at the same time
+                flash('This grade was changed while saving. Review it and submit again.', 'error')
             except Exception as e:
-                db.session.rollback()
                 flash('Error saving grade. Please try again.', 'error')
                 print(f"Error saving grade: {str(e)}")
         
@@ -512,6 +831,7 @@ def teacher_grades(category_id):
         # Get grades
         student_grades = {}
         grade_dates = {}
+        grade_versions = {}
         for student in students:
             grade = Grade.query.filter_by(
                 student_id=student.id,
@@ -520,9 +840,11 @@ def teacher_grades(category_id):
             if grade:
                 student_grades[student.id] = grade.grade
                 grade_dates[student.id] = grade.date
+                grade_versions[student.id] = grade.version
             else:
                 student_grades[student.id] = None
                 grade_dates[student.id] = None
+                grade_versions[student.id] = 0
         
         return render_template('teacher_grades.html',
                              teacher=teacher,
@@ -530,7 +852,8 @@ def teacher_grades(category_id):
                              category=category,
                              students=students,
                              student_grades=student_grades,
-                             grade_dates=grade_dates)
+                             grade_dates=grade_dates,
+                             grade_versions=grade_versions)
                              
     except Exception as e:
         print(f"Error in teacher grades: {str(e)}")  # Debug print
@@ -624,6 +947,59 @@ def student_grades():
         flash('An error occurred while loading grades.', 'error')
         return redirect(url_for('dashboard'))
 
+@app.route('/student/transcript')
+@login_required
+def student_transcript():
+    # Admins may view any student's transcript
+    if current_user.is_admin and request.args.get('student_id', type=int):
+        student = db.session.get(Student, request.args.get('student_id', type=int))
+    elif current_user.is_student:
+        student = Student.query.filter_by(user_id=current_user.id).first()
+    else:
+        flash('Access denied. Students only.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    if not student:
+        flash('Student record not found.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    # Frozen term rows only; nothing is recomputed from historical grades
+    record = transcripts.transcript(student.id)
+    return render_template('student_transcript.html',
+                         student=student,
+                         terms=record['terms'],
+                         cumulative_gpa=record['cumulative_gpa'])
+
+@app.route('/search')
+@login_required
+def search():
+    if not (current_user.is_admin or current_user.is_teacher):
+        return jsonify({'error': 'Admins and teachers only'}), 403
+    
+    query = request.args.get('q', '').strip()
+    # At least 1: SQLite reads a negative LIMIT as no limit at all
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    if len(query) < 2:
+        return jsonify({'query': query, 'results': []})
+    
+    if current_user.is_admin:
+        results = search_index.search(query, kind=request.args.get('kind'), limit=limit)
+    else:
+        # Teachers only see students enrolled in their subject
+        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+        if not teacher:
+            return jsonify({'error': 'Teacher record not found'}), 404
+        results = search_index.search(query, kind='student', subject_id=teacher.subject_id, limit=limit)
+    
+    return jsonify({'query': query, 'results': results})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return 'Unauthorized', 401
+    return metrics.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/admin/pending_approvals')
 @login_required
 def pending_approvals():
@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+# Get absolute paths for static assets
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+SOURCE_DIRS = ('css', 'js')
+
+# Fingerprinted files never change, so browsers may keep them forever
+CACHE_SECONDS = 365 * 24 * 60 * 60
+
+_manifest = {}
+
+def build_assets():
+    """Write content-hashed copies of static/css and static/js with .gz/.br variants"""
+    manifest = {}
+    for source_dir in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(STATIC_DIR, source_dir)):
+            for name in sorted(files):
+                source = os.path.join(root, name)
+                relative = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    content = f.read()
+
+                stem, ext = os.path.splitext(relative)
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                fingerprinted = f'{stem}.{digest}{ext}'
+                target = os.path.join(DIST_DIR, fingerprinted)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+
+                with open(target, 'wb') as f:
+                    f.write(content)
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(content, quality=11))
+
+                manifest[relative] = fingerprinted
+                print(f"{relative} -> {fingerprinted}")
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest():
+    global _manifest
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+    else:
+        _manifest = {}
+    return _manifest
+
+def asset_url(filename):
+    """URL for a static asset, fingerprinted when a build exists"""
+    fingerprinted = _manifest.get(filename)
+    if fingerprinted is None:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=fingerprinted)
+
+def serve_asset(filename):
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype, max_age=CACHE_SECONDS)
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_app(app):
+    load_manifest()
+    app.jinja_env.globals.update(asset_url=asset_url)
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+
+if __name__ == '__main__':
+    build_assets()
+    print(f"Manifest written to {MANIFEST_PATH}")
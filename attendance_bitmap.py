@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta
+from models import db, Attendance, AttendanceBitmap
+
+STATUS_CODES = {'present': 1, 'absent': 2, 'late': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+def term_for(day):
+    """Terms run January-June (T1) and July-December (T2)"""
+    return f"{day.year}-T{1 if day.month <= 6 else 2}"
+
+def term_bounds(term):
+    year, half = int(term[:4]), term[-1]
+    if half == '1':
+        return date(year, 1, 1), date(year, 6, 30)
+    return date(year, 7, 1), date(year, 12, 31)
+
+def set_mark(bits, index, code):
+    """Store a 2-bit code for day `index` in a bytearray, growing it as needed"""
+    byte, shift = divmod(index, 4)
+    if byte >= len(bits):
+        bits.extend(b'\x00' * (byte + 1 - len(bits)))
+    shift *= 2
+    bits[byte] = (bits[byte] & ~(0b11 << shift)) | (code << shift)
+
+def get_mark(bits, index):
+    byte, shift = divmod(index, 4)
+    if byte >= len(bits):
+        return 0
+    return (bits[byte] >> (shift * 2)) & 0b11
+
+def _planes(bits):
+    """Split the packed codes into low and high bit planes"""
+    packed = int.from_bytes(bits, 'little')
+    mask = int.from_bytes(b'\x55' * len(bits), 'little')
+    return packed & mask, (packed >> 1) & mask
+
+def _popcount(value):
+    return bin(value).count('1')
+
+def counts(bits):
+    """Count present/absent/late days with bitwise popcounts"""
+    low, high = _planes(bits)
+    return {
+        'present': _popcount(low & ~high),
+        'absent': _popcount(high & ~low),
+        'late': _popcount(low & high),
+        'total': _popcount(low | high),
+    }
+
+def percentage(bits):
+    tally = counts(bits)
+    return (tally['present'] / tally['total']) * 100 if tally['total'] else 0
+
+def current_streak(bits):
+    """Consecutive present days ending at the latest recorded day"""
+    streak = 0
+    for index in range(len(bits) * 4 - 1, -1, -1):
+        code = get_mark(bits, index)
+        if code == 0:
+            continue
+        if code != STATUS_CODES['present']:
+            break
+        streak += 1
+    return streak
+
+def calendar(bits, term):
+    """(date, status) for every recorded day of the term"""
+    start, _ = term_bounds(term)
+    days = []
+    for index in range(len(bits) * 4):
+        code = get_mark(bits, index)
+        if code:
+            days.append((start + timedelta(days=index), STATUS_NAMES[code]))
+    return days
+
+def record_marks(subject_id, day, marks):
+    """Apply (student_id, status) marks for one day to the bitmaps.
+
+    Call inside the same transaction as the Attendance writes so both
+    representations commit together.
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    term = term_for(day)
+    index = (day - term_bounds(term)[0]).days
+    student_ids = [student_id for student_id, _ in marks]
+    bitmaps = {
+        bitmap.student_id: bitmap
+        for bitmap in AttendanceBitmap.query.filter(
+            AttendanceBitmap.subject_id == subject_id,
+            AttendanceBitmap.term == term,
+            AttendanceBitmap.student_id.in_(student_ids)
+        )
+    }
+    for student_id, status in marks:
+        bitmap = bitmaps.get(student_id)
+        if bitmap is None:
+            bitmap = AttendanceBitmap(student_id=student_id, subject_id=subject_id, term=term, bits=b'')
+            db.session.add(bitmap)
+            bitmaps[student_id] = bitmap
+        bits = bytearray(bitmap.bits or b'')
+        set_mark(bits, index, STATUS_CODES.get(status, 0))
+        bitmap.bits = bytes(bits)
+
+def student_summary(student_id, term):
+    """Percentage, streak and calendar per subject from the bitmaps alone"""
+    summary = {}
+    for bitmap in AttendanceBitmap.query.filter_by(student_id=student_id, term=term):
+        tally = counts(bitmap.bits)
+        summary[bitmap.subject_id] = {
+            'counts': tally,
+            'percentage': percentage(bitmap.bits),
+            'streak': current_streak(bitmap.bits),
+            'calendar': calendar(bitmap.bits, term),
+        }
+    return summary
+
+def rebuild_bitmaps():
+    """Regenerate every bitmap from the attendance table"""
+    AttendanceBitmap.query.delete()
+    packed = {}
+    for student_id, subject_id, day, status in db.session.query(
+        Attendance.student_id, Attendance.subject_id, Attendance.date, Attendance.status
+    ).order_by(Attendance.date):
+        term = term_for(day)
+        bits = packed.setdefault((student_id, subject_id, term), bytearray())
+        set_mark(bits, (day - term_bounds(term)[0]).days, STATUS_CODES.get(status, 0))
+    db.session.add_all(
+        AttendanceBitmap(student_id=student_id, subject_id=subject_id, term=term, bits=bytes(bits))
+        for (student_id, subject_id, term), bits in packed.items()
+    )
+    db.session.commit()
+    return len(packed)
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        try:
+            print(f"Rebuilt {rebuild_bitmaps()} attendance bitmaps")
+        except Exception as e:
+            print(f"Error rebuilding bitmaps: {str(e)}")
+            db.session.rollback()
+            raise
@@ -0,0 +1,131 @@
+import argparse
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import text
+from models import db, AttendanceDaily
+
+WINDOWS = (7, 30, 90)
+MAX_DAYS = 366
+
+COUNTS = """
+    SELECT COALESCE(SUM(status = 'present'), 0), COALESCE(SUM(status = 'absent'), 0),
+           COALESCE(SUM(status = 'late'), 0), COUNT(*)
+    FROM attendance
+"""
+
+REFRESH_DAY = f"""
+    INSERT INTO attendance_daily (subject_id, date, present, absent, late, total)
+    SELECT :subject_id, :day, counts.* FROM ({COUNTS} WHERE subject_id = :subject_id AND date = :day) counts
+    WHERE true
+    ON CONFLICT (subject_id, date) DO UPDATE SET
+        present = excluded.present, absent = excluded.absent,
+        late = excluded.late, total = excluded.total
+"""
+
+def refresh_day(subject_id, day):
+    """Recount one subject's day into the rollup.
+
+    Call in the same transaction as the Attendance writes, after them.
+    Recounting the day off ix_attendance_subject_date, rather than adding
+    deltas, keeps the rollup exact whatever mix of inserts and status
+    changes the save made.
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    db.session.flush()
+    db.session.execute(text(REFRESH_DAY), {'subject_id': subject_id, 'day': day.isoformat()})
+
+def rebuild():
+    """Regenerate the whole rollup from the attendance table"""
+    AttendanceDaily.query.delete()
+    db.session.execute(text("""
+        INSERT INTO attendance_daily (subject_id, date, present, absent, late, total)
+        SELECT subject_id, date, SUM(status = 'present'), SUM(status = 'absent'), SUM(status = 'late'), COUNT(*)
+        FROM attendance GROUP BY subject_id, date
+    """))
+    db.session.commit()
+    return AttendanceDaily.query.count()
+
+def trend(subject_id, end=None, days=90, windows=WINDOWS):
+    """Daily and rolling present rates for the `days` days ending at `end`.
+
+    One range read of the rollup (the span plus the longest window) feeds
+    prefix sums over the calendar; every day, window and the range total
+    is then the difference of two prefix entries.
+    """
+    end = end or date.today()
+    days = min(max(days, 1), MAX_DAYS)
+    start = end - timedelta(days=days - 1)
+    first = start - timedelta(days=max(windows))
+    span = (end - first).days + 1
+
+    present, absent, late, total = ([0] * span for _ in range(4))
+    for row in AttendanceDaily.query.filter(
+        AttendanceDaily.subject_id == subject_id,
+        AttendanceDaily.date >= first,
+        AttendanceDaily.date <= end
+    ):
+        index = (row.date - first).days
+        present[index], absent[index], late[index], total[index] = row.present, row.absent, row.late, row.total
+
+    # sums[k][i] covers days [0, i)
+    sums = {key: [0] + list(accumulate(values))
+            for key, values in (('present', present), ('absent', absent), ('late', late), ('total', total))}
+
+    def between(key, i, j):
+        return sums[key][j] - sums[key][i]
+
+    def rate(i, j):
+        recorded = between('total', i, j)
+        return round(between('present', i, j) * 100 / recorded, 1) if recorded else None
+
+    offset = (start - first).days
+    return {
+        'subject_id': subject_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'dates': [(start + timedelta(days=day)).isoformat() for day in range(days)],
+        'daily': [
+            {key: between(key, offset + day, offset + day + 1) for key in ('present', 'absent', 'late', 'total')}
+            for day in range(days)
+        ],
+        'rolling': {
+            str(window): [rate(offset + day + 1 - window, offset + day + 1) for day in range(days)]
+            for window in windows
+        },
+        'range': {
+            **{key: between(key, offset, span) for key in ('present', 'absent', 'late', 'total')},
+            'rate': rate(offset, span),
+        },
+    }
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Maintain and query the daily attendance rollup.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='Recount every subject and day from the attendance table')
+    trend_parser = commands.add_parser('trend', help="Print a subject's rolling present rates")
+    trend_parser.add_argument('subject_id', type=int)
+    trend_parser.add_argument('--days', type=int, default=30)
+    trend_parser.add_argument('--end', type=date.fromisoformat, help='Last day, e.g. 2024-11-30 (default: today)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            try:
+                print(f"Rebuilt {rebuild()} subject-days")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error rebuilding rollup: {str(e)}")
+                raise
+        else:
+            series = trend(args.subject_id, args.end, args.days)
+            for index, day in enumerate(series['dates']):
+                counts = series['daily'][index]
+                rolling = '  '.join(
+                    f"{window}d {series['rolling'][window][index] if series['rolling'][window][index] is not None else '-':>5}"
+                    for window in series['rolling']
+                )
+                print(f"{day}  {counts['present']:>4}/{counts['total']:<4}  {rolling}")
+            print(f"Range present rate: {series['range']['rate']}")
@@ -0,0 +1,137 @@
+from datetime import datetime
+from sqlalchemy import text, bindparam
+from models import db, Attendance
+import attendance_bitmap
+import attendance_rollup
+import teacher_summary
+
+VALID_STATUSES = ('present', 'absent', 'late')
+
+def _roster_sql(class_id):
+    if class_id is not None:
+        return "SELECT DISTINCT student_id FROM class_student WHERE class_id = :class_id"
+    return "SELECT DISTINCT student_id FROM student_subject WHERE subject_id = :subject_id"
+
+def parse_exceptions(raw):
+    """Normalise {"12": "absent", "15": {"status": "late", "notes": "bus"}} to {12: (status, notes)}"""
+    exceptions = {}
+    for student_id, value in (raw or {}).items():
+        if isinstance(value, dict):
+            status, notes = value.get('status'), value.get('notes') or None
+        else:
+            status, notes = value, None
+        if status not in VALID_STATUSES:
+            raise ValueError(f"Invalid status for student {student_id}: {status!r}")
+        exceptions[int(student_id)] = (status, notes)
+    return exceptions
+
+def parse_versions(raw):
+    """Row versions the client saw, {student_id: version}; 0 means it saw no record"""
+    versions = {}
+    for student_id, value in (raw or {}).items():
+        if isinstance(value, dict) and value.get('version') is not None:
+            versions[int(student_id)] = int(value['version'])
+    return versions
+
+def apply_sheet(teacher, day, default, exceptions, class_id=None, keep_existing=False, versions=None):
+    """Write a whole attendance sheet given as a default plus exceptions.
+
+    Students not listed in `exceptions` get `default`; with keep_existing
+    only those without a record for the day do. Those rows are written
+    with set-based statements, so Python-side work scales with the number
+    of exceptions rather than the roster size. An exception whose record
+    no longer has the version the client saw is skipped and reported.
+    Returns (changed, conflicts): the (student_id, status) pairs that
+    actually changed and the current state of conflicting rows. The
+    caller commits.
+    """
+    if default not in VALID_STATUSES:
+        raise ValueError(f"Invalid default status: {default!r}")
+    if isinstance(day, datetime):
+        day = day.date()
+
+    params = {
+        'teacher_id': teacher.id,
+        'subject_id': teacher.subject_id,
+        'class_id': class_id,
+        'date': day.isoformat(),
+        'default': default,
+        'exceptions': list(exceptions),
+        'now': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f'),
+    }
+    roster = _roster_sql(class_id)
+
+    # Existing rows that should now hold the default
+    reset = [] if keep_existing else db.session.execute(text(f"""
+        UPDATE attendance SET status = :default, notes = NULL, class_id = COALESCE(:class_id, class_id),
+                              updated_at = :now, version = version + 1
+        WHERE teacher_id = :teacher_id AND subject_id = :subject_id AND date = :date
+          AND student_id IN ({roster})
+          AND student_id NOT IN :exceptions
+          AND (status != :default OR notes IS NOT NULL)
+        RETURNING student_id
+    """).bindparams(bindparam('exceptions', expanding=True)), params).scalars().all()
+
+    # Roster students with no row yet for this date
+    inserted = db.session.execute(text(f"""
+        INSERT INTO attendance (student_id, teacher_id, subject_id, class_id, date, status, notes, updated_at)
+        SELECT r.student_id, :teacher_id, :subject_id, :class_id, :date, :default, NULL, :now
+        FROM ({roster}) r
+        WHERE r.student_id NOT IN :exceptions
+          AND NOT EXISTS (
+              SELECT 1 FROM attendance a
+              WHERE a.student_id = r.student_id AND a.teacher_id = :teacher_id
+                AND a.subject_id = :subject_id AND a.date = :date
+          )
+        RETURNING student_id
+    """).bindparams(bindparam('exceptions', expanding=True)), params).scalars().all()
+
+    changed = [(student_id, default) for student_id in list(reset) + list(inserted)]
+
+    # Exceptions go through the ORM; there are few of them
+    existing = {
+        record.student_id: record
+        for record in Attendance.query.filter(
+            Attendance.teacher_id == teacher.id,
+            Attendance.subject_id == teacher.subject_id,
+            Attendance.date == day,
+            Attendance.student_id.in_(list(exceptions))
+        )
+    } if exceptions else {}
+    versions = versions or {}
+    conflicts = []
+    for student_id, (status, notes) in exceptions.items():
+        record = existing.get(student_id)
+        expected = versions.get(student_id)
+        if expected is not None and expected != (record.version if record else 0):
+            conflicts.append({
+                'student_id': student_id,
+                'status': record.status if record else None,
+                'notes': record.notes if record else None,
+                'version': record.version if record else 0,
+            })
+            continue
+        if record is None:
+            db.session.add(Attendance(
+                student_id=student_id,
+                teacher_id=teacher.id,
+                subject_id=teacher.subject_id,
+                class_id=class_id,
+                date=day,
+                status=status,
+                notes=notes
+            ))
+        elif record.status == status and record.notes == notes:
+            continue
+        else:
+            record.status = status
+            record.notes = notes
+            if class_id is not None:
+                record.class_id = class_id
+        changed.append((student_id, status))
+
+    attendance_bitmap.record_marks(teacher.subject_id, day, changed)
+    attendance_rollup.refresh_day(teacher.subject_id, day)
+    # The bulk statements above bypass the ORM's change tracking
+    teacher_summary.mark_changed(db.session, teacher.id)
+    return changed, conflicts
@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+from models import db, Attendance, Class, SyncBatch
+from attendance_sheet import parse_exceptions
+import attendance_bitmap
+import attendance_rollup
+
+def parse_client_ts(value):
+    """Accept epoch milliseconds or an ISO 8601 string; returns naive UTC"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def apply_batches(teacher, batches, roster_ids):
+    """Apply queued offline batches with last-writer-wins on the client timestamp.
+
+    Each batch is {key, client_ts, date, class_id?, marks}. Batches whose
+    key the teacher already used, before or earlier in this request, are
+    acknowledged again with that batch's counts and no side effects; a
+    class_id must be one of the teacher's own sections.
+    Everything happens in the caller's transaction; returns (acks, changed)
+    where changed maps date -> [(student_id, status)].
+    """
+    now = datetime.utcnow()
+    acks = []
+    pending = []
+    duplicates = []
+
+    keys = [str(batch.get('key', '')) for batch in batches]
+    seen = {
+        record.key: record
+        for record in SyncBatch.query.filter(SyncBatch.key.in_(keys), SyncBatch.teacher_id == teacher.id)
+    }
+    class_ids = {
+        class_id for (class_id,) in db.session.query(Class.id).filter(Class.teacher_id == teacher.id)
+    }
+
+    for batch, key in zip(batches, keys):
+        if not key or len(key) > 64:
+            acks.append({'key': key, 'status': 'rejected', 'error': 'Missing or invalid key'})
+            continue
+        if key in seen:
+            ack = {'key': key, 'status': 'duplicate'}
+            acks.append(ack)
+            duplicates.append((ack, seen[key]))
+            continue
+        try:
+            # Clamp so a fast client clock cannot win every future conflict
+            client_ts = min(parse_client_ts(batch['client_ts']), now)
+            day = datetime.strptime(batch['date'], '%Y-%m-%d').date()
+            marks = parse_exceptions(batch.get('marks'))
+            class_id = batch.get('class_id')
+            class_id = int(class_id) if class_id is not None else None
+        except (KeyError, TypeError, ValueError) as e:
+            acks.append({'key': key, 'status': 'rejected', 'error': str(e) or 'Invalid batch'})
+            continue
+        if class_id is not None and class_id not in class_ids:
+            acks.append({'key': key, 'status': 'rejected', 'error': 'Class not found'})
+            continue
+        unknown = [student_id for student_id in marks if student_id not in roster_ids]
+        if unknown:
+            acks.append({'key': key, 'status': 'rejected', 'error': f'Students not on roster: {unknown}'})
+            continue
+        record = SyncBatch(key=key, teacher_id=teacher.id, client_ts=client_ts)
+        db.session.add(record)
+        seen[key] = record
+        ack = {'key': key, 'status': 'applied'}
+        acks.append(ack)
+        pending.append((client_ts, day, class_id, marks, record, ack))
+
+    if not pending:
+        _count_duplicates(duplicates)
+        return acks, {}
+
+    # One query for every existing row the batches touch
+    days = {day for _, day, _, _, _, _ in pending}
+    student_ids = {student_id for _, _, _, marks, _, _ in pending for student_id in marks}
+    existing = {
+        (record.student_id, record.date): record
+        for record in Attendance.query.filter(
+            Attendance.teacher_id == teacher.id,
+            Attendance.subject_id == teacher.subject_id,
+            Attendance.date.in_(days),
+            Attendance.student_id.in_(student_ids)
+        )
+    }
+
+    changed = {}
+    # Oldest first, so within one sync the newest write wins as well
+    for client_ts, day, class_id, marks, record, ack in sorted(pending, key=lambda item: item[0]):
+        applied = stale = 0
+        for student_id, (status, notes) in marks.items():
+            attendance = existing.get((student_id, day))
+            if attendance is None:
+                attendance = Attendance(
+                    student_id=student_id,
+                    teacher_id=teacher.id,
+                    subject_id=teacher.subject_id,
+                    class_id=class_id,
+                    date=day,
+                    status=status,
+                    notes=notes,
+                    updated_at=client_ts
+                )
+                db.session.add(attendance)
+                existing[(student_id, day)] = attendance
+            elif attendance.updated_at is not None and attendance.updated_at > client_ts:
+                stale += 1
+                continue
+            else:
+                attendance.status = status
+                attendance.notes = notes
+                attendance.updated_at = client_ts
+            applied += 1
+            changed.setdefault(day, []).append((student_id, status))
+        record.applied = ack['applied'] = applied
+        record.stale = ack['stale'] = stale
+
+    for day, marks in changed.items():
+        attendance_bitmap.record_marks(teacher.subject_id, day, marks)
+        attendance_rollup.refresh_day(teacher.subject_id, day)
+    _count_duplicates(duplicates)
+    return acks, changed
+
+def _count_duplicates(duplicates):
+    """Fill in duplicate acks once a repeat's first copy in this request has been applied"""
+    for ack, record in duplicates:
+        ack['applied'], ack['stale'] = record.applied, record.stale
@@ -0,0 +1,137 @@
+import sqlite3
+import time
+import os
+import glob
+import argparse
+from datetime import datetime
+
+# Get absolute path for database file
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'GAMS_database.db')
+BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
+
+def verify_backup(backup_path):
+    """Run an integrity check against a finished backup"""
+    conn = sqlite3.connect(backup_path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    except sqlite3.DatabaseError:
+        return False  # too damaged to check at all
+    finally:
+        conn.close()
+    return result == 'ok'
+
+def prune_backups(backup_dir=BACKUP_DIR, keep=7):
+    """Delete all but the newest `keep` backups"""
+    backups = sorted(glob.glob(os.path.join(backup_dir, 'GAMS_backup_*.db')))
+    removed = backups[:-keep] if keep > 0 else backups
+    for path in removed:
+        os.remove(path)
+    return removed
+
+class _TooManyRestarts(Exception):
+    pass
+
+def backup_database(db_path=DB_PATH, backup_dir=BACKUP_DIR, pages=64, pause=0.005, max_restarts=5):
+    """Copy the database in small page steps so writers are never blocked for long.
+
+    The source is only read-locked while a step of `pages` pages is copied.
+    Between steps the lock is released for `pause` seconds, letting
+    attendance and grade writes through. A write from another connection
+    makes SQLite restart the copy from the first page, so under steady
+    writes a stepped copy may never finish: after `max_restarts` restarts
+    the whole copy is redone in one step, holding the read lock throughout.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    backup_path = os.path.join(backup_dir, f'GAMS_backup_{stamp}.db')
+    partial_path = backup_path + '.partial'
+
+    stats = {'steps': 0, 'restarts': 0, 'single_step': False, 'longest_step': 0.0}
+    last = [time.perf_counter(), None]
+
+    def progress(status, remaining, total):
+        # Time spent inside a step is time the source was locked
+        now = time.perf_counter()
+        stats['steps'] += 1
+        stats['longest_step'] = max(stats['longest_step'], now - last[0])
+        stats['pages'] = total
+        if last[1] is not None and remaining > last[1]:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        last[1] = remaining
+        time.sleep(pause)
+        last[0] = time.perf_counter()
+
+    start = time.perf_counter()
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(partial_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            stats['single_step'] = True
+            source.backup(target)
+    except Exception:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(partial_path, backup_path)
+
+    stats['path'] = backup_path
+    stats['duration'] = time.perf_counter() - start
+    stats['verified'] = verify_backup(backup_path)
+    if not stats['verified']:
+        os.rename(backup_path, backup_path + '.corrupt')
+        raise RuntimeError(f"Backup failed integrity check: {backup_path}")
+    return stats
+
+def run_backup(args):
+    stats = backup_database(args.db, args.dir, args.pages, args.pause, args.max_restarts)
+    print(f"Backup written to {stats['path']}")
+    print(f"  pages copied:         {stats.get('pages', 0)} in {stats['steps']} steps")
+    print(f"  duration:             {stats['duration'] * 1000:.1f} ms")
+    print(f"  longest copy step:    {stats['longest_step'] * 1000:.2f} ms")
+    print(f"  restarts:             {stats['restarts']}"
+          + (' (finished in a single step)' if stats['single_step'] else ''))
+    print(f"  integrity check:      {'ok' if stats['verified'] else 'FAILED'}")
+    for path in prune_backups(args.dir, args.keep):
+        print(f"Removed old backup {os.path.basename(path)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Online backup of the GAMS database')
+    parser.add_argument('--db', default=DB_PATH, help='database file')
+    parser.add_argument('--dir', default=BACKUP_DIR, help='backup directory')
+    parser.add_argument('--pages', type=int, default=64, help='pages copied per step')
+    parser.add_argument('--pause', type=float, default=0.005, help='seconds to yield between steps')
+    parser.add_argument('--max-restarts', type=int, default=5,
+                        help='restarts caused by writes before finishing in one step')
+    parser.add_argument('--keep', type=int, default=7, help='number of backups to retain')
+    parser.add_argument('--every', type=int, default=0,
+                        help='repeat every N seconds instead of running once')
+    args = parser.parse_args()
+
+    if not args.every:
+        run_backup(args)
+        return
+
+    print(f"Backing up every {args.every} seconds, press Ctrl+C to stop")
+    while True:
+        try:
+            run_backup(args)
+        except Exception as e:
+            print(f"Backup failed: {str(e)}")
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        exit(1)
@@ -0,0 +1,49 @@
+import time
+from app import app
+from compression import brotli
+
+# Largest pages per role; accounts match create_sample_data() in models.py
+PAGES = [
+    (None, None, ['/', '/student/register', '/teacher/register']),
+    ('teacher1', 'teacher123', ['/teacher/attendance', '/teacher/grade_categories']),
+    ('student1', 'student123', ['/attendance', '/student/grades']),
+]
+
+ENCODINGS = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+ITERATIONS = 20
+
+def fetch(client, path, encoding):
+    """Return (response, CPU seconds per request) for one page and encoding"""
+    headers = {'Accept-Encoding': encoding}
+    client.get(path, headers=headers)  # warm up
+    start = time.process_time()
+    for _ in range(ITERATIONS):
+        response = client.get(path, headers=headers)
+    return response, (time.process_time() - start) / ITERATIONS
+
+def run_benchmark():
+    app.config['TESTING'] = True
+    print(f"{'page':<28} {'encoding':<9} {'wire bytes':>10} {'ratio':>6} {'cpu ms':>7} {'+cpu ms':>8}")
+    print("-" * 73)
+    for username, password, paths in PAGES:
+        client = app.test_client()
+        if username:
+            response = client.post('/login', data={'username': username, 'password': password})
+            if response.status_code != 302 or '/login' in response.location:
+                print(f"Could not log in as {username}, skipping its pages")
+                continue
+        for path in paths:
+            baseline = None
+            for encoding in ENCODINGS:
+                response, cpu = fetch(client, path, encoding)
+                if response.status_code != 200:
+                    print(f"{path:<28} returned {response.status_code}, skipping")
+                    break
+                if baseline is None:
+                    baseline = (len(response.data), cpu)
+                print(f"{path:<28} {response.headers.get('Content-Encoding', 'identity'):<9} "
+                      f"{len(response.data):>10} {len(response.data) / baseline[0]:>6.2f} "
+                      f"{cpu * 1000:>7.2f} {(cpu - baseline[1]) * 1000:>+8.2f}")
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Sample teacher accounts from create_sample_data() in models.py
+TEACHERS = [(f'teacher{i}', 'teacher123') for i in range(1, 9)]
+
+def worker(app, username, password, offset, requests_per_thread, results):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302 or '/login' in response.location:
+        results.append(('login', 0.0))
+        return
+    start_day = date(2000, 1, 1) + timedelta(days=offset * requests_per_thread)
+    for i in range(requests_per_thread):
+        begin = time.perf_counter()
+        response = client.post('/teacher/attendance/submit', json={
+            'date': (start_day + timedelta(days=i)).isoformat(),
+            'default': 'present' if i % 2 else 'absent',
+            'exceptions': {},
+        })
+        results.append((response.status_code, time.perf_counter() - begin))
+
+def run_mode(threads, requests_per_thread):
+    """Runs inside a child process whose environment selects the mode"""
+    from app import app
+    import metrics
+    app.config['TESTING'] = True
+    results = []
+    workers = [
+        threading.Thread(target=worker, args=(app, *TEACHERS[i % len(TEACHERS)], i, requests_per_thread, results))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency in results if status == 200]
+    failed = len(results) - len(ok)
+    locked = sum(value for (name, _), value in metrics.registry._counters.items()
+                 if name == 'gams_sql_lock_errors_total')
+    ok.sort()
+    p95 = ok[int(len(ok) * 0.95)] * 1000 if ok else 0
+    print(f"{len(ok) / elapsed:>9.1f} {failed:>7} {locked:>11} {p95:>8.1f}")
+
+def run_benchmark(threads, requests_per_thread, source):
+    print(f"{threads} threads x {requests_per_thread} attendance submissions each")
+    print(f"{'mode':<7} {'writes/s':>9} {'failed':>7} {'lock errors':>11} {'p95 ms':>8}")
+    print("-" * 46)
+    for mode in ('direct', 'queue'):
+        workdir = tempfile.mkdtemp(prefix='gams_bench_')
+        try:
+            database = os.path.join(workdir, 'bench.db')
+            shutil.copy(source, database)
+            env = dict(os.environ, GAMS_DATABASE=database, GAMS_METRICS_DIR=workdir,
+                       GAMS_WRITE_QUEUE='1' if mode == 'queue' else '0')
+            print(f"{mode:<7} ", end='', flush=True)
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--child',
+                            '--threads', str(threads), '--requests', str(requests_per_thread)],
+                           env=env, check=True, stderr=subprocess.DEVNULL)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare concurrent attendance writes with and without the write queue.')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=25, help='Submissions per thread')
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GAMS_database.db'),
+                        help='Database to copy for each run; it is never modified')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_mode(args.threads, args.requests)
+    else:
+        run_benchmark(args.threads, args.requests, args.db)
@@ -0,0 +1,176 @@
+"""Append-only journal of grade and attendance changes, written in batches.
+
+Rows are buffered in memory and written by a background thread, so the
+journal trails the marks themselves by up to CHANGE_JOURNAL_FLUSH_INTERVAL
+seconds. The buffer is flushed at normal interpreter exit, but rows still
+buffered when a worker is killed or crashes are lost: the grades and
+attendance are committed, their journal entries are not. The journal is an
+audit aid, not a source of truth.
+"""
+import atexit
+import threading
+import time
+import argparse
+from datetime import datetime, date
+from models import db, ChangeJournal
+import metrics
+import tenants
+
+GRADE = 'G'
+ATTENDANCE = 'A'
+
+ATTENDANCE_CODES = {'present': 1, 'absent': 2, 'late': 3}
+ATTENDANCE_NAMES = {code: name for name, code in ATTENDANCE_CODES.items()}
+
+class ChangeJournalBuffer:
+    """Buffers journal rows in memory and writes them in batches.
+
+    Request handlers call record_grade/record_attendance after their own
+    commit succeeds. A background thread flushes the buffer every
+    `flush_interval` seconds, or sooner once `max_batch` rows are waiting,
+    with a single executemany insert per school.
+    """
+
+    def __init__(self, flush_interval=2.0, max_batch=500):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._rows = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._engine = None
+        self._thread = None
+
+    def init_app(self, app):
+        self.flush_interval = app.config.get('CHANGE_JOURNAL_FLUSH_INTERVAL', self.flush_interval)
+        self.max_batch = app.config.get('CHANGE_JOURNAL_MAX_BATCH', self.max_batch)
+        with app.app_context():
+            self._engine = db.engine
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='change-journal', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def record_grade(self, teacher_id, subject_id, student_id, category_id, grade):
+        self._append(GRADE, teacher_id, subject_id, student_id, category_id, grade)
+
+    def record_attendance(self, teacher_id, subject_id, student_id, day, status):
+        if isinstance(day, datetime):
+            day = day.date()
+        self._append(ATTENDANCE, teacher_id, subject_id, student_id,
+                     day.toordinal(), ATTENDANCE_CODES.get(status, 0))
+
+    def _append(self, kind, teacher_id, subject_id, student_id, ref, value):
+        row = {
+            'recorded_at': time.time(),
+            'kind': kind,
+            'student_id': int(student_id),
+            'subject_id': subject_id,
+            'teacher_id': teacher_id,
+            'ref': ref,
+            'value': float(value),
+        }
+        with self._lock:
+            self._rows.setdefault(tenants.current(), []).append(row)
+            self._pending += 1
+            pending = self._pending
+        if pending >= self.max_batch:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            batches, self._rows, self._pending = self._rows, {}, 0
+        if not batches or self._engine is None:
+            return 0
+        written = 0
+        failed = None
+        for tenant, rows in batches.items():
+            try:
+                engine = tenants.tenant_router.engine(tenant) if tenant else self._engine
+                with engine.begin() as conn:
+                    conn.execute(ChangeJournal.__table__.insert(), rows)
+                written += len(rows)
+            except Exception as e:
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    self._rows.setdefault(tenant, [])[:0] = rows
+                    self._pending += len(rows)
+                if 'database is locked' in str(e):
+                    metrics.record_lock_retry('change_journal')
+                failed = e
+        if failed is not None:
+            raise failed
+        return written
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing change journal: {str(e)}")
+
+change_journal = ChangeJournalBuffer()
+
+def marks_as_of(student_id, as_of):
+    """Rebuild a student's grades and attendance as they stood at `as_of`
+
+    The latest entry per mark is chosen by recorded_at, not id: with several
+    worker processes flushing, ids follow flush order, not write order.
+    """
+    timestamp = as_of.timestamp()
+    ranked = db.session.query(
+        ChangeJournal.id,
+        db.func.row_number().over(
+            partition_by=(ChangeJournal.kind, ChangeJournal.subject_id, ChangeJournal.ref),
+            order_by=(ChangeJournal.recorded_at.desc(), ChangeJournal.id.desc())
+        ).label('position')
+    ).filter(
+        ChangeJournal.student_id == student_id,
+        ChangeJournal.recorded_at <= timestamp
+    ).subquery()
+    rows = ChangeJournal.query.join(ranked, ranked.c.id == ChangeJournal.id).filter(
+        ranked.c.position == 1
+    ).order_by(ChangeJournal.kind, ChangeJournal.subject_id, ChangeJournal.ref).all()
+
+    grades = {}
+    attendance = {}
+    for row in rows:
+        if row.kind == GRADE:
+            grades[(row.subject_id, row.ref)] = row.value
+        else:
+            attendance[(row.subject_id, date.fromordinal(row.ref))] = ATTENDANCE_NAMES.get(int(row.value))
+    return grades, attendance
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a student's marks as of a point in time")
+    parser.add_argument('student_id', type=int, help='student row id')
+    parser.add_argument('--as-of', default=None,
+                        help="timestamp, e.g. '2024-05-01 14:30' (defaults to now)")
+    args = parser.parse_args()
+    as_of = datetime.fromisoformat(args.as_of) if args.as_of else datetime.now()
+
+    from app import app
+    from models import GradeCategory, Subject
+    with app.app_context():
+        change_journal.flush()
+        grades, attendance = marks_as_of(args.student_id, as_of)
+        print(f"\n=== Grades for student {args.student_id} as of {as_of} ===")
+        if not grades:
+            print("No records found")
+        for (subject_id, category_id), value in grades.items():
+            subject = db.session.get(Subject, subject_id)
+            category = db.session.get(GradeCategory, category_id)
+            print(f"{subject.name if subject else subject_id} | "
+                  f"{category.name if category else category_id} | {value:g}")
+
+        print(f"\n=== Attendance for student {args.student_id} as of {as_of} ===")
+        if not attendance:
+            print("No records found")
+        for (subject_id, day), status in attendance.items():
+            subject = db.session.get(Subject, subject_id)
+            print(f"{subject.name if subject else subject_id} | {day} | {status}")
+
+if __name__ == '__main__':
+    main()
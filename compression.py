@@ -0,0 +1,153 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # fall back to gzip only
+    brotli = None
+
+# Content types that are already compressed or not worth compressing
+SKIP_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/pdf', 'application/octet-stream',
+)
+
+class CompressionMiddleware:
+    """Compresses responses with brotli or gzip according to Accept-Encoding.
+
+    Responses smaller than `min_size` are sent as-is. Responses without a
+    Content-Length (streamed exports) are buffered only until `min_size`
+    bytes arrive, then compressed incrementally with a sync flush every
+    `flush_size` input bytes so the client keeps receiving data as it is
+    produced.
+    """
+
+    def __init__(self, app, min_size=500, level=6, brotli_quality=4, flush_size=8192):
+        self.app = app
+        self.min_size = min_size
+        self.flush_size = flush_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    def __call__(self, environ, start_response):
+        encoding = self._choose_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return written.append
+
+        body = self.app(environ, capture)
+        return self._respond(body, captured, written, encoding, start_response)
+
+    def _choose_encoding(self, accept):
+        accepted = {}
+        for part in accept.split(','):
+            name, _, params = part.strip().partition(';')
+            quality = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        if brotli is not None and accepted.get('br', 0) > 0:
+            return 'br'
+        if accepted.get('gzip', 0) > 0:
+            return 'gzip'
+        return None
+
+    def _should_compress(self, status, headers):
+        if not status.startswith('200'):
+            return False
+        names = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in names:
+            return False
+        if 'no-transform' in names.get('cache-control', ''):
+            return False
+        content_type = names.get('content-type', '').lower()
+        if not content_type or content_type.startswith(SKIP_TYPES):
+            return False
+        length = names.get('content-length')
+        if length is not None and length.isdigit() and int(length) < self.min_size:
+            return False
+        return True
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return (compressor.compress,
+                lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+                lambda: compressor.flush(zlib.Z_FINISH))
+
+    def _respond(self, body, captured, written, encoding, start_response):
+        iterator = iter(body)
+        try:
+            pending = list(written)
+            exhausted = False
+            if 'status' not in captured:
+                # Generator apps only call start_response once iterated
+                try:
+                    pending.append(next(iterator))
+                except StopIteration:
+                    exhausted = True
+
+            compressible = self._should_compress(captured['status'], captured['headers'])
+
+            # Buffer until we know the response is big enough to bother
+            size = sum(len(chunk) for chunk in pending)
+            while compressible and not exhausted and size < self.min_size:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append(chunk)
+                size += len(chunk)
+
+            if not compressible or size < self.min_size:
+                start_response(captured['status'], captured['headers'], captured['exc_info'])
+                yield from pending
+                yield from iterator
+                return
+
+            streamed = not any(name.lower() == 'content-length' for name, _ in captured['headers'])
+            headers = [(name, value) for name, value in captured['headers']
+                       if name.lower() not in ('content-length', 'vary')]
+            vary = [value for name, value in captured['headers'] if name.lower() == 'vary']
+            vary.append('Accept-Encoding')
+            headers.append(('Vary', ', '.join(vary)))
+            headers.append(('Content-Encoding', encoding))
+
+            compress, flush, finish = self._compressor(encoding)
+            if exhausted:
+                data = compress(b''.join(pending)) + finish()
+                headers.append(('Content-Length', str(len(data))))
+                start_response(captured['status'], headers, captured['exc_info'])
+                yield data
+                return
+
+            start_response(captured['status'], headers, captured['exc_info'])
+            data = compress(b''.join(pending))
+            unflushed = size
+            for chunk in iterator:
+                data += compress(chunk)
+                unflushed += len(chunk)
+                if streamed and unflushed >= self.flush_size:
+                    data += flush()
+                    unflushed = 0
+                if data:
+                    yield data
+                    data = b''
+            yield data + finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+import pytest
+from flask import has_app_context
+from flask.testing import FlaskClient
+
+# app.py picks its databases and scratch directories at import time, so
+# point them at a throwaway directory before any test imports it
+TEST_DIR = tempfile.mkdtemp(prefix='gams-tests-')
+os.environ['GAMS_DATABASE'] = os.path.join(TEST_DIR, 'GAMS_database.db')
+os.environ['GAMS_METRICS_DIR'] = os.path.join(TEST_DIR, 'metrics')
+os.environ['GAMS_TENANT_DIR'] = os.path.join(TEST_DIR, 'tenants')
+os.environ['GAMS_SLOW_QUERY_LOG'] = os.path.join(TEST_DIR, 'GAMS_slowlog.db')
+
+# test_db.py is a manual check of the SQLite install, not a test module
+collect_ignore = ['test_db.py']
+
+class _Client(FlaskClient):
+    """Runs each request in its own app context, and so its own session and
+    `g`, as it would outside tests. The test's session ends its transaction
+    first, so its objects are re-read afterwards and never hold a lock the
+    request needs."""
+
+    def open(self, *args, **kwargs):
+        from models import db
+
+        if has_app_context():
+            db.session.rollback()
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+@pytest.fixture(scope='session')
+def app():
+    """The application on a seeded scratch database: admin, one approved
+    teacher per subject (teacher1, ... / teacher123) and three approved
+    students enrolled in the first two subjects (student1, ... / student123)"""
+    from app import app as flask_app
+    from models import db, create_sample_data, Teacher, Student
+    from change_journal import change_journal
+    from rate_limit import rate_limiter
+
+    flask_app.config['TESTING'] = True
+    flask_app.test_client_class = _Client
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    rate_limiter.enabled = False  # tests log in far more often than a person would
+    # Templates are kept next to the modules in this tree
+    flask_app.jinja_loader.searchpath.append(flask_app.root_path)
+    # Tests flush the change journal themselves
+    change_journal.flush_interval = 3600
+    change_journal._wakeup.set()
+    create_sample_data(flask_app)
+    with flask_app.app_context():
+        Teacher.query.update({'is_approved': True})
+        Student.query.update({'is_approved': True})
+        db.session.commit()
+        db.engine.dispose()
+    return flask_app
+
+@pytest.fixture(scope='session')
+def snapshot(app):
+    from db_snapshot import DatabaseSnapshot
+
+    snapshot = DatabaseSnapshot(os.environ['GAMS_DATABASE']).capture()
+    yield snapshot
+    snapshot.close()
+
+@pytest.fixture
+def clean_db(app, snapshot):
+    """Every test starts from the seeded database and empty caches"""
+    from models import db
+    from roster_cache import roster_cache
+    from teacher_summary import teacher_summary
+    from change_journal import change_journal
+
+    # Anything a previous test left buffered lands before the restore
+    change_journal.flush()
+    snapshot.restore()
+    roster_cache.invalidate()
+    teacher_summary.invalidate()
+    with app.app_context():
+        yield db
+        db.session.rollback()
+
+@pytest.fixture
+def login(app, clean_db):
+    """login(username, password) -> a test client signed in as that user"""
+    def login(username, password):
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, f'login failed for {username}'
+        return client
+    return login
@@ -0,0 +1,48 @@
+from app import app, db
+from models import Teacher, Student, StudentSubject, Class, ClassStudent
+import sys
+
+def create_sections(teacher_id, size=40):
+    """Split a teacher's subject roster into sections of at most `size` students"""
+    with app.app_context():
+        teacher = db.session.get(Teacher, teacher_id)
+        if not teacher:
+            print(f"Teacher {teacher_id} not found")
+            return
+
+        existing = Class.query.filter_by(teacher_id=teacher.id, subject_id=teacher.subject_id).count()
+        if existing:
+            print(f"Teacher {teacher_id} already has {existing} sections, skipping")
+            return
+
+        student_ids = [row.id for row in db.session.query(Student.id).join(
+            StudentSubject, StudentSubject.student_id == Student.id
+        ).filter(
+            StudentSubject.subject_id == teacher.subject_id
+        ).order_by(Student.last_name, Student.first_name)]
+
+        try:
+            for number, start in enumerate(range(0, len(student_ids), size)):
+                section = Class(
+                    name=f"Section {chr(ord('A') + number)}" if number < 26 else f"Section {number + 1}",
+                    teacher_id=teacher.id,
+                    subject_id=teacher.subject_id
+                )
+                db.session.add(section)
+                db.session.flush()
+                db.session.add_all(
+                    ClassStudent(class_id=section.id, student_id=student_id)
+                    for student_id in student_ids[start:start + size]
+                )
+                print(f"Created {section.name} with {len(student_ids[start:start + size])} students")
+            db.session.commit()
+        except Exception as e:
+            print(f"Error creating sections: {str(e)}")
+            db.session.rollback()
+            raise
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python create_sections.py TEACHER_ID [SECTION_SIZE]")
+        exit(1)
+    create_sections(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 40)
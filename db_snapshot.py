@@ -0,0 +1,115 @@
+import sqlite3
+import shutil
+import time
+import os
+import argparse
+
+# Get absolute path for database file
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'GAMS_database.db')
+SNAPSHOT_PATH = os.path.join(BASE_DIR, 'GAMS_database.snapshot.db')
+
+def checkpoint_wal(db_path):
+    """Fold any WAL frames back into the main database file"""
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+def snapshot_database(db_path=DB_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Capture a consistent copy of the database using the online backup API"""
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return snapshot_path
+
+def restore_database(snapshot_path=SNAPSHOT_PATH, db_path=DB_PATH, method='backup'):
+    """Restore a snapshot over the database.
+
+    'backup' copies pages into the live file and is safe while other
+    connections are open. 'copy' replaces the file outright and is faster,
+    but every connection to db_path must be closed first.
+    """
+    if not os.path.exists(snapshot_path):
+        raise FileNotFoundError(f"Snapshot not found: {snapshot_path}")
+
+    if method == 'copy':
+        checkpoint_wal(snapshot_path)
+        for suffix in ('-wal', '-shm', '-journal'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        shutil.copyfile(snapshot_path, db_path)
+        return
+
+    source = sqlite3.connect(snapshot_path)
+    target = sqlite3.connect(db_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+class DatabaseSnapshot:
+    """An in-memory snapshot that can be restored repeatedly.
+
+    Capture once after seeding, then call restore() before each test;
+    the clean_db fixture in conftest.py does exactly that.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._memory = None
+
+    def capture(self):
+        source = sqlite3.connect(self.db_path)
+        self._memory = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            source.backup(self._memory)
+        finally:
+            source.close()
+        return self
+
+    def restore(self):
+        if self._memory is None:
+            raise RuntimeError("No snapshot captured yet")
+        target = sqlite3.connect(self.db_path)
+        try:
+            self._memory.backup(target)
+        finally:
+            target.close()
+
+    def close(self):
+        if self._memory is not None:
+            self._memory.close()
+            self._memory = None
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot or restore the GAMS database')
+    parser.add_argument('command', choices=['snapshot', 'restore'])
+    parser.add_argument('--db', default=DB_PATH, help='database file')
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH, help='snapshot file')
+    parser.add_argument('--method', choices=['backup', 'copy'], default='backup',
+                        help='restore method (copy requires the app to be stopped)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'snapshot':
+        snapshot_database(args.db, args.snapshot)
+        print(f"Snapshot written to {args.snapshot}")
+    else:
+        restore_database(args.snapshot, args.db, args.method)
+        print(f"Restored {args.db} from {args.snapshot}")
+    print(f"Took {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        exit(1)
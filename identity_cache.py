@@ -0,0 +1,170 @@
+import threading
+import time
+from flask import session
+from flask_login import UserMixin
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, User, Student, Teacher, IdentityRevocation
+import tenants
+
+SESSION_KEY = 'identity'
+
+class CachedIdentity(UserMixin):
+    """Stand-in for User built from the signed session record"""
+
+    def __init__(self, record):
+        self.id = record['uid']
+        self.username = record['username']
+        self.email = record['email']
+        self.role = record['role']
+        self.profile_id = record['profile_id']
+        self.subject_id = record['subject_id']
+        self.is_approved = record['approved']
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_teacher(self):
+        return self.role == 'teacher'
+
+    @property
+    def is_student(self):
+        return self.role == 'student'
+
+class IdentityCache:
+    """Keeps a signed, short-lived identity record in the session.
+
+    A valid record lets user_loader skip the database. Records carry the
+    user's revocation version; this process learns about new versions from
+    its own commits immediately and from other workers by polling the
+    identity_revocation table at most every IDENTITY_REVOCATION_POLL
+    seconds. Versions and polls are kept per school, since user ids are.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.ttl = 60
+        self.poll_interval = 1.0
+        self._serializer = None
+        self._versions = {}
+        self._polled_at = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SESSION_IDENTITY_CACHE', False)
+        self.ttl = app.config.get('SESSION_IDENTITY_TTL', self.ttl)
+        self.poll_interval = app.config.get('IDENTITY_REVOCATION_POLL', self.poll_interval)
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='gams-identity')
+
+    def load(self, user_id):
+        """Return a CachedIdentity for user_id, or None if the DB must be consulted"""
+        token = session.get(SESSION_KEY)
+        if not token:
+            return None
+        try:
+            record = self._serializer.loads(token, max_age=self.ttl)
+        except BadSignature:
+            return None
+        if str(record['uid']) != str(user_id):
+            return None
+
+        self._poll()
+        if record['v'] != self._versions.get((tenants.current(), record['uid']), 0):
+            return None
+        return CachedIdentity(record)
+
+    def store(self, user):
+        """Write a fresh identity record for a user just loaded from the DB"""
+        profile_id = subject_id = None
+        approved = True
+        if user.role == 'student':
+            student = Student.query.filter_by(user_id=user.id).first()
+            profile_id = student.id if student else None
+            approved = bool(student and student.is_approved)
+        elif user.role == 'teacher':
+            teacher = Teacher.query.filter_by(user_id=user.id).first()
+            profile_id = teacher.id if teacher else None
+            subject_id = teacher.subject_id if teacher else None
+            approved = bool(teacher and teacher.is_approved)
+
+        revocation = db.session.get(IdentityRevocation, user.id)
+        version = revocation.version if revocation else 0
+        self._remember(user.id, version)
+
+        session[SESSION_KEY] = self._serializer.dumps({
+            'uid': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': user.role,
+            'profile_id': profile_id,
+            'subject_id': subject_id,
+            'approved': approved,
+            'v': version,
+        })
+
+    def clear(self):
+        session.pop(SESSION_KEY, None)
+
+    def _remember(self, user_id, version):
+        key = (tenants.current(), user_id)
+        with self._lock:
+            if version > self._versions.get(key, 0):
+                self._versions[key] = version
+
+    def _poll(self):
+        now = time.time()
+        tenant = tenants.current()
+        polled_at = self._polled_at.get(tenant, 0.0)
+        if now - polled_at < self.poll_interval:
+            return
+        # Re-read a few seconds of overlap so commits that stamped
+        # changed_at before the previous poll are not missed
+        since = polled_at - 5.0 if polled_at else 0.0
+        self._polled_at[tenant] = now
+        rows = db.session.query(IdentityRevocation.user_id, IdentityRevocation.version).filter(
+            IdentityRevocation.changed_at > since
+        ).all()
+        for user_id, version in rows:
+            self._remember(user_id, version)
+
+identity_cache = IdentityCache()
+
+@event.listens_for(Session, 'before_flush')
+def _bump_revocations(session, flush_context, instances):
+    user_ids = set()
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.role.history.has_changes():
+            user_ids.add(obj.id)
+        elif isinstance(obj, (Student, Teacher)) and inspect(obj).attrs.is_approved.history.has_changes():
+            user_ids.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, (Student, Teacher)):
+            user_ids.add(obj.user_id)
+
+    if not user_ids:
+        return
+    now = time.time()
+    bumped = session.info.setdefault('revoked_identities', {})
+    for user_id in user_ids:
+        with session.no_autoflush:
+            revocation = session.get(IdentityRevocation, user_id)
+        if revocation is None:
+            revocation = IdentityRevocation(user_id=user_id, version=0)
+            session.add(revocation)
+        revocation.version = (revocation.version or 0) + 1
+        revocation.changed_at = now
+        bumped[user_id] = revocation.version
+
+@event.listens_for(Session, 'after_commit')
+def _apply_revocations(session):
+    for user_id, version in session.info.pop('revoked_identities', {}).items():
+        identity_cache._remember(user_id, version)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_revocations(session):
+    session.info.pop('revoked_identities', None)
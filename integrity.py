@@ -0,0 +1,162 @@
+import argparse
+import time
+from datetime import date
+from sqlalchemy import inspect, text
+from models import db, Attendance, Student, Subject
+
+# (table, key columns, which row to keep first) for rows that must be unique
+DUPLICATE_CHECKS = [
+    ('attendance', ('student_id', 'subject_id', 'date'), 'updated_at DESC, id DESC'),
+    ('grade', ('student_id', 'category_id'), 'date DESC, id DESC'),
+    ('student_subject', ('student_id', 'subject_id'), 'id'),
+    ('class_student', ('class_id', 'student_id'), 'id'),
+]
+
+SCAN_RANGE = 50000  # rowids per read statement, so no single read holds the lock for long
+ID_CHUNK = 500  # keeps IN lists well under SQLite's bound-parameter limit
+
+def _foreign_keys(engine):
+    """(table, column, nullable, referenced table, referenced column), parents before children"""
+    existing = set(inspect(engine).get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for fk in table.foreign_keys:
+            if fk.column.table.name in existing:
+                yield table.name, fk.parent.name, fk.parent.nullable, fk.column.table.name, fk.column.name
+
+def find_orphans(conn, table, column, ref_table, ref_column):
+    """[(rowid, dangling value)] via an anti-join, scanned in rowid ranges"""
+    last = conn.execute(text(f'SELECT MAX(rowid) FROM "{table}"')).scalar() or 0
+    orphans = []
+    for start in range(0, last, SCAN_RANGE):
+        orphans.extend(conn.execute(text(f"""
+            SELECT t.rowid, t."{column}" FROM "{table}" t
+            WHERE t.rowid > :start AND t.rowid <= :end AND t."{column}" IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM "{ref_table}" r WHERE r."{ref_column}" = t."{column}")
+        """), {'start': start, 'end': start + SCAN_RANGE}).all())
+    return orphans
+
+def find_duplicates(conn, table, keys, keep_order):
+    """[(rowid, rowid kept in its place)] for every extra copy of a key"""
+    key_list = ', '.join(f'"{key}"' for key in keys)
+    return conn.execute(text(f"""
+        WITH dup AS (
+            SELECT {key_list} FROM "{table}" GROUP BY {key_list} HAVING COUNT(*) > 1
+        )
+        SELECT rowid, keep FROM (
+            SELECT t.rowid AS rowid,
+                   FIRST_VALUE(t.rowid) OVER (PARTITION BY {', '.join(f't."{key}"' for key in keys)}
+                                              ORDER BY {', '.join(f't.{part}' for part in keep_order.split(', '))}) AS keep
+            FROM "{table}" t JOIN dup USING ({key_list})
+        ) WHERE rowid != keep
+    """)).all()
+
+def _apply_in_chunks(engine, statement, params, chunk, pause):
+    """Run one statement per row, committing every `chunk` rows so live writers get in between"""
+    done = 0
+    for start in range(0, len(params), chunk):
+        with engine.begin() as conn:
+            result = conn.execute(text(statement), params[start:start + chunk])
+            done += max(result.rowcount, 0)
+        if pause:
+            time.sleep(pause)
+    return done
+
+def _attendance_days(engine, rowids, touched):
+    """Note the (subject_id, day) and student of attendance rows about to be deleted"""
+    with engine.connect() as conn:
+        for start in range(0, len(rowids), ID_CHUNK):
+            chunk = rowids[start:start + ID_CHUNK]
+            for subject_id, day, student_id in conn.execute(text(
+                f"SELECT subject_id, date, student_id FROM attendance "
+                f"WHERE rowid IN ({', '.join(str(int(rowid)) for rowid in chunk)})"
+            )):
+                touched.setdefault((subject_id, date.fromisoformat(day)), set()).add(student_id)
+
+def refresh_attendance(touched):
+    """Bring the bitmaps and daily rollup back in line with the attendance
+    table for each {(subject_id, day): student_ids} whose rows were deleted"""
+    import attendance_bitmap
+    import attendance_rollup
+
+    for (subject_id, day), student_ids in touched.items():
+        if db.session.get(Subject, subject_id) is None:
+            continue  # its bitmaps and rollup rows are orphans themselves
+        ids = sorted(student_ids)
+        marks = dict(db.session.query(Attendance.student_id, Attendance.status).filter(
+            Attendance.subject_id == subject_id, Attendance.date == day, Attendance.student_id.in_(ids)))
+        existing = {student_id for (student_id,) in db.session.query(Student.id).filter(Student.id.in_(ids))}
+        # A student left with no mark that day gets the day cleared
+        attendance_bitmap.record_marks(subject_id, day, [
+            (student_id, marks.get(student_id)) for student_id in ids if student_id in existing])
+        attendance_rollup.refresh_day(subject_id, day)
+    db.session.commit()
+
+def check(engine, fix=False, chunk=1000, pause=0.01, verbose=False):
+    """Report (and with fix, repair) orphaned and duplicated rows; returns the number of problems"""
+    problems = 0
+    touched = {}  # attendance days whose bitmaps and rollup need recounting after a fix
+
+    for table, column, nullable, ref_table, ref_column in _foreign_keys(engine):
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            orphans = find_orphans(conn, table, column, ref_table, ref_column)
+        elapsed = time.perf_counter() - start
+        if verbose or orphans:
+            print(f"{table}.{column} -> {ref_table}: {len(orphans)} orphans ({elapsed:.2f}s)"
+                  + (f", e.g. rowids {[rowid for rowid, _ in orphans[:5]]}" if orphans else ''))
+        problems += len(orphans)
+        if fix and orphans:
+            # Re-checked per row in case the parent reappeared since the scan
+            action = f'UPDATE "{table}" SET "{column}" = NULL' if nullable else f'DELETE FROM "{table}"'
+            if table == 'attendance' and not nullable:
+                _attendance_days(engine, [rowid for rowid, _ in orphans], touched)
+            repaired = _apply_in_chunks(engine, f"""
+                {action} WHERE rowid = :rowid AND "{column}" = :value
+                  AND NOT EXISTS (SELECT 1 FROM "{ref_table}" WHERE "{ref_column}" = :value)
+            """, [{'rowid': rowid, 'value': value} for rowid, value in orphans], chunk, pause)
+            print(f"    {'cleared' if nullable else 'deleted'} {repaired}")
+
+    existing = set(inspect(engine).get_table_names())
+    for table, keys, keep_order in DUPLICATE_CHECKS:
+        if table not in existing:
+            continue
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            duplicates = find_duplicates(conn, table, keys, keep_order)
+        elapsed = time.perf_counter() - start
+        if verbose or duplicates:
+            print(f"{table} ({', '.join(keys)}): {len(duplicates)} duplicate rows ({elapsed:.2f}s)"
+                  + (f", e.g. rowids {[rowid for rowid, _ in duplicates[:5]]}" if duplicates else ''))
+        problems += len(duplicates)
+        if fix and duplicates:
+            if table == 'attendance':
+                _attendance_days(engine, [rowid for rowid, _ in duplicates], touched)
+            # Only delete while the row being kept still exists
+            repaired = _apply_in_chunks(engine, f"""
+                DELETE FROM "{table}" WHERE rowid = :rowid
+                  AND EXISTS (SELECT 1 FROM "{table}" WHERE rowid = :keep)
+            """, [{'rowid': rowid, 'keep': keep} for rowid, keep in duplicates], chunk, pause)
+            print(f"    deleted {repaired}")
+
+    if touched:
+        refresh_attendance(touched)
+        print(f"Recounted attendance bitmaps and rollup for {len(touched)} subject-days")
+    return problems
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Find orphaned and duplicated rows, and optionally repair them.')
+    parser.add_argument('--fix', action='store_true', help='Delete orphans and duplicates (nullable links are cleared)')
+    parser.add_argument('--chunk', type=int, default=1000, help='Rows per repair transaction')
+    parser.add_argument('--pause', type=float, default=0.01, help='Seconds to sleep between repair transactions')
+    parser.add_argument('--verbose', action='store_true', help='Also list checks that found nothing')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        problems = check(db.engine, fix=args.fix, chunk=args.chunk, pause=args.pause, verbose=args.verbose)
+        print(f"{problems} problems found in {time.perf_counter() - start:.2f}s"
+              + (' and repaired' if args.fix and problems else ''))
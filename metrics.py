@@ -0,0 +1,379 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are not locked across processes
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class MetricsRegistry:
+    """Per-process counters, gauges and histograms.
+
+    Updates only touch in-memory dicts. Every few seconds, and on each
+    scrape, the process writes a snapshot to METRICS_DIR/metrics_<pid>.json.
+    /metrics sums the snapshots of the live workers plus METRICS_DIR/archive.json.
+    When a worker exits, or its snapshot is found dead or not rewritten for
+    `stale_after` seconds, its counters and histograms are folded into the
+    archive and the snapshot deleted, so totals never go backwards; its
+    gauges are dropped.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5.0
+        self.stale_after = 60.0
+        self._definitions = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._thread = None
+        # What this process last wrote, and what of it was archived from under it
+        self._written = None
+        self._archived = ({}, {})
+
+    def define(self, name, kind, help_text, buckets=None):
+        self._definitions[name] = (kind, help_text, buckets)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, labels=(), value=0):
+        with self._lock:
+            self._gauges[(name, tuple(labels))] = value
+
+    def set_counter(self, name, labels=(), value=0):
+        """For collectors mirroring a counter the process already keeps elsewhere"""
+        with self._lock:
+            self._counters[(name, tuple(labels))] = value
+
+    def add_gauge(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = self._definitions[name][2]
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        """Register a callable run just before each snapshot (for pool stats etc.)"""
+        self._collectors.append(collector)
+
+    # Multi-process aggregation
+
+    def start(self, directory, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        # A live worker rewrites its snapshot every flush_interval
+        self.stale_after = max(self.stale_after, flush_interval * 4)
+        os.makedirs(directory, exist_ok=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.archive_snapshot)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"Error writing metrics snapshot: {str(e)}")
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+
+    @contextmanager
+    def _directory_lock(self):
+        """Serializes snapshot writes against other workers archiving them"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, 'metrics.lock'), 'w') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def write_snapshot(self):
+        for collector in self._collectors:
+            collector(self)
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: [list(data[0]), data[1], data[2]] for key, data in self._histograms.items()}
+        path = self._snapshot_path()
+        with self._directory_lock():
+            if self._written is not None and not os.path.exists(path):
+                # Reaped as stale while still running: what it last wrote is
+                # in the archive now, so only write what came after
+                _add(self._archived, self._written)
+            archived_counters, archived_histograms = self._archived
+            for key, value in archived_counters.items():
+                counters[key] = counters.get(key, 0) - value
+            for key, (bucket_counts, total, count) in archived_histograms.items():
+                data = histograms[key]
+                histograms[key] = [[a - b for a, b in zip(data[0], bucket_counts)],
+                                   data[1] - total, data[2] - count]
+            _write_json(path, _dump(os.getpid(), counters, gauges, histograms))
+            self._written = (counters, histograms)
+
+    def archive_snapshot(self):
+        """Fold this process's counters into the archive; run at exit"""
+        self.write_snapshot()
+        with self._directory_lock():
+            self._archive(self._snapshot_path())
+        self._written = None
+
+    def _archive(self, path):
+        """Move a finished worker's counters and histograms into archive.json;
+        call with the directory lock held"""
+        try:
+            with open(path) as f:
+                counters, _, histograms = _load(json.load(f))
+        except FileNotFoundError:
+            return  # another worker got there first
+        except ValueError:
+            counters, histograms = {}, {}
+        archive_path = os.path.join(self.directory, 'archive.json')
+        try:
+            with open(archive_path) as f:
+                archive = _load(json.load(f))
+        except (OSError, ValueError):
+            archive = ({}, {}, {})
+        archived = (archive[0], archive[2])
+        _add(archived, (counters, histograms))
+        _write_json(archive_path, _dump(None, archived[0], {}, archived[1]))
+        os.remove(path)
+
+    def _merged(self):
+        counters, gauges, histograms = {}, {}, {}
+        merged = (counters, histograms)
+        now = time.time()
+        # Held throughout so a worker archiving its snapshot mid-scrape is
+        # counted once, either live or in the archive
+        with self._directory_lock():
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                try:
+                    with open(path) as f:
+                        snapshot = _load(json.load(f))
+                    pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                    stale = now - os.path.getmtime(path) > self.stale_after
+                except (OSError, ValueError):
+                    continue
+                if stale or not _pid_alive(pid):
+                    # Killed before it could archive its own snapshot
+                    self._archive(path)
+                    continue
+                _add(merged, (snapshot[0], snapshot[2]))
+                for key, value in snapshot[1].items():
+                    gauges[key] = gauges.get(key, 0) + value
+            try:
+                with open(os.path.join(self.directory, 'archive.json')) as f:
+                    archive = _load(json.load(f))
+            except (OSError, ValueError):
+                archive = ({}, {}, {})
+        _add(merged, (archive[0], archive[2]))
+        return counters, gauges, histograms
+
+    def render(self):
+        """Prometheus text exposition of all workers' metrics"""
+        self.write_snapshot()
+        counters, gauges, histograms = self._merged()
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._definitions.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(buckets) + ['+Inf'], bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {total}')
+                    lines.append(f'{name}_count{_labels(labels)} {count}')
+            else:
+                source = counters if kind == 'counter' else gauges
+                for (metric, labels), value in sorted(source.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+def _load(snapshot):
+    """counters, gauges, histograms dicts keyed by (name, labels) from a snapshot's JSON"""
+    def keyed(rows):
+        return {(name, tuple(map(tuple, labels))): value for name, labels, value in rows}
+    return keyed(snapshot['counters']), keyed(snapshot['gauges']), keyed(snapshot['histograms'])
+
+def _dump(pid, counters, gauges, histograms):
+    return {
+        'pid': pid,
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        'histograms': [[name, list(labels), data] for (name, labels), data in histograms.items()],
+    }
+
+def _add(into, extra):
+    """Add (counters, histograms) `extra` into `into`, in place"""
+    counters, histograms = into
+    for key, value in extra[0].items():
+        counters[key] = counters.get(key, 0) + value
+    for key, (bucket_counts, total, count) in extra[1].items():
+        merged = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+        merged[1] += total
+        merged[2] += count
+
+def _write_json(path, data):
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), delete=False, suffix='.tmp') as f:
+        json.dump(data, f)
+    os.replace(f.name, path)
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + escaped + '}'
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _statement_kind(statement):
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return word if word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OTHER'
+
+registry = MetricsRegistry()
+
+registry.define('gams_http_requests_in_flight', 'gauge', 'Requests currently being handled')
+registry.define('gams_http_request_duration_seconds', 'histogram',
+                'Request latency by Flask endpoint', LATENCY_BUCKETS)
+registry.define('gams_http_requests_total', 'counter', 'Requests by endpoint and status code')
+registry.define('gams_sql_statements_total', 'counter', 'SQL statements executed by kind')
+registry.define('gams_sql_statement_duration_seconds', 'histogram',
+                'SQL statement duration by kind', SQL_BUCKETS)
+registry.define('gams_sql_lock_errors_total', 'counter', "SQLite 'database is locked' errors")
+registry.define('gams_sql_lock_retries_total', 'counter', 'Retries after SQLite lock errors')
+registry.define('gams_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool')
+registry.define('gams_db_pool_checked_out', 'gauge', 'Connections currently checked out')
+registry.define('gams_db_pool_overflow', 'gauge', 'Connections open beyond the pool size')
+registry.define('gams_rate_limit_throttled_total', 'counter', 'Requests rejected by the rate limiter')
+registry.define('gams_tenant_engines_open', 'gauge', 'School databases with an open engine')
+registry.define('gams_tenant_engine_evictions_total', 'counter', 'School engines closed to make room for another')
+
+def record_lock_retry(source):
+    """Call from code that retries after a 'database is locked' error"""
+    registry.inc('gams_sql_lock_retries_total', (('source', source),))
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    registry.add_gauge('gams_http_requests_in_flight')
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    return response
+
+def _teardown_request(exc):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    registry.add_gauge('gams_http_requests_in_flight', amount=-1)
+    endpoint = request.endpoint or 'unknown'
+    status = g.pop('_metrics_status', 500)
+    registry.observe('gams_http_request_duration_seconds', time.perf_counter() - start,
+                     (('endpoint', endpoint),))
+    registry.inc('gams_http_requests_total', (('endpoint', endpoint), ('status', str(status))))
+
+def instrument_engine(engine, pool_gauges=True):
+    """Count statements on engine; pool_gauges=False for engines that come and go"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_metrics_start'].pop()
+        labels = (('kind', _statement_kind(statement)),)
+        registry.inc('gams_sql_statements_total', labels)
+        registry.observe('gams_sql_statement_duration_seconds', elapsed, labels)
+
+    @event.listens_for(engine, 'handle_error')
+    def _count_lock_errors(context):
+        if context.connection is not None:
+            starts = context.connection.info.get('_metrics_start')
+            if starts:
+                starts.pop()
+        if 'database is locked' in str(context.original_exception):
+            registry.inc('gams_sql_lock_errors_total')
+
+    @event.listens_for(engine, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        registry.inc('gams_db_pool_checkouts_total')
+
+    def collect_pool(reg):
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            reg.set_gauge('gams_db_pool_checked_out', value=pool.checkedout())
+        if hasattr(pool, 'overflow'):
+            reg.set_gauge('gams_db_pool_overflow', value=max(pool.overflow(), 0))
+
+    if pool_gauges:
+        registry.add_collector(collect_pool)
+
+def _collect_rate_limits(reg):
+    from rate_limit import rate_limiter
+    for (endpoint, kind), count in list(rate_limiter.throttled.items()):
+        reg.set_counter('gams_rate_limit_throttled_total', (('endpoint', endpoint), ('key', kind)), count)
+
+def _collect_tenants(reg):
+    from tenants import tenant_router
+    if tenant_router.enabled:
+        reg.set_gauge('gams_tenant_engines_open', value=len(tenant_router.engines))
+        reg.set_counter('gams_tenant_engine_evictions_total', value=tenant_router.engines.evictions)
+
+def init_app(app):
+    """Register request hooks; call before other before_request handlers so they are timed too"""
+    directory = app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'gams_metrics')
+    registry.start(directory, app.config.get('METRICS_FLUSH_INTERVAL', 5.0))
+    registry.add_collector(_collect_rate_limits)
+    registry.add_collector(_collect_tenants)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
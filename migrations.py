@@ -1,34 +1,380 @@
-from flask import Flask
-from models import db, Student, Teacher
-from sqlalchemy import text
+import argparse
 import os
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
 
-def run_migrations():
-    app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///school_new.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    db.init_app(app)
-    
-    with app.app_context():
-        try:
-            # Add is_approved column to Student table if it doesn't exist
-            with db.engine.connect() as conn:
-                conn.execute(text('ALTER TABLE student ADD COLUMN is_approved BOOLEAN DEFAULT FALSE'))
-                conn.execute(text('ALTER TABLE teacher ADD COLUMN is_approved BOOLEAN DEFAULT FALSE'))
+try:
+    import fcntl
+except ImportError:  # Windows: migrations are not locked across processes
+    fcntl = None
+
+# Same default as app.py, without importing the app (which migrates on import)
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.environ.get('GAMS_DATABASE') or os.path.join(BASE_DIR, 'GAMS_database.db')
+
+MIGRATIONS = []
+
+def migration(version, name):
+    """Register an upgrade step; steps run once each, in version order"""
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+class Migrator:
+    """Schema helpers for migrations. Every helper is safe to re-run.
+
+    Databases created by db.create_all() already have the latest tables,
+    so steps check before they change anything.
+    """
+
+    def __init__(self, engine, chunk=5000, pause=0.0):
+        self.engine = engine
+        self.chunk = chunk
+        self.pause = pause
+
+    def has_table(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def columns(self, table):
+        return {column['name'] for column in inspect(self.engine).get_columns(table)}
+
+    def add_column(self, table, name, ddl, default=None):
+        """ALTER TABLE ADD COLUMN if missing; O(1) in SQLite, so safe on big tables"""
+        # A missing table is created whole by db.create_all()
+        if not self.has_table(table) or name in self.columns(table):
+            return False
+        sql = f'ALTER TABLE "{table}" ADD COLUMN "{name}" {ddl}'
+        if default is not None:
+            sql += f' DEFAULT {default}'
+        with self.engine.begin() as conn:
+            conn.execute(text(sql))
+        print(f"  added column {table}.{name}")
+        return True
+
+    def create_index(self, name, table, columns, unique=False):
+        if not self.has_table(table):
+            return
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" '
+                f'ON "{table}" ({", ".join(columns)})'
+            ))
+
+    def backfill(self, table, assignments, where=None, params=None):
+        """UPDATE in committed rowid ranges so writers are never blocked for long"""
+        if not self.has_table(table):
+            return 0
+        with self.engine.connect() as conn:
+            last = conn.execute(text(f'SELECT MAX(rowid) FROM "{table}"')).scalar() or 0
+        condition = f' AND ({where})' if where else ''
+        updated = 0
+        for start in range(0, last, self.chunk):
+            with self.engine.begin() as conn:
+                result = conn.execute(text(
+                    f'UPDATE "{table}" SET {assignments} WHERE rowid > :start AND rowid <= :end{condition}'
+                ), dict(params or {}, start=start, end=start + self.chunk))
+                updated += max(result.rowcount, 0)
+            print(f"\r  backfilling {table}: {min(start + self.chunk, last) * 100 // last}% "
+                  f"({updated} rows updated)", end='', flush=True)
+            if self.pause:
+                time.sleep(self.pause)
+        if last:
+            print()
+        return updated
+
+    def by_subject_term(self, label, step):
+        """Run step(conn, subject_id, term, start, end) once for each subject and
+        term with attendance, committing after each one so writers are never
+        blocked for long. Dates are ISO strings, end exclusive; step returns
+        the rows it changed."""
+        from attendance_bitmap import term_bounds, term_for
+
+        if not self.has_table('attendance'):
+            return 0
+        with self.engine.connect() as conn:
+            spans = conn.execute(text(
+                'SELECT subject_id, MIN(date), MAX(date) FROM attendance GROUP BY subject_id'
+            )).all()
+        chunks = []
+        for subject_id, first, last in spans:
+            day, last = date.fromisoformat(str(first)[:10]), date.fromisoformat(str(last)[:10])
+            while day <= last:
+                term = term_for(day)
+                start, end = term_bounds(term)
+                day = end + timedelta(days=1)
+                chunks.append((subject_id, term, start.isoformat(), day.isoformat()))
+        changed = 0
+        for position, (subject_id, term, start, end) in enumerate(chunks, 1):
+            with self.engine.begin() as conn:
+                changed += step(conn, subject_id, term, start, end)
+            print(f"\r  {label}: {position * 100 // len(chunks)}% ({changed} rows)", end='', flush=True)
+            if self.pause:
+                time.sleep(self.pause)
+        if chunks:
+            print()
+        return changed
+
+    def rebuild_table(self, table, columns_sql, copy_columns=None):
+        """Recreate a table for changes ALTER TABLE cannot make (constraints, types, drops).
+
+        Follows SQLite's documented procedure: copy into a new table, drop
+        the old one, rename, then restore its indexes and triggers, all in
+        one IMMEDIATE transaction with foreign keys off. This copies the
+        whole table while holding the write lock; run it off-hours.
+        """
+        copy = ', '.join(f'"{column}"' for column in (copy_columns or sorted(self.columns(table))))
+        temporary = f'{table}__rebuild'
+        with self.engine.connect() as conn:
+            foreign_keys = conn.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            try:
+                # Explicit BEGIN: pysqlite would otherwise autocommit each DDL statement
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+                extras = conn.execute(text(
+                    "SELECT sql FROM sqlite_master WHERE tbl_name = :table "
+                    "AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+                ), {'table': table}).scalars().all()
+                conn.exec_driver_sql(f'CREATE TABLE "{temporary}" ({columns_sql})')
+                conn.exec_driver_sql(f'INSERT INTO "{temporary}" ({copy}) SELECT {copy} FROM "{table}"')
+                conn.exec_driver_sql(f'DROP TABLE "{table}"')
+                conn.exec_driver_sql(f'ALTER TABLE "{temporary}" RENAME TO "{table}"')
+                for sql in extras:
+                    conn.exec_driver_sql(sql)
+                violations = conn.exec_driver_sql(f'PRAGMA foreign_key_check("{table}")').all()
                 conn.commit()
-            print("Successfully added is_approved columns to Student and Teacher tables")
-            
-            # Update existing records to be approved
-            Student.query.update({Student.is_approved: True})
-            Teacher.query.update({Teacher.is_approved: True})
-            db.session.commit()
-            print("Successfully updated existing records to be approved")
-            
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.exec_driver_sql(f'PRAGMA foreign_keys={"ON" if foreign_keys else "OFF"}')
+        print(f"  rebuilt {table}" + (f" ({len(violations)} existing foreign key violations)" if violations else ''))
+
+# Migrations, oldest first. Never edit a released step; add a new one.
+
+@migration(1, 'approval flags on students and teachers')
+def approval_flags(m):
+    for table in ('student', 'teacher'):
+        if m.add_column(table, 'is_approved', 'BOOLEAN', default='0'):
+            # Accounts from before approvals existed stay usable
+            m.backfill(table, 'is_approved = 1')
+
+@migration(2, 'attendance change timestamps')
+def attendance_change_timestamps(m):
+    m.add_column('attendance', 'updated_at', 'DATETIME')
+    # Marks from before offline sync count as taken on their own date
+    m.backfill('attendance', "updated_at = date || ' 00:00:00.000000'", where='updated_at IS NULL')
+
+@migration(3, 'row versions for grade and attendance')
+def row_versions(m):
+    m.add_column('attendance', 'version', 'INTEGER NOT NULL', default='1')
+    m.add_column('grade', 'version', 'INTEGER NOT NULL', default='1')
+
+@migration(4, 'attendance and grade lookup indexes')
+def lookup_indexes(m):
+    m.create_index('ix_attendance_subject_date', 'attendance', ['subject_id', 'date', 'student_id'])
+    m.create_index('ix_grade_student_category', 'grade', ['student_id', 'category_id'])
+
+@migration(5, 'daily attendance rollup')
+def attendance_daily_rollup(m):
+    if not m.has_table('attendance'):
+        return
+    with m.engine.begin() as conn:
+        # Same shape as models.AttendanceDaily, in case create_all has not run
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS attendance_daily (
+                subject_id INTEGER NOT NULL REFERENCES subject (id),
+                date DATE NOT NULL,
+                present INTEGER NOT NULL,
+                absent INTEGER NOT NULL,
+                late INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (subject_id, date)
+            )
+        """))
+    # Days saved before the rollup existed; saves keep it current from here on
+    def count_days(conn, subject_id, term, start, end):
+        return conn.execute(text("""
+            INSERT OR REPLACE INTO attendance_daily (subject_id, date, present, absent, late, total)
+            SELECT subject_id, date, SUM(status = 'present'), SUM(status = 'absent'), SUM(status = 'late'), COUNT(*)
+            FROM attendance WHERE subject_id = :subject_id AND date >= :start AND date < :end
+            GROUP BY subject_id, date
+        """), {'subject_id': subject_id, 'start': start, 'end': end}).rowcount
+
+    m.by_subject_term('counting attendance days', count_days)
+
+@migration(6, 'sync batch keys unique per teacher')
+def sync_batch_keys_per_teacher(m):
+    if not m.has_table('sync_batch'):
+        return
+    unique = [constraint['column_names'] for constraint in inspect(m.engine).get_unique_constraints('sync_batch')]
+    if ['key'] not in unique:
+        return
+    # A key another teacher's client already used made every retry fail
+    m.rebuild_table('sync_batch', """
+        id INTEGER NOT NULL PRIMARY KEY,
+        "key" VARCHAR(64) NOT NULL,
+        teacher_id INTEGER NOT NULL REFERENCES teacher (id),
+        client_ts DATETIME NOT NULL,
+        received_at DATETIME,
+        applied INTEGER NOT NULL,
+        stale INTEGER NOT NULL,
+        UNIQUE (teacher_id, "key")
+    """)
+
+@migration(7, 'one grade per student and category')
+def unique_grades(m):
+    if not m.has_table('grade'):
+        return
+    indexes = {index['name']: index for index in inspect(m.engine).get_indexes('grade')}
+    if indexes.get('ix_grade_student_category', {}).get('unique'):
+        return
+    # Keep the copy integrity.py would keep: the most recently graded
+    duplicates = """
+        SELECT id, keep FROM (
+            SELECT id, FIRST_VALUE(id) OVER (
+                PARTITION BY student_id, category_id ORDER BY date DESC, id DESC
+            ) AS keep FROM grade
+        ) WHERE id != keep
+    """
+    with m.engine.begin() as conn:
+        # Grades cannot be re-entered from anywhere else, so the extra copies
+        # are moved to grade_duplicate rather than just deleted
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS grade_duplicate AS "
+            "SELECT grade.*, 0 AS kept_id, '' AS removed_at FROM grade WHERE 0"
+        ))
+        moved = conn.execute(text(
+            f"INSERT INTO grade_duplicate SELECT grade.*, d.keep, :now FROM grade JOIN ({duplicates}) d USING (id)"
+        ), {'now': datetime.utcnow().isoformat(sep=' ')}).rowcount
+        conn.execute(text(f"DELETE FROM grade WHERE id IN (SELECT id FROM ({duplicates}))"))
+        conn.execute(text('DROP INDEX IF EXISTS ix_grade_student_category'))
+        conn.execute(text('CREATE UNIQUE INDEX ix_grade_student_category ON grade (student_id, category_id)'))
+    if moved:
+        print(f"  moved {moved} duplicate grades to grade_duplicate (kept_id is the grade kept in their place)")
+
+@migration(8, 'attendance bitmaps from existing attendance')
+def attendance_bitmaps(m):
+    from attendance_bitmap import STATUS_CODES, set_mark
+
+    if not m.has_table('attendance'):
+        return
+    with m.engine.begin() as conn:
+        # Same shape as models.AttendanceBitmap, in case create_all has not run
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS attendance_bitmap (
+                id INTEGER NOT NULL PRIMARY KEY,
+                student_id INTEGER NOT NULL REFERENCES student (id),
+                subject_id INTEGER NOT NULL REFERENCES subject (id),
+                term VARCHAR(10) NOT NULL,
+                bits BLOB NOT NULL,
+                UNIQUE (student_id, subject_id, term)
+            )
+        """))
+
+    # Marks saved before the bitmaps existed; saves keep them current from
+    # here on. Bitmaps written since deploy only hold the newer days, so each
+    # subject's term is repacked whole.
+    def repack(conn, subject_id, term, start, end):
+        first_day = date.fromisoformat(start)
+        packed = {}
+        for student_id, day, status in conn.execute(text(
+            "SELECT student_id, date, status FROM attendance "
+            "WHERE subject_id = :subject_id AND date >= :start AND date < :end"
+        ), {'subject_id': subject_id, 'start': start, 'end': end}):
+            index = (date.fromisoformat(str(day)[:10]) - first_day).days
+            set_mark(packed.setdefault(student_id, bytearray()), index, STATUS_CODES.get(status, 0))
+        conn.execute(text("DELETE FROM attendance_bitmap WHERE subject_id = :subject_id AND term = :term"),
+                     {'subject_id': subject_id, 'term': term})
+        if packed:
+            conn.execute(text(
+                "INSERT INTO attendance_bitmap (student_id, subject_id, term, bits) "
+                "VALUES (:student_id, :subject_id, :term, :bits)"
+            ), [{'student_id': student_id, 'subject_id': subject_id, 'term': term, 'bits': bytes(bits)}
+                for student_id, bits in packed.items()])
+        return len(packed)
+
+    m.by_subject_term('packing attendance bitmaps', repack)
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL,
+                seconds REAL NOT NULL
+            )
+        """))
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0]: row[1] for row in conn.execute(text("SELECT version, applied_at FROM schema_version"))}
+
+class _ProcessLock:
+    """Keeps several workers starting at once from migrating together"""
+
+    def __init__(self, engine):
+        database = engine.url.database
+        self.path = f'{database}.migrate.lock' if database and database != ':memory:' else None
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None and self.path:
+            self.handle = open(self.path, 'w')
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+
+def upgrade(engine, target=None, chunk=5000, pause=0.0):
+    """Apply pending migrations up to `target` (default: all); returns the versions applied"""
+    migrator = Migrator(engine, chunk=chunk, pause=pause)
+    done = []
+    with _ProcessLock(engine):
+        applied = applied_versions(engine)
+        for version, name, fn in MIGRATIONS:
+            if version in applied or (target is not None and version > target):
+                continue
+            print(f"Migration {version}: {name}")
+            start = time.perf_counter()
+            fn(migrator)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO schema_version (version, name, applied_at, seconds) VALUES (:v, :n, :at, :s)"
+                ), {'v': version, 'n': name, 'at': datetime.utcnow().isoformat(sep=' '),
+                    's': time.perf_counter() - start})
+            done.append(version)
+    return done
+
+def status(engine):
+    applied = applied_versions(engine)
+    for version, name, _ in MIGRATIONS:
+        state = f"applied {applied[version]}" if version in applied else 'pending'
+        print(f"{version:>4}  {name:<45} {state}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show or apply schema migrations.')
+    parser.add_argument('command', choices=['status', 'upgrade'], nargs='?', default='status')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite database file')
+    parser.add_argument('--target', type=int, help='Stop after this version')
+    parser.add_argument('--chunk', type=int, default=5000, help='Rows per backfill transaction')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between backfill chunks')
+    args = parser.parse_args()
+
+    engine = create_engine(f'sqlite:///{args.db}')
+    if args.command == 'status':
+        status(engine)
+    else:
+        try:
+            versions = upgrade(engine, args.target, args.chunk, args.pause)
+            print(f"Applied {len(versions)} migrations" if versions else "Database is up to date")
         except Exception as e:
             print(f"Error during migration: {str(e)}")
-            db.session.rollback()
             raise
-
-if __name__ == '__main__':
-    run_migrations() 
\ No newline at end of file
@@ -10,7 +10,17 @@ from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Dat
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'GAMS_database.db')
 
-db = SQLAlchemy()
+class RoutedSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy whose default engine can be chosen per request (see tenants.py)"""
+    router = None  # callable returning an engine, or None for SQLALCHEMY_DATABASE_URI
+
+    @property
+    def engines(self):
+        engines = super().engines
+        engine = self.router() if self.router is not None else None
+        return engines if engine is None else {**engines, None: engine}
+
+db = RoutedSQLAlchemy()
 
 # User Models
 class User(UserMixin, db.Model):
@@ -92,6 +102,7 @@ class Teacher(db.Model):
 
 # Attendance Model
 class Attendance(db.Model):
+    __table_args__ = (db.Index('ix_attendance_subject_date', 'subject_id', 'date', 'student_id'),)
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
@@ -100,6 +111,12 @@ class Attendance(db.Model):
     date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), nullable=False)
     notes = db.Column(db.Text, nullable=True)
+    # When the mark was taken; offline syncs use the client's clock
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every update; ORM updates only apply if it is unchanged since the read
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
 # Add this new model for grade categories
 class GradeCategory(db.Model):
@@ -119,6 +136,8 @@ class GradeCategory(db.Model):
 # Modify the Grade model to include category
 class Grade(db.Model):
     __tablename__ = 'grade'
+    # One grade per student and category; concurrent first saves must not both insert
+    __table_args__ = (db.Index('ix_grade_student_category', 'student_id', 'category_id', unique=True),)
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
@@ -127,10 +146,13 @@ class Grade(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('grade_category.id'), nullable=False)
     grade = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Relationships
     subject = db.relationship('Subject', backref='subject_grades')
 
+    __mapper_args__ = {'version_id_col': version}
+
 # Class Model
 class Class(db.Model):
     __tablename__ = 'class'
@@ -149,6 +171,88 @@ class ClassStudent(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     date_joined = db.Column(db.Date, default=datetime.utcnow)
 
+# Packed per-term attendance: 2 bits per calendar day since the term start
+# (0 = no record, 1 = present, 2 = absent, 3 = late). The attendance table
+# remains the source of truth; this is a read-optimised copy.
+class AttendanceBitmap(db.Model):
+    __tablename__ = 'attendance_bitmap'
+    __table_args__ = (db.UniqueConstraint('student_id', 'subject_id', 'term'),)
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    term = db.Column(db.String(10), nullable=False)
+    bits = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+# Per-subject attendance counts for each day, recounted by every attendance
+# save so trend lines never read the attendance table (attendance_rollup.py)
+class AttendanceDaily(db.Model):
+    __tablename__ = 'attendance_daily'
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+# Frozen per-term results for one student, written when the term is closed.
+# Cumulative totals run through this term, so the latest row gives the GPA.
+class TranscriptTerm(db.Model):
+    __tablename__ = 'transcript_term'
+    __table_args__ = (db.UniqueConstraint('student_id', 'term'),)
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    term = db.Column(db.String(10), nullable=False)
+    # JSON list of [subject_id, subject name, average, letter, grade points]
+    results = db.Column(db.Text, nullable=False, default='[]')
+    points = db.Column(db.Float, nullable=False, default=0)
+    graded = db.Column(db.Integer, nullable=False, default=0)
+    cumulative_points = db.Column(db.Float, nullable=False, default=0)
+    cumulative_graded = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    recorded_days = db.Column(db.Integer, nullable=False, default=0)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TermClosure(db.Model):
+    __tablename__ = 'term_closure'
+    term = db.Column(db.String(10), primary_key=True)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    students = db.Column(db.Integer, nullable=False, default=0)
+
+# Idempotency record for an offline attendance batch; keys are chosen by
+# each teacher's client, so they are only unique per teacher
+class SyncBatch(db.Model):
+    __tablename__ = 'sync_batch'
+    __table_args__ = (db.UniqueConstraint('teacher_id', 'key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
+    client_ts = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    applied = db.Column(db.Integer, nullable=False, default=0)
+    stale = db.Column(db.Integer, nullable=False, default=0)
+
+# Append-only journal of grade and attendance changes. Rows are kept
+# compact: `ref` is the grade category id or the attendance date ordinal,
+# `value` is the grade or an attendance status code.
+class ChangeJournal(db.Model):
+    __tablename__ = 'change_journal'
+    id = db.Column(db.Integer, primary_key=True)
+    recorded_at = db.Column(db.Float, nullable=False)
+    kind = db.Column(db.String(1), nullable=False)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    subject_id = db.Column(db.Integer, nullable=False)
+    teacher_id = db.Column(db.Integer, nullable=False)
+    ref = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+
+# Per-user counter bumped whenever approval state or role changes, so
+# identities cached in sessions can be revoked without a per-request query
+class IdentityRevocation(db.Model):
+    __tablename__ = 'identity_revocation'
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.Float, nullable=False, index=True)
+
 def create_default_subjects(app):
     """Create the default subjects in the system"""
     with app.app_context():
@@ -0,0 +1,210 @@
+import argparse
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from flask import g, request
+from flask_login import current_user
+
+PROFILE_HEADER = 'X-Profile'
+MODES = ('cprofile', 'sample')
+
+_active = threading.local()
+
+class StackSampler:
+    """Samples one thread's stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def write(self, path):
+        """Brendan Gregg's collapsed format, one 'frame;frame;frame count' per line"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+class RequestProfiler:
+    """Profiles selected requests and writes the results to PROFILE_DIR.
+
+    A request is profiled when it carries the X-Profile header and is
+    authorised (the header equals PROFILE_TOKEN, or the user is an admin),
+    or when it falls within PROFILE_SAMPLE_RATE. With PROFILE_ENABLED off
+    no hooks or engine listeners are installed at all.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.token = None
+        self.sample_rate = 0.0
+        self.endpoints = None
+        self.mode = 'cprofile'
+        self.interval = 0.005
+
+    def init_app(self, app, engine):
+        self.enabled = app.config.get('PROFILE_ENABLED', False)
+        if not self.enabled:
+            return
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'gams_profiles')
+        self.token = app.config.get('PROFILE_TOKEN')
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.endpoints = app.config.get('PROFILE_ENDPOINTS')
+        self.mode = app.config.get('PROFILE_MODE', 'cprofile')
+        self.interval = app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005)
+        os.makedirs(self.directory, exist_ok=True)
+        self._listen(engine)
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+
+    def attach(self, engine):
+        """Also time SQL on another engine, such as a school's"""
+        if self.enabled:
+            self._listen(engine)
+
+    def _listen(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if getattr(_active, 'sql', None) is not None:
+                conn.info.setdefault('_profile_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            sql = getattr(_active, 'sql', None)
+            starts = conn.info.get('_profile_start')
+            if sql is None or not starts:
+                return
+            entry = sql.setdefault(' '.join(statement.split()), [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - starts.pop()
+
+    def _requested_mode(self):
+        value = request.headers.get(PROFILE_HEADER)
+        if value is not None:
+            mode, _, token = value.partition(':')
+            if mode not in MODES:
+                mode, token = self.mode, value
+            if self.token and hmac.compare_digest(token, self.token):
+                return mode
+            if current_user.is_authenticated and current_user.is_admin:
+                return mode
+            return None
+        if self.sample_rate and random.random() < self.sample_rate:
+            if self.endpoints is None or request.endpoint in self.endpoints:
+                return self.mode
+        return None
+
+    def _start(self):
+        mode = self._requested_mode()
+        if mode is None:
+            return
+        _active.sql = {}
+        if mode == 'sample':
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        g._profile = (mode, profiler, time.perf_counter())
+
+    def _finish(self, exc):
+        state = g.pop('_profile', None)
+        if state is None:
+            return
+        mode, profiler, start = state
+        elapsed = time.perf_counter() - start
+        if mode == 'sample':
+            profiler.stop()
+        else:
+            profiler.disable()
+        sql, _active.sql = _active.sql, None
+
+        name = '{}_{}_{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'), re.sub(r'[^\w.-]', '_', request.endpoint or 'unknown'), os.getpid()
+        )
+        base = os.path.join(self.directory, name)
+        try:
+            if mode == 'sample':
+                profile_file = base + '.collapsed'
+                profiler.write(profile_file)
+            else:
+                profile_file = base + '.pstats'
+                profiler.dump_stats(profile_file)
+            statements = sorted(sql.items(), key=lambda item: item[1][1], reverse=True)
+            summary = {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.full_path,
+                'mode': mode,
+                'duration_ms': round(elapsed * 1000, 2),
+                'error': repr(exc) if exc else None,
+                'profile': os.path.basename(profile_file),
+                'sql_count': sum(count for count, _ in sql.values()),
+                'sql_ms': round(sum(total for _, total in sql.values()) * 1000, 2),
+                'sql': [
+                    {'statement': statement, 'count': count, 'total_ms': round(total * 1000, 2)}
+                    for statement, (count, total) in statements
+                ],
+            }
+            with open(base + '.json', 'w') as f:
+                json.dump(summary, f, indent=2)
+        except Exception as e:
+            print(f"Error writing request profile: {str(e)}")
+
+request_profiler = RequestProfiler()
+
+def show(path, limit=25):
+    """Print a profile summary and its top functions or stacks"""
+    base = os.path.splitext(path)[0]
+    if os.path.exists(base + '.json'):
+        with open(base + '.json') as f:
+            summary = json.load(f)
+        print(f"{summary['method']} {summary['path']} ({summary['endpoint']}): {summary['duration_ms']} ms, "
+              f"{summary['sql_count']} statements in {summary['sql_ms']} ms")
+        for entry in summary['sql'][:10]:
+            print(f"  {entry['count']:>4}x {entry['total_ms']:>9.2f} ms  {entry['statement'][:100]}")
+    if os.path.exists(base + '.pstats'):
+        pstats.Stats(base + '.pstats').sort_stats('cumulative').print_stats(limit)
+    elif os.path.exists(base + '.collapsed'):
+        with open(base + '.collapsed') as f:
+            for line in f.readlines()[:limit]:
+                stack, count = line.rsplit(' ', 1)
+                print(f"{count.strip():>6}  {stack.split(';')[-1]}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show a request profile written by the profiling hook.')
+    parser.add_argument('path', help='Any of the .json, .pstats or .collapsed files for one request')
+    parser.add_argument('--limit', type=int, default=25)
+    args = parser.parse_args()
+    show(args.path, args.limit)
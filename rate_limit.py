@@ -0,0 +1,164 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from flask import request
+import tenants
+
+# Get absolute path for the shared limiter database
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RATE_LIMIT_DB_PATH = os.path.join(BASE_DIR, 'GAMS_ratelimit.db')
+
+# endpoint -> {key kind: (burst capacity, period in seconds)}
+DEFAULT_LIMITS = {
+    'login': {'ip': (20, 60), 'username': (5, 300)},
+    'student_register': {'ip': (5, 3600)},
+    'teacher_register': {'ip': (5, 3600)},
+}
+
+class MemoryBackend:
+    """Token buckets in a dict; only limits within one worker process"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune()
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _prune(self):
+        # Drop the oldest half; an idle bucket refills to full anyway
+        by_age = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in by_age[:len(by_age) // 2]:
+            del self._buckets[key]
+
+class SQLiteBackend:
+    """Token buckets in a small SQLite file shared by every worker.
+
+    Each check is a single UPSERT ... RETURNING, so it is atomic across
+    processes without an explicit transaction. Every row records when its
+    bucket will be full again; a full bucket behaves exactly like a missing
+    one, so every `prune_every` checks those rows are deleted and the table
+    only holds keys seen recently.
+    """
+
+    def __init__(self, path=RATE_LIMIT_DB_PATH, prune_every=1000):
+        self.path = path
+        self.prune_every = prune_every
+        self._calls = itertools.count(1)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS bucket (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                stamp REAL NOT NULL,
+                allowed INTEGER NOT NULL,
+                full_at REAL NOT NULL DEFAULT 0
+            )
+        """)
+        if 'full_at' not in {row[1] for row in conn.execute('PRAGMA table_info(bucket)')}:
+            # Files from before pruning; their rows go at the first prune
+            conn.execute('ALTER TABLE bucket ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_bucket_full_at ON bucket (full_at)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate, now):
+        # SET expressions all see the old row, so the new token count is spelled out for full_at
+        tokens, allowed = self._connection().execute("""
+            INSERT INTO bucket (key, tokens, stamp, allowed, full_at)
+            VALUES (:key, :capacity - 1, :now, 1, :now + 1 / :rate)
+            ON CONFLICT(key) DO UPDATE SET
+                allowed = MIN(:capacity, tokens + (:now - stamp) * :rate) >= 1,
+                tokens = MIN(:capacity, tokens + (:now - stamp) * :rate)
+                         - (MIN(:capacity, tokens + (:now - stamp) * :rate) >= 1),
+                full_at = :now + (:capacity - MIN(:capacity, tokens + (:now - stamp) * :rate)
+                                  + (MIN(:capacity, tokens + (:now - stamp) * :rate) >= 1)) / :rate,
+                stamp = :now
+            RETURNING tokens, allowed
+        """, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}).fetchone()
+        if next(self._calls) % self.prune_every == 0:
+            self.prune(now)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+    def prune(self, now=None):
+        """Delete buckets that have refilled; returns how many"""
+        return self._connection().execute(
+            'DELETE FROM bucket WHERE full_at <= ?', (time.time() if now is None else now,)
+        ).rowcount
+
+class RateLimiter:
+    """Token-bucket limiter for unauthenticated endpoints, keyed by IP and username"""
+
+    def __init__(self):
+        self.enabled = False
+        self.limits = DEFAULT_LIMITS
+        self.backend = None
+        self.throttled = Counter()
+        self.allowed = Counter()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.limits = app.config.get('RATE_LIMITS', DEFAULT_LIMITS)
+        if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'sqlite':
+            self.backend = SQLiteBackend(app.config.get('RATE_LIMIT_SQLITE_PATH', RATE_LIMIT_DB_PATH))
+        else:
+            self.backend = MemoryBackend()
+        app.before_request(self.check_request)
+
+    def check_request(self):
+        """Reject over-limit requests before the view runs any queries"""
+        if not self.enabled or request.method != 'POST':
+            return None
+        rules = self.limits.get(request.endpoint)
+        if not rules:
+            return None
+
+        identities = {'ip': request.remote_addr or 'unknown'}
+        if 'username' in rules:
+            username = (request.form.get('username') or '').strip().lower()
+            if username:
+                # Usernames are only unique within a school
+                identities['username'] = f'{tenants.current()}/{username}' if tenants.current() else username
+
+        now = time.time()
+        for kind, identity in identities.items():
+            capacity, period = rules[kind]
+            allowed, retry_after = self.backend.take(
+                f'{request.endpoint}:{kind}:{identity}', capacity, capacity / period, now
+            )
+            if not allowed:
+                self.throttled[(request.endpoint, kind)] += 1
+                seconds = max(1, int(retry_after + 0.999))
+                return (f'Too many attempts. Please wait {seconds} seconds and try again.',
+                        429, {'Retry-After': str(seconds), 'Content-Type': 'text/plain; charset=utf-8'})
+        self.allowed[request.endpoint] += 1
+        return None
+
+    def metrics(self):
+        return {
+            'allowed': dict(self.allowed),
+            'throttled': {f'{endpoint}:{kind}': count for (endpoint, kind), count in self.throttled.items()},
+        }
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,200 @@
+import argparse
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+try:
+    from weasyprint import HTML
+except ImportError:  # PDF output is optional
+    HTML = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+TEMPLATE = 'report_card.html'
+
+# Keeps IN lists well under SQLite's bound-parameter limit
+ID_CHUNK = 500
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def collect_cohort(term, subject_id=None, class_id=None):
+    """Every report card's data for the cohort as plain dicts, from a handful of bulk queries"""
+    from app import get_letter_grade
+    from models import (db, Student, Subject, StudentSubject, Teacher, GradeCategory, Grade,
+                        ClassStudent, AttendanceBitmap)
+    import attendance_bitmap
+
+    query = db.session.query(Student.id, Student.student_id, Student.first_name, Student.last_name) \
+        .filter(Student.is_approved == True)
+    if subject_id is not None:
+        query = query.join(StudentSubject, StudentSubject.student_id == Student.id) \
+            .filter(StudentSubject.subject_id == subject_id)
+    if class_id is not None:
+        query = query.join(ClassStudent, ClassStudent.student_id == Student.id) \
+            .filter(ClassStudent.class_id == class_id)
+    students = query.distinct().order_by(Student.last_name, Student.first_name).all()
+    ids = [student.id for student in students]
+    # Grades count towards the term they were given in, like attendance
+    first, last = attendance_bitmap.term_bounds(term)
+    graded_from = datetime.combine(first, datetime.min.time())
+    graded_before = datetime.combine(last + timedelta(days=1), datetime.min.time())
+
+    subjects = {subject.id: subject.name for subject in Subject.query}
+    teachers = {}
+    for teacher in Teacher.query.order_by(Teacher.id):
+        teachers.setdefault(teacher.subject_id, f"{teacher.first_name} {teacher.last_name}")
+    categories = {
+        category.id: category.name
+        for category in GradeCategory.query.order_by(GradeCategory.created_date)
+    }
+
+    enrolled, grades, bitmaps = {}, {}, {}
+    for chunk in _chunks(ids, ID_CHUNK):
+        for student_id, enrolled_subject in db.session.query(
+            StudentSubject.student_id, StudentSubject.subject_id
+        ).filter(StudentSubject.student_id.in_(chunk)):
+            enrolled.setdefault(student_id, set()).add(enrolled_subject)
+        for student_id, grade_subject, category_id, value in db.session.query(
+            Grade.student_id, Grade.subject_id, Grade.category_id, Grade.grade
+        ).filter(
+            Grade.student_id.in_(chunk), Grade.date >= graded_from, Grade.date < graded_before
+        ).order_by(Grade.category_id, Grade.id):
+            grades.setdefault((student_id, grade_subject), []).append((category_id, value))
+        for student_id, bitmap_subject, bits in db.session.query(
+            AttendanceBitmap.student_id, AttendanceBitmap.subject_id, AttendanceBitmap.bits
+        ).filter(AttendanceBitmap.student_id.in_(chunk), AttendanceBitmap.term == term):
+            bitmaps[(student_id, bitmap_subject)] = attendance_bitmap.counts(bits)
+
+    empty = {'present': 0, 'absent': 0, 'late': 0, 'total': 0}
+    cards = []
+    for student in students:
+        subject_cards = []
+        present = total = 0
+        for enrolled_subject in sorted(enrolled.get(student.id, ()), key=lambda s: subjects.get(s, '')):
+            # Same rule as student_grades(): one grade per category, averaged
+            marks = {}
+            for category_id, value in grades.get((student.id, enrolled_subject), ()):
+                marks.setdefault(category_id, value)
+            average = sum(marks.values()) / len(marks) if marks else None
+            tally = dict(bitmaps.get((student.id, enrolled_subject), empty))
+            tally['percentage'] = tally['present'] / tally['total'] * 100 if tally['total'] else None
+            present += tally['present']
+            total += tally['total']
+            subject_cards.append({
+                'subject_id': enrolled_subject,
+                'name': subjects.get(enrolled_subject, f'Subject {enrolled_subject}'),
+                'teacher': teachers.get(enrolled_subject, 'Not Assigned'),
+                'grades': [
+                    {'category': categories.get(category_id, '?'), 'grade': value}
+                    for category_id, value in marks.items()
+                ],
+                'average': average,
+                'letter': get_letter_grade(average),
+                'attendance': tally,
+            })
+        averages = [subject['average'] for subject in subject_cards if subject['average'] is not None]
+        overall = sum(averages) / len(averages) if averages else None
+        cards.append({
+            'id': student.id,
+            'student_id': student.student_id,
+            'name': f"{student.first_name} {student.last_name}",
+            'subjects': subject_cards,
+            'overall_average': overall,
+            'overall_letter': get_letter_grade(overall),
+            'attendance_percentage': present / total * 100 if total else None,
+        })
+    return cards
+
+_environment = None
+
+def _render_chunk(cards, term, fmt, out_dir, generated_at):
+    """Worker: render one partition; writes files, or returns (name, bytes) for the zip"""
+    global _environment
+    if _environment is None:
+        loader = FileSystemLoader([BASE_DIR, os.path.join(BASE_DIR, 'templates')])
+        _environment = Environment(loader=loader, autoescape=select_autoescape(['html']))
+    template = _environment.get_template(TEMPLATE)
+
+    rendered = []
+    for card in cards:
+        html = template.render(card=card, term=term, generated_at=generated_at)
+        name = f"{card['student_id']}_{card['id']}.{fmt}"
+        data = HTML(string=html, base_url=BASE_DIR).write_pdf() if fmt == 'pdf' else html.encode('utf-8')
+        if out_dir:
+            with open(os.path.join(out_dir, name), 'wb') as f:
+                f.write(data)
+            rendered.append((name, len(data)))
+        else:
+            rendered.append((name, data))
+    return rendered
+
+def generate(term, out_dir=None, zip_path=None, fmt='html', workers=None, chunk_size=50,
+             subject_id=None, class_id=None):
+    """Render the cohort's report cards across a process pool and print throughput"""
+    if fmt == 'pdf' and HTML is None:
+        raise RuntimeError("PDF output needs weasyprint; install it or use --format html")
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    cards = collect_cohort(term, subject_id, class_id)
+    fetched = time.perf_counter()
+    print(f"Fetched {len(cards)} students in {fetched - start:.2f}s")
+    if not cards:
+        return 0
+
+    generated_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    archive = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) if zip_path else None
+    try:
+        # spawn: the parent holds DB connections and background threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_render_chunk, chunk, term, fmt, None if archive else out_dir, generated_at)
+                for chunk in _chunks(cards, chunk_size)
+            ]
+            for future in futures:
+                for name, data in future.result():
+                    if archive:
+                        archive.writestr(name, data)
+                    written += 1
+    finally:
+        if archive:
+            archive.close()
+
+    rendered = time.perf_counter()
+    print(f"Rendered {written} report cards with {workers} workers in {rendered - fetched:.2f}s "
+          f"({written / (rendered - fetched):.1f} students/s)")
+    print(f"Total {rendered - start:.2f}s, {written / (rendered - start):.1f} students/s end to end")
+    return written
+
+if __name__ == '__main__':
+    from app import app
+    import attendance_bitmap
+
+    parser = argparse.ArgumentParser(description='Generate report cards for a cohort.')
+    parser.add_argument('--term', default=attendance_bitmap.term_for(date.today()), help='e.g. 2024-T2')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--out', help='Directory to write one file per student')
+    output.add_argument('--zip', help='Zip archive to write')
+    parser.add_argument('--format', choices=['html', 'pdf'], default='html')
+    parser.add_argument('--workers', type=int, help='Processes to render with (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Students per task')
+    parser.add_argument('--subject-id', type=int, help='Only students enrolled in this subject')
+    parser.add_argument('--class-id', type=int, help='Only students in this class section')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            generate(args.term, args.out, args.zip, args.format, args.workers, args.chunk_size,
+                     args.subject_id, args.class_id)
+        except Exception as e:
+            print(f"Error generating report cards: {str(e)}")
+            raise
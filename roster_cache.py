@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Student, StudentSubject, Class, ClassStudent
+import tenants
+
+# Lightweight, session-independent view of a student for roster pages
+RosterEntry = namedtuple('RosterEntry', ['id', 'student_id', 'first_name', 'last_name'])
+
+# Models whose changes alter who is on a roster or how they are shown
+ENROLLMENT_MODELS = (Student, StudentSubject, Class, ClassStudent)
+
+class RosterCache:
+    """Caches roster snapshots per (school, subject, class).
+
+    Snapshots are dropped whenever a commit touches enrollment. The TTL only
+    bounds staleness for changes made by other worker processes or scripts.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._rosters = {}
+        self._lock = threading.Lock()
+
+    def get(self, subject_id, class_id=None):
+        key = (tenants.current(), subject_id, class_id)
+        with self._lock:
+            cached = self._rosters.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        roster = self._load(subject_id, class_id)
+        with self._lock:
+            self._rosters[key] = (time.monotonic(), roster)
+        return roster
+
+    def invalidate(self):
+        with self._lock:
+            self._rosters.clear()
+
+    def _load(self, subject_id, class_id):
+        query = db.session.query(
+            Student.id, Student.student_id, Student.first_name, Student.last_name
+        )
+        if class_id is not None:
+            query = query.join(ClassStudent, ClassStudent.student_id == Student.id).filter(
+                ClassStudent.class_id == class_id
+            )
+        else:
+            query = query.join(StudentSubject, StudentSubject.student_id == Student.id).filter(
+                StudentSubject.subject_id == subject_id
+            )
+        rows = query.order_by(Student.last_name, Student.first_name).all()
+        return tuple(RosterEntry(*row) for row in rows)
+
+roster_cache = RosterCache()
+
+@event.listens_for(Session, 'after_flush')
+def _track_enrollment_changes(session, flush_context):
+    # Secondary-table appends (student.subjects.extend) surface as a dirty Student
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ENROLLMENT_MODELS):
+            session.info['roster_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('roster_changed', False):
+        roster_cache.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('roster_changed', None)
@@ -0,0 +1,132 @@
+import re
+from sqlalchemy import text
+from models import db
+
+# Full-text index over students and teachers. Row ids are derived from the
+# source row so triggers can find them: 2*id for students, 2*id+1 for teachers.
+CREATE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS person_search USING fts5(
+        kind UNINDEXED, ref_id UNINDEXED,
+        student_id, first_name, last_name, email, username,
+        tokenize = "unicode61 tokenchars '@._-'",
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_student_ai AFTER INSERT ON student BEGIN
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT new.id * 2, 'student', new.id, new.student_id, new.first_name, new.last_name, new.email,
+               (SELECT username FROM user WHERE id = new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_student_au AFTER UPDATE ON student BEGIN
+        DELETE FROM person_search WHERE rowid = old.id * 2;
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT new.id * 2, 'student', new.id, new.student_id, new.first_name, new.last_name, new.email,
+               (SELECT username FROM user WHERE id = new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_student_ad AFTER DELETE ON student BEGIN
+        DELETE FROM person_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_teacher_ai AFTER INSERT ON teacher BEGIN
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT new.id * 2 + 1, 'teacher', new.id, NULL, new.first_name, new.last_name, email, username
+        FROM user WHERE id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_teacher_au AFTER UPDATE ON teacher BEGIN
+        DELETE FROM person_search WHERE rowid = old.id * 2 + 1;
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT new.id * 2 + 1, 'teacher', new.id, NULL, new.first_name, new.last_name, email, username
+        FROM user WHERE id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_teacher_ad AFTER DELETE ON teacher BEGIN
+        DELETE FROM person_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS person_search_user_au AFTER UPDATE OF username, email ON user BEGIN
+        UPDATE person_search SET username = new.username
+        WHERE kind = 'student' AND rowid IN (SELECT id * 2 FROM student WHERE user_id = new.id);
+        UPDATE person_search SET username = new.username, email = new.email
+        WHERE kind = 'teacher' AND rowid IN (SELECT id * 2 + 1 FROM teacher WHERE user_id = new.id);
+    END
+    """,
+]
+
+def install():
+    """Create the index and its triggers, populating it on first install"""
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'person_search'"
+    )).first()
+    for statement in CREATE_STATEMENTS:
+        db.session.execute(text(statement))
+    if not exists:
+        rebuild()
+    db.session.commit()
+
+def rebuild():
+    """Repopulate the index from the student and teacher tables"""
+    db.session.execute(text("DELETE FROM person_search"))
+    db.session.execute(text("""
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT s.id * 2, 'student', s.id, s.student_id, s.first_name, s.last_name, s.email, u.username
+        FROM student s LEFT JOIN user u ON u.id = s.user_id
+    """))
+    db.session.execute(text("""
+        INSERT INTO person_search(rowid, kind, ref_id, student_id, first_name, last_name, email, username)
+        SELECT t.id * 2 + 1, 'teacher', t.id, NULL, t.first_name, t.last_name, u.email, u.username
+        FROM teacher t LEFT JOIN user u ON u.id = t.user_id
+    """))
+
+def build_match(query):
+    """Turn free text into an FTS5 prefix query, e.g. 'jan smi' -> '"jan"* "smi"*'"""
+    terms = re.findall(r"[\w@.\-]+", query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search(query, kind=None, subject_id=None, limit=20):
+    """Ranked matches as dicts; subject_id limits students to that subject's roster"""
+    match = build_match(query)
+    if not match:
+        return []
+
+    sql = """
+        SELECT kind, ref_id, student_id, first_name, last_name, email, username
+        FROM person_search
+        WHERE person_search MATCH :match
+    """
+    params = {'match': match, 'limit': limit}
+    if kind:
+        sql += " AND kind = :kind"
+        params['kind'] = kind
+    if subject_id is not None:
+        sql += """ AND ref_id IN (
+            SELECT student_id FROM student_subject WHERE subject_id = :subject_id
+        )"""
+        params['subject_id'] = subject_id
+    sql += " ORDER BY bm25(person_search, 0, 0, 10.0, 5.0, 5.0, 2.0, 2.0) LIMIT :limit"
+
+    rows = db.session.execute(text(sql), params).mappings().all()
+    return [dict(row) for row in rows]
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        try:
+            install()
+            rebuild()
+            db.session.commit()
+            print("Search index rebuilt")
+        except Exception as e:
+            print(f"Error rebuilding search index: {str(e)}")
+            db.session.rollback()
+            raise
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from flask import has_request_context, request
+
+# Get absolute path for the slow-query log database
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SLOW_LOG_DB_PATH = os.environ.get('GAMS_SLOW_QUERY_LOG') or os.path.join(BASE_DIR, 'GAMS_slowlog.db')
+
+# Full scans of these tables are what grows with the school
+WATCHED_TABLES = ('attendance', 'grade')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statement_shape (
+    shape TEXT PRIMARY KEY,
+    statement TEXT NOT NULL,
+    plan TEXT,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slow_statement (
+    id INTEGER PRIMARY KEY,
+    shape TEXT NOT NULL REFERENCES statement_shape(shape),
+    recorded_at REAL NOT NULL,
+    duration_ms REAL NOT NULL,
+    endpoint TEXT,
+    param_shape TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_slow_statement_shape ON slow_statement (shape, recorded_at);
+"""
+
+def normalize(statement):
+    """Collapse whitespace and expanded IN lists so one lookup is one shape"""
+    text = ' '.join(statement.split())
+    text = re.sub(r'\?(?:\s*,\s*\?)+', '?...', text)
+    return re.sub(r"'(?:[^']|'')*'", "'?'", text)
+
+def shape_id(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+def param_shape(parameters, executemany=False):
+    """Types of the bound parameters, never their values"""
+    if executemany:
+        rows = list(parameters or [])
+        return f'{len(rows)} x {param_shape(rows[0]) if rows else "()"}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+def _caller():
+    if has_request_context():
+        return request.endpoint or request.path
+    return f'thread:{threading.current_thread().name}'
+
+class SlowQueryLog:
+    """Records statements slower than a threshold in a side SQLite file.
+
+    The EXPLAIN QUERY PLAN of each statement shape is captured the first
+    time the shape is slow, on the same connection and parameters.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold = 0.1
+        self.path = SLOW_LOG_DB_PATH
+        self._known = set()
+        self._local = threading.local()
+
+    def init_app(self, app, engine):
+        self.enabled = app.config.get('SLOW_QUERY_LOG', True)
+        if not self.enabled:
+            return
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+        self.path = app.config.get('SLOW_QUERY_LOG_PATH', SLOW_LOG_DB_PATH)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._known = {row[0] for row in conn.execute("SELECT shape FROM statement_shape")}
+        self._listen(engine)
+
+    def attach(self, engine):
+        """Also log slow statements from another engine, such as a school's"""
+        if self.enabled:
+            self._listen(engine)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _listen(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('_slow_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['_slow_start'].pop()
+            if elapsed >= self.threshold:
+                self.record(conn, statement, parameters, executemany, elapsed)
+
+        @event.listens_for(engine, 'handle_error')
+        def _error(context):
+            starts = context.connection.info.get('_slow_start') if context.connection is not None else None
+            if starts:
+                starts.pop()
+
+    def record(self, conn, statement, parameters, executemany, elapsed):
+        try:
+            normalized = normalize(statement)
+            shape = shape_id(normalized)
+            log = self._connection()
+            if shape not in self._known:
+                plan = self._explain(conn, statement, parameters, executemany)
+                log.execute(
+                    "INSERT OR IGNORE INTO statement_shape (shape, statement, plan, first_seen) VALUES (?, ?, ?, ?)",
+                    (shape, normalized, plan, time.time())
+                )
+                self._known.add(shape)
+            log.execute(
+                "INSERT INTO slow_statement (shape, recorded_at, duration_ms, endpoint, param_shape) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (shape, time.time(), elapsed * 1000, _caller(), param_shape(parameters, executemany))
+            )
+        except Exception as e:
+            print(f"Error recording slow query: {str(e)}")
+
+    def _explain(self, conn, statement, parameters, executemany):
+        if executemany:
+            parameters = list(parameters)[0] if parameters else ()
+        try:
+            rows = conn.connection.dbapi_connection.execute(
+                'EXPLAIN QUERY PLAN ' + statement, parameters or ()
+            ).fetchall()
+        except Exception as e:
+            return f'(no plan: {e})'
+        # (id, parent, notused, detail); indent children under their parent
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return '\n'.join(lines)
+
+slow_query_log = SlowQueryLog()
+
+def scans_watched_table(plan):
+    return any(
+        re.search(rf'\bSCAN {table}\b', plan or '')
+        for table in WATCHED_TABLES
+    )
+
+def report(path=SLOW_LOG_DB_PATH, top=10, since_hours=None, scans_only=False):
+    """Print the statement shapes with the most total slow time"""
+    if not os.path.exists(path):
+        print(f"No slow-query log at {path}")
+        return
+    conn = sqlite3.connect(path)
+    since = time.time() - since_hours * 3600 if since_hours else 0
+    shapes = conn.execute("""
+        SELECT s.shape, s.statement, s.plan, COUNT(*), SUM(e.duration_ms), MAX(e.duration_ms)
+        FROM slow_statement e JOIN statement_shape s ON s.shape = e.shape
+        WHERE e.recorded_at >= ?
+        GROUP BY s.shape
+        ORDER BY SUM(e.duration_ms) DESC
+    """, (since,)).fetchall()
+    if scans_only:
+        shapes = [row for row in shapes if scans_watched_table(row[2])]
+    if not shapes:
+        print("No slow statements recorded")
+        return
+
+    for rank, (shape, statement, plan, count, total, worst) in enumerate(shapes[:top], 1):
+        flag = '  [full scan]' if scans_watched_table(plan) else ''
+        print(f"#{rank} {shape}: {count} slow, {total:.1f} ms total, {total / count:.1f} ms avg, "
+              f"{worst:.1f} ms max{flag}")
+        print(f"    {statement[:300]}")
+        callers = conn.execute("""
+            SELECT endpoint, param_shape, COUNT(*), SUM(duration_ms) FROM slow_statement
+            WHERE shape = ? AND recorded_at >= ?
+            GROUP BY endpoint, param_shape ORDER BY SUM(duration_ms) DESC LIMIT 5
+        """, (shape, since)).fetchall()
+        for endpoint, params, calls, total_ms in callers:
+            print(f"    from {endpoint}: {calls}x {total_ms:.1f} ms, params {params}")
+        print("    plan:")
+        for line in (plan or '(none)').splitlines():
+            print(f"      {line}")
+        print()
+    conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the slowest statement shapes from the slow-query log.')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--since', type=float, metavar='HOURS', help='Only statements from the last HOURS')
+    parser.add_argument('--scans', action='store_true', help='Only shapes that fully scan attendance or grade')
+    parser.add_argument('--db', default=SLOW_LOG_DB_PATH)
+    args = parser.parse_args()
+    report(args.db, args.top, args.since, args.scans)
@@ -0,0 +1,44 @@
+    document.addEventListener('DOMContentLoaded', function() {
+        // Simple counter animation
+        const counters = document.querySelectorAll('.counter');
+        counters.forEach(counter => {
+            const target = parseInt(counter.innerText);
+            let count = 0;
+            const speed = 200;
+            const updateCount = () => {
+                const increment = target / speed;
+                if (count < target) {
+                    count += increment;
+                    counter.innerText = Math.ceil(count) + (counter.innerText.includes('+') ? '+' : '');
+                    setTimeout(updateCount, 1);
+                } else {
+                    counter.innerText = target + (counter.innerText.includes('+') ? '+' : '');
+                }
+            };
+            updateCount();
+        });
+    });
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Handle registration button clicks
+    document.querySelectorAll('[href^="#"]').forEach(anchor => {
+        anchor.addEventListener('click', function (e) {
+            e.preventDefault();
+            
+            // Show registration section
+            document.getElementById('registration').style.display = 'block';
+            
+            // Smooth scroll to registration section
+            const targetId = this.getAttribute('href').split('#')[1];
+            const target = document.getElementById(targetId);
+            target.scrollIntoView({ behavior: 'smooth' });
+            
+            // Activate the correct tab
+            if (targetId === 'student-registration' || targetId === 'teacher-registration') {
+                const tabToActivate = document.querySelector(`[data-bs-target="#${targetId}"]`);
+                const tab = new bootstrap.Tab(tabToActivate);
+                tab.show();
+            }
+        });
+    });
+});
@@ -0,0 +1,24 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const checkboxes = document.querySelectorAll('.subject-checkbox');
+    const maxAllowed = 3;
+    
+    checkboxes.forEach(checkbox => {
+        checkbox.addEventListener('change', function() {
+            const checkedCount = document.querySelectorAll('.subject-checkbox:checked').length;
+            if (checkedCount > maxAllowed) {
+                this.checked = false;
+                alert('You can only select up to 3 subjects');
+            }
+            
+            // Add/remove selected class to parent card
+            const card = this.closest('.subject-card');
+            if (this.checked) {
+                card.style.borderColor = '#2c3e50';
+                card.style.backgroundColor = 'rgba(44, 62, 80, 0.1)';
+            } else {
+                card.style.borderColor = '#e0e6ed';
+                card.style.backgroundColor = 'white';
+            }
+        });
+    });
+});
@@ -0,0 +1,150 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('attendanceForm');
+    const tbody = form ? form.querySelector('tbody') : null;
+    if (!tbody) {
+        return;
+    }
+
+    const dateInput = document.getElementById('date');
+    const pageInfo = document.getElementById('pageInfo');
+    const prevPageBtn = document.getElementById('prevPage');
+    const nextPageBtn = document.getElementById('nextPage');
+    const pageSize = parseInt(form.dataset.pageSize, 10);
+    const pageCount = Math.max(1, Math.ceil(parseInt(form.dataset.total, 10) / pageSize));
+    const classId = form.dataset.classId ? parseInt(form.dataset.classId, 10) : null;
+
+    // Only rows the teacher changed are kept and sent; everyone else gets
+    // the default (or keeps their saved mark unless "Mark All" was used)
+    let defaultStatus = 'present';
+    let overrideAll = false;
+    let edits = {};
+    let page = 1;
+
+    function buildRow(student) {
+        const saved = overrideAll ? null : student.status;
+        const edit = edits[student.id];
+        const row = document.createElement('tr');
+
+        const idCell = document.createElement('td');
+        idCell.textContent = student.student_id;
+        const nameCell = document.createElement('td');
+        nameCell.textContent = student.name;
+
+        const select = document.createElement('select');
+        select.name = 'status_' + student.id;
+        select.className = 'status-select';
+        ['present', 'absent', 'late'].forEach(status => {
+            const option = document.createElement('option');
+            option.value = status;
+            option.textContent = status.charAt(0).toUpperCase() + status.slice(1);
+            select.appendChild(option);
+        });
+        select.value = edit ? edit.status : (saved || defaultStatus);
+
+        const notes = document.createElement('input');
+        notes.type = 'text';
+        notes.name = 'notes_' + student.id;
+        notes.placeholder = 'Add notes...';
+        notes.value = edit ? (edit.notes || '') : (overrideAll ? '' : (student.notes || ''));
+
+        const recordEdit = () => {
+            // The version lets the server refuse the edit if someone changed the row meanwhile
+            edits[student.id] = {status: select.value, notes: notes.value, version: student.version};
+        };
+        select.addEventListener('change', recordEdit);
+        notes.addEventListener('input', recordEdit);
+
+        const statusCell = document.createElement('td');
+        statusCell.appendChild(select);
+        const notesCell = document.createElement('td');
+        notesCell.appendChild(notes);
+        row.append(idCell, nameCell, statusCell, notesCell);
+        return row;
+    }
+
+    function loadPage(number) {
+        const params = new URLSearchParams({date: dateInput.value, page: number, per_page: pageSize});
+        if (classId !== null) {
+            params.set('class_id', classId);
+        }
+        return fetch(form.dataset.rosterUrl + '?' + params.toString())
+            .then(response => response.json())
+            .then(data => {
+                page = number;
+                tbody.replaceChildren(...data.students.map(buildRow));
+                if (pageInfo) {
+                    pageInfo.textContent = 'Page ' + page + ' of ' + pageCount;
+                    prevPageBtn.disabled = page <= 1;
+                    nextPageBtn.disabled = page >= pageCount;
+                }
+            });
+    }
+
+    function markAll(status) {
+        defaultStatus = status;
+        overrideAll = true;
+        edits = {};
+        tbody.querySelectorAll('.status-select').forEach(select => {
+            select.value = status;
+        });
+        tbody.querySelectorAll('input[type="text"]').forEach(input => {
+            input.value = '';
+        });
+    }
+
+    document.getElementById('markAllPresent').addEventListener('click', () => markAll('present'));
+    document.getElementById('markAllAbsent').addEventListener('click', () => markAll('absent'));
+
+    if (prevPageBtn && nextPageBtn) {
+        prevPageBtn.addEventListener('click', () => loadPage(Math.max(1, page - 1)));
+        nextPageBtn.addEventListener('click', () => loadPage(Math.min(pageCount, page + 1)));
+    }
+
+    dateInput.addEventListener('change', function() {
+        overrideAll = false;
+        edits = {};
+        loadPage(1);
+    });
+
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        const exceptions = {};
+        Object.keys(edits).forEach(id => {
+            const edit = edits[id];
+            if (edit.status !== defaultStatus || edit.notes || !overrideAll) {
+                exceptions[id] = {status: edit.status, notes: edit.notes || null, version: edit.version};
+            }
+        });
+
+        fetch(form.dataset.submitUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                date: dateInput.value,
+                class_id: classId,
+                default: defaultStatus,
+                keep_existing: !overrideAll,
+                exceptions: exceptions
+            })
+        })
+            .then(response => response.json().then(data => ({ok: response.ok, data: data})))
+            .then(result => {
+                if (!result.ok) {
+                    throw new Error(result.data.error || 'Error saving attendance');
+                }
+                const conflicts = result.data.conflicts || [];
+                if (conflicts.length) {
+                    alert(conflicts.length + ' student(s) were changed by someone else and were not saved. ' +
+                          'The sheet now shows their current marks.');
+                } else {
+                    alert('Attendance saved successfully.');
+                }
+                overrideAll = false;
+                edits = {};
+                return loadPage(page);
+            })
+            .catch(error => alert(error.message + ' Please try again.'));
+    });
+
+    loadPage(1);
+});
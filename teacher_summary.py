@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import date
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db, Attendance, Grade, GradeCategory, Subject, AttendanceDaily
+from roster_cache import roster_cache, ENROLLMENT_MODELS
+import attendance_rollup
+import tenants
+
+# Models whose rows carry the teacher whose dashboard they change
+TEACHER_MODELS = (Attendance, Grade, GradeCategory)
+
+# Graded roster students per category, and the subject average by the
+# student_grades() rule: first grade per category, averaged per student
+CATEGORY_COVERAGE = """
+    SELECT c.id, c.name, COUNT(DISTINCT g.student_id)
+    FROM grade_category c
+    LEFT JOIN grade g ON g.category_id = c.id
+        AND g.student_id IN (SELECT student_id FROM student_subject WHERE subject_id = :subject_id)
+    WHERE c.teacher_id = :teacher_id AND c.subject_id = :subject_id
+    GROUP BY c.id ORDER BY c.created_date, c.id
+"""
+
+SUBJECT_AVERAGE = """
+    SELECT AVG(average) FROM (
+        SELECT AVG(grade) AS average FROM (
+            SELECT g.student_id, g.grade,
+                   ROW_NUMBER() OVER (PARTITION BY g.student_id, g.category_id ORDER BY g.id) AS position
+            FROM grade g JOIN grade_category c ON c.id = g.category_id
+            WHERE c.teacher_id = :teacher_id AND c.subject_id = :subject_id
+        ) WHERE position = 1 GROUP BY student_id
+    )
+"""
+
+def compute(teacher, today):
+    """Every figure on the teacher dashboard, as plain data"""
+    from app import get_letter_grade
+
+    params = {'teacher_id': teacher.id, 'subject_id': teacher.subject_id}
+    roster_size = len(roster_cache.get(teacher.subject_id))
+    subject = db.session.get(Subject, teacher.subject_id)
+
+    daily = db.session.get(AttendanceDaily, (teacher.subject_id, today))
+    marked = daily.total if daily else 0
+    if marked == 0:
+        status = 'not_taken'
+    elif marked < roster_size:
+        status = 'partial'
+    else:
+        status = 'complete'
+    week = attendance_rollup.trend(teacher.subject_id, today, days=1, windows=(7,))
+
+    categories = [
+        {'id': category_id, 'name': name, 'graded': graded, 'missing': max(roster_size - graded, 0)}
+        for category_id, name, graded in db.session.execute(text(CATEGORY_COVERAGE), params)
+    ]
+    average = db.session.execute(text(SUBJECT_AVERAGE), params).scalar()
+
+    return {
+        'subject': subject.name if subject else None,
+        'roster_size': roster_size,
+        'today': {
+            'date': today,
+            'status': status,
+            'marked': marked,
+            'present': daily.present if daily else 0,
+            'absent': daily.absent if daily else 0,
+            'late': daily.late if daily else 0,
+        },
+        'week_rate': week['rolling']['7'][0],
+        'categories': len(categories),
+        'missing_grades': [category for category in categories if category['missing']],
+        'average': average,
+        'letter': get_letter_grade(average),
+    }
+
+class TeacherSummaryCache:
+    """Dashboard figures per teacher, recomputed only after that teacher's writes.
+
+    Entries are dropped when a commit touches the teacher's attendance,
+    grades or categories, or anyone's enrollment. The TTL only bounds
+    staleness for writes from other worker processes, and an entry never
+    outlives the day it was computed for.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, teacher):
+        key = (tenants.current(), teacher.id)
+        today = date.today()
+        with self._lock:
+            cached = self._entries.get(key)
+            generation = self._generation
+        if cached and cached[1] == today and time.monotonic() - cached[0] < self.ttl:
+            return cached[2]
+
+        summary = compute(teacher, today)
+        with self._lock:
+            # Skip storing if a commit invalidated entries while this one was computed
+            if self._generation == generation:
+                self._entries[key] = (time.monotonic(), today, summary)
+        return summary
+
+    def invalidate(self, teacher_ids=None):
+        """Drop the current school's entries for teacher_ids, or every entry"""
+        tenant = tenants.current()
+        with self._lock:
+            self._generation += 1
+            if teacher_ids is None:
+                self._entries.clear()
+            else:
+                for teacher_id in teacher_ids:
+                    self._entries.pop((tenant, teacher_id), None)
+
+teacher_summary = TeacherSummaryCache()
+
+def mark_changed(session, teacher_id):
+    """For writes the ORM does not see, such as bulk UPDATE statements"""
+    session.info.setdefault('summary_teachers', set()).add(teacher_id)
+
+@event.listens_for(Session, 'after_flush')
+def _track_teacher_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TEACHER_MODELS):
+            mark_changed(session, obj.teacher_id)
+        elif isinstance(obj, ENROLLMENT_MODELS):
+            session.info['summary_all'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    teacher_ids = session.info.pop('summary_teachers', None)
+    if session.info.pop('summary_all', False):
+        teacher_summary.invalidate()
+    elif teacher_ids:
+        teacher_summary.invalidate(teacher_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('summary_teachers', None)
+    session.info.pop('summary_all', None)
@@ -0,0 +1,353 @@
+import argparse
+import contextvars
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from flask.sessions import SecureCookieSessionInterface
+from sqlalchemy import create_engine
+from werkzeug.exceptions import NotFound
+from models import db
+import migrations
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+TENANT_DIR = os.environ.get('GAMS_TENANT_DIR') or os.path.join(BASE_DIR, 'tenants')
+
+# Also a valid DNS label, so the same name works as a subdomain
+TENANT_NAME = re.compile(r'^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$')
+
+_current = contextvars.ContextVar('gams_tenant', default=None)
+
+def current():
+    """The school the current request or command works on; None means the default database"""
+    return _current.get()
+
+@contextmanager
+def use(name):
+    """Route db.session and db.engine to a school's database inside the block"""
+    token = _current.set(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def database_path(name, directory=TENANT_DIR):
+    if not TENANT_NAME.match(name or ''):
+        raise ValueError(f"Invalid school name: {name!r}")
+    return os.path.join(directory, f'{name}.db')
+
+def school_names(directory=TENANT_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        entry[:-3] for entry in os.listdir(directory)
+        if entry.endswith('.db') and TENANT_NAME.match(entry[:-3])
+    )
+
+class EngineCache:
+    """Open engines by school, least recently used first.
+
+    Every engine keeps its own connection pool, so only `size` stay open;
+    the least recently used one is disposed to make room. Connections it
+    already handed out finish their work and are closed when returned.
+    """
+
+    def __init__(self, size=16):
+        self.size = size
+        self.evictions = 0
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                return engine
+        # Opened outside the lock: a first open may run migrations
+        engine = factory()
+        with self._lock:
+            existing = self._engines.get(key)
+            if existing is not None:
+                # Another thread opened it first
+                engine.dispose()
+                self._engines.move_to_end(key)
+                return existing
+            self._engines[key] = engine
+            evicted = []
+            while len(self._engines) > self.size:
+                evicted.append(self._engines.popitem(last=False)[1])
+                self.evictions += 1
+        for old in evicted:
+            old.dispose()
+        return engine
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._engines
+
+    def __len__(self):
+        return len(self._engines)
+
+    def clear(self):
+        with self._lock:
+            engines, self._engines = list(self._engines.values()), OrderedDict()
+        for engine in engines:
+            engine.dispose()
+
+class _TenantSessionInterface(SecureCookieSessionInterface):
+    """One session cookie per school, signed for that school only.
+
+    User ids are per database, so a session from one school must never be
+    accepted by another, even if the cookie is copied across by hand.
+    """
+
+    def get_cookie_name(self, app):
+        name = super().get_cookie_name(app)
+        tenant = _current.get()
+        return f'{name}-{tenant}' if tenant else name
+
+    def get_signing_serializer(self, app):
+        serializer = super().get_signing_serializer(app)
+        tenant = _current.get()
+        if serializer is not None and tenant:
+            serializer.salt = f'{self.salt}:{tenant}'
+        return serializer
+
+class _TenantMiddleware:
+    """Picks the school from the host or path and routes the whole request to it"""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    def __call__(self, environ, start_response):
+        name = self.router.tenant_for(environ)
+        if name is None:
+            return self.app(environ, start_response)
+        if not self.router.exists(name):
+            return NotFound(f"No school named '{name}'")(environ, start_response)
+        # Responses are rendered before returning, so the body needs no tenant
+        with use(name):
+            return self.app(environ, start_response)
+
+class TenantRouter:
+    """Serves each school from its own SQLite database.
+
+    With TENANT_MODE 'subdomain' the school comes from <school>.TENANT_DOMAIN;
+    with 'path' from TENANT_PATH_PREFIX/<school>/..., which url_for keeps in
+    every generated link. Requests naming no school use the default
+    database. Schools live in TENANT_DIR/<school>.db and are created with
+    'python tenants.py create <school>'; unknown schools get a 404. The
+    first use of a school in a process brings its schema up to date.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.mode = None
+        self.domain = None
+        self.path_prefix = '/s'
+        self.directory = TENANT_DIR
+        self.engine_options = {}
+        self.engines = EngineCache()
+        self._hooks = []
+
+    def init_app(self, app):
+        self.mode = app.config.get('TENANT_MODE')
+        if self.mode not in (None, 'subdomain', 'path'):
+            raise ValueError(f"TENANT_MODE must be 'subdomain' or 'path', not {self.mode!r}")
+        self.domain = (app.config.get('TENANT_DOMAIN') or '').lower().lstrip('.') or None
+        if self.mode == 'subdomain' and not self.domain:
+            raise ValueError("TENANT_MODE 'subdomain' needs TENANT_DOMAIN, e.g. 'gams.example.org'")
+        self.path_prefix = '/' + app.config.get('TENANT_PATH_PREFIX', self.path_prefix).strip('/')
+        self.directory = app.config.get('TENANT_DIR') or TENANT_DIR
+        self.engines.size = app.config.get('TENANT_ENGINE_CACHE', 16)
+        self.engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        # Routing is always on so commands can use() a school without a mode
+        db.router = self.current_engine
+        self.enabled = self.mode is not None
+        if self.enabled:
+            app.session_interface = _TenantSessionInterface()
+            app.wsgi_app = _TenantMiddleware(app.wsgi_app, self)
+
+    def on_engine(self, hook):
+        """Call hook(engine) on every school engine as it is opened, e.g. to instrument it"""
+        self._hooks.append(hook)
+
+    def current_engine(self):
+        name = _current.get()
+        return self.engine(name) if name else None
+
+    def engine(self, name):
+        return self.engines.get(name, lambda: self._open(name))
+
+    def exists(self, name):
+        return name in self.engines or os.path.exists(database_path(name, self.directory))
+
+    def names(self):
+        return school_names(self.directory)
+
+    def tenant_for(self, environ):
+        if self.mode == 'subdomain':
+            host = (environ.get('HTTP_HOST') or environ.get('SERVER_NAME') or '').lower().split(':')[0]
+            if host.endswith('.' + self.domain):
+                name = host[:-len(self.domain) - 1]
+                if name != 'www' and TENANT_NAME.match(name):
+                    return name
+            return None
+
+        if self.mode == 'path':
+            path = environ.get('PATH_INFO', '')
+            if not path.startswith(self.path_prefix + '/'):
+                return None
+            name, _, rest = path[len(self.path_prefix) + 1:].partition('/')
+            if not TENANT_NAME.match(name):
+                return None
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'{self.path_prefix}/{name}'
+            environ['PATH_INFO'] = '/' + rest
+            return name
+
+        return None
+
+    def _open(self, name):
+        path = database_path(name, self.directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        engine = create_engine(f'sqlite:///{path}', **self.engine_options)
+        for hook in self._hooks:
+            hook(engine)
+        # Same as the default database at startup: new tables, then migrations
+        db.metadata.create_all(engine)
+        migrations.upgrade(engine)
+        return engine
+
+tenant_router = TenantRouter()
+
+def prepare(app, name, seed=True):
+    """Create or upgrade one school's database; seed a new one like a fresh install"""
+    import search_index
+    from models import User, init_db
+
+    with use(name), app.app_context():
+        db.create_all()
+        search_index.install()
+        if seed and not User.query.first():
+            init_db(app)
+
+# Each value is one number from one school; totals are plain sums
+SUMMARY_QUERIES = {
+    'students': "SELECT COUNT(*) FROM student",
+    'teachers': "SELECT COUNT(*) FROM teacher",
+    'subjects': "SELECT COUNT(*) FROM subject",
+    'marks': "SELECT COUNT(*) FROM attendance WHERE date >= :since",
+    'present': "SELECT COUNT(*) FROM attendance WHERE date >= :since AND status = 'present'",
+    'grades': "SELECT COUNT(*) FROM grade",
+    'grade_total': "SELECT COALESCE(SUM(grade), 0) FROM grade",
+}
+
+def _summarize(name, path, since):
+    """One school's figures, read in a worker process over a read-only connection"""
+    start = time.perf_counter()
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=5.0)
+    try:
+        summary = {key: conn.execute(sql, {'since': since}).fetchone()[0] for key, sql in SUMMARY_QUERIES.items()}
+    finally:
+        conn.close()
+    summary['seconds'] = time.perf_counter() - start
+    return name, summary
+
+def aggregate(names=None, days=30, workers=None, directory=TENANT_DIR):
+    """Summaries of every school, read in parallel; returns ({school: summary}, totals)"""
+    names = names or school_names(directory)
+    since = (date.today() - timedelta(days=days)).isoformat()
+    results = {}
+    if not names:
+        return results, {}
+    workers = workers or min(len(names), os.cpu_count() or 1)
+    # spawn: the parent holds DB connections and background threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(_summarize, name, database_path(name, directory), since): name for name in names}
+        for future, name in futures.items():
+            try:
+                results[name] = future.result()[1]
+            except Exception as e:
+                print(f"Error reading school {name}: {str(e)}")
+    totals = {key: sum(summary[key] for summary in results.values()) for key in SUMMARY_QUERIES}
+    return results, totals
+
+def _rate(part, whole):
+    return f"{part * 100 / whole:.1f}%" if whole else '-'
+
+def _average(total, count):
+    return f"{total / count:.1f}" if count else '-'
+
+def print_summary(results, totals, days):
+    print(f"{'school':<24} {'students':>9} {'teachers':>9} {'subjects':>9} "
+          f"{f'present {days}d':>11} {'avg grade':>10} {'read':>7}")
+    for name, summary in sorted(results.items()):
+        print(f"{name:<24} {summary['students']:>9} {summary['teachers']:>9} {summary['subjects']:>9} "
+              f"{_rate(summary['present'], summary['marks']):>11} "
+              f"{_average(summary['grade_total'], summary['grades']):>10} {summary['seconds']:>6.2f}s")
+    if totals:
+        print(f"{'all schools':<24} {totals['students']:>9} {totals['teachers']:>9} {totals['subjects']:>9} "
+              f"{_rate(totals['present'], totals['marks']):>11} "
+              f"{_average(totals['grade_total'], totals['grades']):>10}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage per-school databases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create_parser = commands.add_parser('create', help='Create and seed a school database')
+    create_parser.add_argument('name')
+    commands.add_parser('list', help='List schools with their size and schema version')
+    migrate_parser = commands.add_parser('migrate', help='Apply pending migrations (default: every school)')
+    migrate_parser.add_argument('names', nargs='*')
+    aggregate_parser = commands.add_parser('aggregate', help='Summarize every school in parallel')
+    aggregate_parser.add_argument('names', nargs='*')
+    aggregate_parser.add_argument('--days', type=int, default=30, help='Attendance window in days')
+    aggregate_parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    if args.command == 'aggregate':
+        # Plain read-only sqlite3 in the workers; the app is never imported
+        directory = os.environ.get('GAMS_TENANT_DIR') or TENANT_DIR
+        names = args.names or school_names(directory)
+        start = time.perf_counter()
+        results, totals = aggregate(names, days=args.days, workers=args.workers, directory=directory)
+        print_summary(results, totals, args.days)
+        print(f"Read {len(results)} of {len(names)} schools in {time.perf_counter() - start:.2f}s")
+    else:
+        from app import app
+
+        if args.command == 'create':
+            if tenant_router.exists(args.name):
+                parser.error(f"School {args.name} already exists")
+            try:
+                prepare(app, args.name)
+                print(f"Created {database_path(args.name, tenant_router.directory)}")
+            except Exception as e:
+                print(f"Error creating school: {str(e)}")
+                raise
+        elif args.command == 'list':
+            for name in tenant_router.names():
+                path = database_path(name, tenant_router.directory)
+                engine = create_engine(f'sqlite:///{path}')
+                applied = migrations.applied_versions(engine)
+                engine.dispose()
+                print(f"{name:<24} {os.path.getsize(path) / 1024 / 1024:>8.1f} MB  "
+                      f"schema {max(applied) if applied else 0}")
+        else:
+            for name in args.names or tenant_router.names():
+                if not tenant_router.exists(name):
+                    print(f"Error migrating {name}: no such school")
+                    continue
+                print(f"{name}:")
+                try:
+                    prepare(app, name, seed=False)
+                except Exception as e:
+                    print(f"Error migrating {name}: {str(e)}")
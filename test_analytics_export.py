@@ -0,0 +1,95 @@
+import os
+from datetime import date, datetime
+
+import pytest
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import analytics_export
+from models import Attendance, Grade, GradeCategory, Student, Teacher, User
+
+def _teacher(username):
+    return Teacher.query.join(User).filter(User.username == username).one()
+
+@pytest.fixture
+def marks(clean_db):
+    """Attendance in two terms for teacher1's subject and one term for teacher2's, and a grade"""
+    students = [student.id for student in Student.query.order_by(Student.id)]
+    first, second = _teacher('teacher1'), _teacher('teacher2')
+    for teacher, day in ((first, date(2024, 3, 4)), (first, date(2024, 9, 2)), (second, date(2024, 9, 2))):
+        for student_id in students:
+            clean_db.session.add(Attendance(student_id=student_id, teacher_id=teacher.id,
+                                            subject_id=teacher.subject_id, date=day, status='present'))
+    category = GradeCategory(name='Quiz', teacher_id=first.id, subject_id=first.subject_id)
+    clean_db.session.add(category)
+    clean_db.session.flush()
+    clean_db.session.add(Grade(student_id=students[0], teacher_id=first.id, subject_id=first.subject_id,
+                               category_id=category.id, grade=88, date=datetime(2024, 9, 3, 10, 0)))
+    clean_db.session.commit()
+    return first.subject_id, second.subject_id
+
+def _export(out_dir, **kwargs):
+    return analytics_export.export(os.environ['GAMS_DATABASE'], str(out_dir), **kwargs)
+
+def test_terms_and_ranges():
+    assert analytics_export._term_of('2024-06-30') == '2024-T1'
+    assert analytics_export._term_of('2024-07-01 08:00:00') == '2024-T2'
+    assert analytics_export._term_of(None) == 'undated'
+    assert analytics_export._term_range('2024-T2') == ('2024-07-01', '2025-01-01')
+    assert analytics_export._term_range('undated') == (None, None)
+
+def test_only_changed_partitions_are_rewritten(clean_db, marks, tmp_path):
+    subject, other = marks
+    summary = _export(tmp_path)
+    assert summary['attendance'] == (3, 3, 0, 9)
+    assert summary['grade'] == (1, 1, 0, 1)
+
+    assert all(rewritten == 0 for _, rewritten, _, _ in _export(tmp_path).values())
+
+    record = Attendance.query.filter_by(subject_id=subject, date=date(2024, 9, 2)).first()
+    record.status = 'late'
+    clean_db.session.commit()
+    summary = _export(tmp_path, datasets=['attendance'])
+    assert summary == {'attendance': (3, 1, 0, 3)}
+
+    table = ds.dataset(str(tmp_path / 'attendance'), format='parquet', partitioning='hive').to_table(
+        filter=(ds.field('term') == '2024-T2') & (ds.field('subject_id') == subject))
+    assert sorted(table.column('status').to_pylist()) == ['late', 'present', 'present']
+    assert 'term' not in pq.read_schema(
+        str(tmp_path / 'attendance' / 'term=2024-T2' / f'subject_id={subject}' / 'part.parquet')).names
+
+def test_emptied_partitions_are_removed(clean_db, marks, tmp_path):
+    subject, other = marks
+    _export(tmp_path)
+    Attendance.query.filter_by(subject_id=other).delete()
+    clean_db.session.commit()
+
+    assert _export(tmp_path)['attendance'] == (2, 0, 1, 0)
+    assert not (tmp_path / 'attendance' / 'term=2024-T2' / f'subject_id={other}').exists()
+    assert (tmp_path / 'attendance' / 'term=2024-T1' / f'subject_id={subject}').exists()
+
+def test_arrow_files_keep_dictionary_columns(clean_db, marks, tmp_path):
+    subject, _ = marks
+    _export(tmp_path)
+    # Changing format rewrites everything
+    summary = _export(tmp_path, fmt='arrow')
+    assert summary['attendance'] == (3, 3, 0, 9)
+    assert not list((tmp_path / 'attendance').rglob('*.parquet'))
+
+    path = tmp_path / 'attendance' / 'term=2024-T1' / f'subject_id={subject}' / 'part.arrow'
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert pa.types.is_dictionary(table.schema.field('status').type)
+    assert table.column('date').to_pylist() == [date(2024, 3, 4)] * 3
+
+def test_format_is_tracked_per_dataset(clean_db, marks, tmp_path):
+    _export(tmp_path)
+    assert _export(tmp_path, fmt='arrow', datasets=['attendance'])['attendance'][1] == 3
+
+    summary = _export(tmp_path, fmt='arrow')
+    assert summary['attendance'][1] == 0
+    assert summary['grade'] == (1, 1, 0, 1)
+    assert summary['enrollment'][1] == summary['enrollment'][0] > 0
+    assert not list(tmp_path.rglob('*.parquet'))
@@ -0,0 +1,48 @@
+import gzip
+
+import pytest
+
+import assets
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'site.css').write_text('body { color: black; }\n' * 40)
+    monkeypatch.setattr(assets, 'STATIC_DIR', str(static))
+    monkeypatch.setattr(assets, 'DIST_DIR', str(static / 'dist'))
+    monkeypatch.setattr(assets, 'MANIFEST_PATH', str(static / 'dist' / 'manifest.json'))
+    monkeypatch.setattr(assets, '_manifest', {})
+    manifest = assets.build_assets()
+    assets.load_manifest()
+    return manifest
+
+def test_build_fingerprints_by_content(built, tmp_path):
+    fingerprinted = built['css/site.css']
+    assert fingerprinted.startswith('css/site.') and fingerprinted.endswith('.css')
+    dist = tmp_path / 'static' / 'dist'
+    assert gzip.decompress((dist / (fingerprinted + '.gz')).read_bytes()) == (dist / fingerprinted).read_bytes()
+
+    # Same content, same name; changed content, new name
+    assert assets.build_assets()['css/site.css'] == fingerprinted
+    (tmp_path / 'static' / 'css' / 'site.css').write_text('body { color: red; }\n')
+    assert assets.build_assets()['css/site.css'] != fingerprinted
+
+def test_asset_url_prefers_the_fingerprinted_copy(app, built):
+    with app.test_request_context():
+        assert assets.asset_url('css/site.css') == f"/assets/{built['css/site.css']}"
+        assert assets.asset_url('css/unbuilt.css') == '/static/css/unbuilt.css'
+
+def test_serve_asset_picks_the_precompressed_variant(app, built):
+    client = app.test_client()
+    url = f"/assets/{built['css/site.css']}"
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).startswith(b'body { color: black; }')
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data.startswith(b'body')
@@ -0,0 +1,75 @@
+import random
+from datetime import date
+
+import pytest
+
+import attendance_bitmap
+from attendance_bitmap import (STATUS_CODES, set_mark, get_mark, counts, percentage, current_streak,
+                               calendar, term_for, term_bounds, record_marks, rebuild_bitmaps)
+from models import Attendance, AttendanceBitmap, Student, Teacher, User
+
+def test_set_and_get_marks_round_trip():
+    bits = bytearray()
+    set_mark(bits, 0, 1)
+    set_mark(bits, 5, 3)
+    set_mark(bits, 9, 2)
+    assert len(bits) == 3  # four days per byte
+    assert [get_mark(bits, index) for index in range(12)] == [1, 0, 0, 0, 0, 3, 0, 0, 0, 2, 0, 0]
+    assert get_mark(bits, 400) == 0
+
+    set_mark(bits, 5, 1)  # overwriting leaves the neighbours alone
+    assert [get_mark(bits, index) for index in (4, 5, 6)] == [0, 1, 0]
+
+def test_popcount_counts_match_a_plain_count():
+    rng = random.Random(7)
+    codes = [rng.choice([0, 1, 2, 3]) for _ in range(181)]
+    bits = bytearray()
+    for index, code in enumerate(codes):
+        set_mark(bits, index, code)
+
+    assert counts(bytes(bits)) == {
+        'present': codes.count(1),
+        'absent': codes.count(2),
+        'late': codes.count(3),
+        'total': len(codes) - codes.count(0),
+    }
+    assert percentage(bytes(bits)) == pytest.approx(codes.count(1) * 100 / (len(codes) - codes.count(0)))
+    assert counts(b'') == {'present': 0, 'absent': 0, 'late': 0, 'total': 0}
+    assert percentage(b'') == 0
+
+def test_streak_skips_unrecorded_days():
+    bits = bytearray()
+    for index, status in [(0, 'present'), (1, 'absent'), (2, 'present'), (5, 'present'), (9, 'present')]:
+        set_mark(bits, index, STATUS_CODES[status])
+    assert current_streak(bytes(bits)) == 3
+    set_mark(bits, 10, STATUS_CODES['late'])
+    assert current_streak(bytes(bits)) == 0
+
+def test_terms_and_calendar():
+    assert term_for(date(2024, 6, 30)) == '2024-T1'
+    assert term_for(date(2024, 7, 1)) == '2024-T2'
+    assert term_bounds('2024-T2') == (date(2024, 7, 1), date(2024, 12, 31))
+
+    bits = bytearray()
+    set_mark(bits, 0, STATUS_CODES['late'])
+    set_mark(bits, 31, STATUS_CODES['absent'])
+    assert calendar(bytes(bits), '2024-T2') == [(date(2024, 7, 1), 'late'), (date(2024, 8, 1), 'absent')]
+
+def test_record_marks_and_rebuild_agree(clean_db):
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    students = [student.id for student in Student.query.order_by(Student.id)]
+    marks = {date(2024, 9, 2): ['present', 'absent', 'late'], date(2024, 9, 3): ['present', 'present', 'absent']}
+    for day, statuses in marks.items():
+        for student_id, status in zip(students, statuses):
+            clean_db.session.add(Attendance(student_id=student_id, teacher_id=teacher.id,
+                                            subject_id=teacher.subject_id, date=day, status=status))
+        record_marks(teacher.subject_id, day, list(zip(students, statuses)))
+    clean_db.session.commit()
+
+    recorded = {bitmap.student_id: bitmap.bits for bitmap in AttendanceBitmap.query}
+    assert counts(recorded[students[0]])['present'] == 2
+    assert attendance_bitmap.student_summary(students[2], '2024-T2')[teacher.subject_id]['counts'] == {
+        'present': 0, 'absent': 1, 'late': 1, 'total': 2}
+
+    assert rebuild_bitmaps() == 3
+    assert {bitmap.student_id: bitmap.bits for bitmap in AttendanceBitmap.query} == recorded
@@ -0,0 +1,83 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import attendance_rollup
+from models import Attendance, AttendanceDaily, Student, Teacher, User
+
+END = date(2024, 11, 29)
+
+@pytest.fixture
+def teacher(clean_db):
+    return Teacher.query.join(User).filter(User.username == 'teacher1').one()
+
+@pytest.fixture
+def history(clean_db, teacher):
+    """Random marks on most school days of the 200 days up to END, rolled up as saves do"""
+    rng = random.Random(11)
+    students = [student.id for student in Student.query.order_by(Student.id)]
+    for offset in range(200):
+        day = END - timedelta(days=offset)
+        if rng.random() < 0.3:
+            continue
+        for student_id in students:
+            clean_db.session.add(Attendance(student_id=student_id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                            date=day, status=rng.choice(['present', 'present', 'absent', 'late'])))
+        attendance_rollup.refresh_day(teacher.subject_id, day)
+    clean_db.session.commit()
+
+def _rollup(subject_id):
+    return {(row.date, row.present, row.absent, row.late, row.total)
+            for row in AttendanceDaily.query.filter_by(subject_id=subject_id)}
+
+def _expected_rate(subject_id, first, last):
+    """The present rate over [first, last] counted straight from the attendance table"""
+    rows = Attendance.query.filter(Attendance.subject_id == subject_id,
+                                   Attendance.date >= first, Attendance.date <= last).all()
+    return round(sum(row.status == 'present' for row in rows) * 100 / len(rows), 1) if rows else None
+
+def test_rolling_windows_match_a_direct_count(clean_db, teacher, history):
+    series = attendance_rollup.trend(teacher.subject_id, END, days=30)
+    assert len(series['dates']) == 30 and series['dates'][-1] == END.isoformat()
+    start = date.fromisoformat(series['start'])
+
+    for index in (0, 13, 29):
+        day = start + timedelta(days=index)
+        counted = Attendance.query.filter_by(subject_id=teacher.subject_id, date=day).count()
+        assert series['daily'][index]['total'] == counted
+        for window in attendance_rollup.WINDOWS:
+            assert series['rolling'][str(window)][index] == _expected_rate(
+                teacher.subject_id, day - timedelta(days=window - 1), day)
+    assert series['range']['rate'] == _expected_rate(teacher.subject_id, start, END)
+
+def test_days_are_clamped(clean_db, teacher):
+    assert len(attendance_rollup.trend(teacher.subject_id, END, days=0)['dates']) == 1
+    series = attendance_rollup.trend(teacher.subject_id, END, days=5000)
+    assert len(series['dates']) == attendance_rollup.MAX_DAYS
+    assert series['range'] == {'present': 0, 'absent': 0, 'late': 0, 'total': 0, 'rate': None}
+
+def test_refresh_day_recounts_changes_and_deletes(clean_db, teacher, history):
+    record = Attendance.query.filter_by(subject_id=teacher.subject_id, date=END).first()
+    record.status = 'absent' if record.status != 'absent' else 'late'
+    attendance_rollup.refresh_day(teacher.subject_id, END)
+    clean_db.session.commit()
+    before = clean_db.session.get(AttendanceDaily, (teacher.subject_id, END))
+    assert before.absent == Attendance.query.filter_by(subject_id=teacher.subject_id, date=END,
+                                                       status='absent').count()
+
+    Attendance.query.filter_by(subject_id=teacher.subject_id, date=END).delete()
+    attendance_rollup.refresh_day(teacher.subject_id, END)
+    clean_db.session.commit()
+    assert clean_db.session.get(AttendanceDaily, (teacher.subject_id, END)).total == 0
+
+def test_rebuild_matches_incremental_refreshes(clean_db, teacher, history):
+    incremental = _rollup(teacher.subject_id)
+    assert attendance_rollup.rebuild() == len(incremental)
+    assert _rollup(teacher.subject_id) == incremental
+
+def test_trend_endpoint(login, history):
+    response = login('teacher1', 'teacher123').get(f'/teacher/attendance/trend?end={END.isoformat()}&days=7')
+    series = response.get_json()
+    assert series['end'] == END.isoformat() and len(series['dates']) == 7
+    assert login('student1', 'student123').get('/teacher/attendance/trend').status_code == 403
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+
+import attendance_sheet
+from models import Attendance, AttendanceDaily, Student, Teacher, User
+
+DAY = date(2024, 9, 2)
+
+@pytest.fixture
+def teacher(clean_db):
+    return Teacher.query.join(User).filter(User.username == 'teacher1').one()
+
+@pytest.fixture
+def students(clean_db):
+    return {student.student_id: student.id for student in Student.query}
+
+def _marks(teacher):
+    return {
+        record.student_id: (record.status, record.notes, record.version)
+        for record in Attendance.query.filter_by(subject_id=teacher.subject_id, date=DAY)
+    }
+
+def test_default_fills_the_roster_and_exceptions_override(clean_db, teacher, students):
+    changed, conflicts = attendance_sheet.apply_sheet(
+        teacher, DAY, 'present', {students['S002']: ('late', 'bus')})
+    clean_db.session.commit()
+
+    assert conflicts == []
+    assert sorted(changed) == sorted([(students['S001'], 'present'), (students['S003'], 'present'),
+                                      (students['S002'], 'late')])
+    assert _marks(teacher) == {students['S001']: ('present', None, 1), students['S003']: ('present', None, 1),
+                               students['S002']: ('late', 'bus', 1)}
+    daily = clean_db.session.get(AttendanceDaily, (teacher.subject_id, DAY))
+    assert (daily.present, daily.late, daily.total) == (2, 1, 3)
+
+def test_resubmitting_changes_only_what_differs(clean_db, teacher, students):
+    attendance_sheet.apply_sheet(teacher, DAY, 'present', {students['S002']: ('late', 'bus')})
+    clean_db.session.commit()
+
+    changed, _ = attendance_sheet.apply_sheet(teacher, DAY, 'present', {students['S002']: ('late', 'bus')})
+    assert changed == []
+
+    # S002 falls back to the default; the RETURNING rows are exactly the changed ones
+    changed, _ = attendance_sheet.apply_sheet(teacher, DAY, 'present', {students['S001']: ('absent', None)})
+    clean_db.session.commit()
+    assert sorted(changed) == sorted([(students['S002'], 'present'), (students['S001'], 'absent')])
+    marks = _marks(teacher)
+    assert marks[students['S002']] == ('present', None, 2)
+    assert marks[students['S003']] == ('present', None, 1)
+
+def test_keep_existing_only_fills_gaps(clean_db, teacher, students):
+    attendance_sheet.apply_sheet(teacher, DAY, 'absent', {})
+    clean_db.session.query(Attendance).filter_by(student_id=students['S003']).delete()
+    clean_db.session.commit()
+
+    changed, _ = attendance_sheet.apply_sheet(teacher, DAY, 'present', {}, keep_existing=True)
+    clean_db.session.commit()
+    assert changed == [(students['S003'], 'present')]
+    assert _marks(teacher)[students['S001']][0] == 'absent'
+
+def test_stale_versions_are_reported_not_written(clean_db, teacher, students):
+    attendance_sheet.apply_sheet(teacher, DAY, 'present', {})
+    clean_db.session.commit()
+
+    changed, conflicts = attendance_sheet.apply_sheet(
+        teacher, DAY, 'present',
+        {students['S001']: ('absent', None), students['S002']: ('late', None)},
+        versions={students['S001']: 0, students['S002']: 1})
+    clean_db.session.commit()
+    assert changed == [(students['S002'], 'late')]
+    assert conflicts == [{'student_id': students['S001'], 'status': 'present', 'notes': None, 'version': 1}]
+    assert _marks(teacher)[students['S001']] == ('present', None, 1)
+
+def test_parse_rejects_unknown_statuses():
+    assert attendance_sheet.parse_exceptions({'4': {'status': 'late', 'notes': ''}}) == {4: ('late', None)}
+    assert attendance_sheet.parse_versions({'4': {'status': 'late', 'version': '3'}, '5': 'absent'}) == {4: 3}
+    with pytest.raises(ValueError):
+        attendance_sheet.parse_exceptions({'4': 'asleep'})
+
+def test_submit_endpoint_checks_the_roster(login, students):
+    client = login('teacher1', 'teacher123')
+    response = client.post('/teacher/attendance/submit', json={
+        'date': DAY.isoformat(), 'default': 'present', 'exceptions': {'99999': 'absent'}})
+    assert response.status_code == 400
+    assert response.get_json()['student_ids'] == [99999]
+
+    response = client.post('/teacher/attendance/submit', json={
+        'date': DAY.isoformat(), 'default': 'present', 'exceptions': {str(students['S001']): 'absent'}})
+    assert response.get_json() == {'date': DAY.isoformat(), 'roster': 3, 'changed': 3, 'conflicts': []}
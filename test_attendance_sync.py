@@ -0,0 +1,137 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import migrations
+from attendance_sync import apply_batches, parse_client_ts
+from models import Attendance, AttendanceDaily, Class, Student, SyncBatch, Teacher, User
+
+DAY = '2024-09-02'
+
+def _teacher(username):
+    return Teacher.query.join(User).filter(User.username == username).one()
+
+@pytest.fixture
+def students(clean_db):
+    return {student.student_id: student.id for student in Student.query}
+
+def _batch(key, client_ts, marks, **extra):
+    return {'key': key, 'client_ts': client_ts, 'date': DAY, 'marks': marks, **extra}
+
+def _status(student_id):
+    return Attendance.query.filter_by(student_id=student_id, date=date(2024, 9, 2)).one().status
+
+def test_parse_client_ts():
+    assert parse_client_ts(1725271200000) == datetime(2024, 9, 2, 10, 0)
+    assert parse_client_ts('2024-09-02T12:00:00+02:00') == datetime(2024, 9, 2, 10, 0)
+    assert parse_client_ts('2024-09-02T10:00:00Z') == datetime(2024, 9, 2, 10, 0)
+
+def test_replayed_batches_are_acknowledged_without_side_effects(clean_db, students):
+    teacher = _teacher('teacher1')
+    roster = set(students.values())
+    batch = _batch('k1', '2024-09-02T09:00:00', {str(students['S001']): 'absent'})
+
+    acks, changed = apply_batches(teacher, [batch], roster)
+    clean_db.session.commit()
+    assert acks == [{'key': 'k1', 'status': 'applied', 'applied': 1, 'stale': 0}]
+
+    acks, changed = apply_batches(teacher, [batch, batch], roster)
+    clean_db.session.commit()
+    assert acks == [{'key': 'k1', 'status': 'duplicate', 'applied': 1, 'stale': 0}] * 2
+    assert changed == {}
+    assert Attendance.query.count() == 1
+    assert clean_db.session.get(AttendanceDaily, (teacher.subject_id, date(2024, 9, 2))).absent == 1
+
+def test_repeats_within_one_request_carry_the_first_copys_counts(clean_db, students):
+    teacher = _teacher('teacher1')
+    batch = _batch('k1', '2024-09-02T09:00:00', {str(students['S001']): 'absent', str(students['S002']): 'late'})
+
+    acks, changed = apply_batches(teacher, [batch, batch], set(students.values()))
+    clean_db.session.commit()
+    assert acks == [{'key': 'k1', 'status': 'applied', 'applied': 2, 'stale': 0},
+                    {'key': 'k1', 'status': 'duplicate', 'applied': 2, 'stale': 0}]
+    assert Attendance.query.count() == 2
+
+def test_last_writer_wins_on_client_time(clean_db, students):
+    teacher = _teacher('teacher1')
+    roster = set(students.values())
+    student = str(students['S001'])
+
+    # Within one sync the newest batch wins whatever the order sent
+    acks, _ = apply_batches(teacher, [
+        _batch('late', '2024-09-02T10:00:00', {student: 'late'}),
+        _batch('early', '2024-09-02T09:00:00', {student: 'absent'}),
+    ], roster)
+    clean_db.session.commit()
+    assert _status(students['S001']) == 'late'
+
+    # An older offline edit arriving later does not overwrite
+    acks, _ = apply_batches(teacher, [_batch('older', '2024-09-02T09:30:00', {student: 'present'})], roster)
+    clean_db.session.commit()
+    assert acks[0]['stale'] == 1 and acks[0]['applied'] == 0
+    assert _status(students['S001']) == 'late'
+
+def test_keys_are_scoped_to_the_teacher(clean_db, students):
+    roster = set(students.values())
+    first, second = _teacher('teacher1'), _teacher('teacher2')
+    apply_batches(first, [_batch('k1', '2024-09-02T09:00:00', {str(students['S001']): 'absent'})], roster)
+    clean_db.session.commit()
+
+    acks, _ = apply_batches(second, [_batch('k1', '2024-09-02T09:00:00', {str(students['S001']): 'late'})], roster)
+    clean_db.session.commit()
+    assert acks[0]['status'] == 'applied'
+    assert SyncBatch.query.filter_by(key='k1').count() == 2
+
+def test_batches_for_someone_elses_class_are_rejected(clean_db, students):
+    roster = set(students.values())
+    first, second = _teacher('teacher1'), _teacher('teacher2')
+    own = Class(name='A', teacher_id=first.id, subject_id=first.subject_id)
+    other = Class(name='B', teacher_id=second.id, subject_id=second.subject_id)
+    clean_db.session.add_all([own, other])
+    clean_db.session.commit()
+
+    marks = {str(students['S001']): 'absent'}
+    acks, _ = apply_batches(first, [
+        _batch('other', '2024-09-02T09:00:00', marks, class_id=other.id),
+        _batch('bogus', '2024-09-02T09:00:00', marks, class_id='x'),
+        _batch('own', '2024-09-02T09:00:00', marks, class_id=own.id),
+    ], roster)
+    clean_db.session.commit()
+    assert [ack['status'] for ack in acks] == ['rejected', 'rejected', 'applied']
+    assert acks[0]['error'] == 'Class not found'
+    assert Attendance.query.one().class_id == own.id
+    assert SyncBatch.query.filter_by(key='other').first() is None
+
+def test_sync_endpoint(login, students):
+    client = login('teacher1', 'teacher123')
+    response = client.post('/teacher/attendance/sync', json={'batches': [
+        _batch('k1', 1725271200000, {str(students['S002']): 'late'}),
+        _batch('k2', 1725271200000, {'99999': 'late'}),
+    ]})
+    acks = response.get_json()['acks']
+    assert [ack['status'] for ack in acks] == ['applied', 'rejected']
+
+def test_migration_makes_keys_unique_per_teacher(tmp_path):
+    path = tmp_path / 'old.db'
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE teacher (id INTEGER PRIMARY KEY)')
+        conn.exec_driver_sql("""
+            CREATE TABLE sync_batch (
+                id INTEGER NOT NULL, "key" VARCHAR(64) NOT NULL, teacher_id INTEGER NOT NULL,
+                client_ts DATETIME NOT NULL, received_at DATETIME, applied INTEGER NOT NULL,
+                stale INTEGER NOT NULL, PRIMARY KEY (id), UNIQUE ("key"),
+                FOREIGN KEY(teacher_id) REFERENCES teacher (id)
+            )
+        """)
+        conn.exec_driver_sql("INSERT INTO teacher VALUES (1), (2)")
+        conn.exec_driver_sql("INSERT INTO sync_batch VALUES (1, 'k1', 1, '2024-09-02', NULL, 1, 0)")
+
+    assert 6 in migrations.upgrade(engine)
+    unique = [c['column_names'] for c in inspect(engine).get_unique_constraints('sync_batch')]
+    assert unique == [['teacher_id', 'key']]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO sync_batch VALUES (2, 'k1', 2, '2024-09-02', NULL, 1, 0)")
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM sync_batch').scalar() == 2
+    engine.dispose()
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import threading
+
+import backup_db
+from backup_db import backup_database, prune_backups, verify_backup
+
+def _make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, payload TEXT)')
+    conn.executemany('INSERT INTO item (payload) VALUES (?)', [('x' * 500,)] * rows)
+    conn.commit()
+    conn.close()
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM item').fetchone()[0]
+    finally:
+        conn.close()
+
+def test_backup_copies_in_steps_and_verifies(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    _make_db(db_path, 2000)
+
+    stats = backup_database(db_path, str(tmp_path / 'backups'), pages=16, pause=0)
+    assert stats['verified']
+    assert stats['steps'] > 1
+    assert _count(stats['path']) == 2000
+    assert not os.path.exists(stats['path'] + '.partial')
+
+def test_backup_lets_writers_through(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    _make_db(db_path, 2000)
+    written = []
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=5)
+        for _ in range(20):
+            conn.execute("INSERT INTO item (payload) VALUES ('new')")
+            conn.commit()
+            written.append(1)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    stats = backup_database(db_path, str(tmp_path / 'backups'), pages=8, pause=0.001)
+    thread.join()
+
+    assert len(written) == 20
+    assert stats['verified']
+    # The backup is a consistent copy from some point during the writes
+    assert 2000 <= _count(stats['path']) <= 2020
+
+def test_prune_keeps_the_newest(tmp_path):
+    for stamp in ('20240101_000000_000001', '20240102_000000_000001', '20240103_000000_000001'):
+        _make_db(str(tmp_path / f'GAMS_backup_{stamp}.db'), 1)
+
+    removed = prune_backups(str(tmp_path), keep=2)
+    assert [os.path.basename(path) for path in removed] == ['GAMS_backup_20240101_000000_000001.db']
+    assert sorted(os.listdir(tmp_path)) == ['GAMS_backup_20240102_000000_000001.db',
+                                             'GAMS_backup_20240103_000000_000001.db']
+
+def test_backup_restarted_by_writes_finishes_in_one_step(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'live.db')
+    _make_db(db_path, 2000)
+    writer = sqlite3.connect(db_path)
+
+    def write_between_steps(seconds):
+        writer.execute("INSERT INTO item (payload) VALUES ('new')")
+        writer.commit()
+
+    monkeypatch.setattr(backup_db.time, 'sleep', write_between_steps)
+    stats = backup_database(db_path, str(tmp_path / 'backups'), pages=16, pause=0.001, max_restarts=2)
+    writer.close()
+
+    assert stats['restarts'] == 3
+    assert stats['single_step']
+    assert stats['verified']
+    assert _count(stats['path']) == _count(db_path)
+
+def test_verify_backup_rejects_a_damaged_file(tmp_path):
+    path = str(tmp_path / 'damaged.db')
+    _make_db(path, 500)
+    with open(path, 'r+b') as f:
+        f.seek(4096 * 3)
+        f.write(b'\xff' * 4096)
+    assert not verify_backup(path)
+
+    unreadable = str(tmp_path / 'unreadable.db')
+    _make_db(unreadable, 10)
+    with open(unreadable, 'r+b') as f:
+        f.write(b'\xff' * 100)  # the header
+    assert not verify_backup(unreadable)
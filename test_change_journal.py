@@ -0,0 +1,62 @@
+from datetime import date, datetime
+
+import pytest
+
+from models import ChangeJournal
+from change_journal import change_journal, marks_as_of, GRADE, ATTENDANCE, ATTENDANCE_CODES
+
+def _row(recorded_at, kind, ref, value, student_id=1, subject_id=1):
+    return ChangeJournal(recorded_at=recorded_at, kind=kind, student_id=student_id,
+                         subject_id=subject_id, teacher_id=1, ref=ref, value=value)
+
+def test_marks_as_of_replays_up_to_the_cutoff(clean_db):
+    day = date(2024, 3, 4)
+    clean_db.session.add_all([
+        _row(100.0, GRADE, 7, 60),
+        _row(200.0, GRADE, 7, 75),
+        _row(300.0, GRADE, 7, 90),
+        _row(150.0, ATTENDANCE, day.toordinal(), ATTENDANCE_CODES['absent']),
+        _row(250.0, GRADE, 7, 10, student_id=2),
+    ])
+    clean_db.session.commit()
+
+    grades, attendance = marks_as_of(1, datetime.fromtimestamp(250.0))
+    assert grades == {(1, 7): 75}
+    assert attendance == {(1, day): 'absent'}
+    assert marks_as_of(1, datetime.fromtimestamp(50.0)) == ({}, {})
+
+def test_marks_as_of_orders_by_recorded_at_not_id(clean_db):
+    # Two workers: the later write was flushed first and got the lower id
+    clean_db.session.add(_row(200.0, GRADE, 7, 80))
+    clean_db.session.flush()
+    clean_db.session.add(_row(100.0, GRADE, 7, 40))
+    clean_db.session.commit()
+
+    grades, _ = marks_as_of(1, datetime.fromtimestamp(300.0))
+    assert grades == {(1, 7): 80}
+
+def test_flush_writes_buffered_rows_in_one_batch(clean_db):
+    change_journal.record_grade(1, 1, 5, 7, 88)
+    change_journal.record_attendance(1, 1, 5, datetime(2024, 3, 4, 9, 30), 'late')
+    assert ChangeJournal.query.count() == 0
+
+    assert change_journal.flush() == 2
+    rows = ChangeJournal.query.order_by(ChangeJournal.id).all()
+    assert [(row.kind, row.ref, row.value) for row in rows] == [
+        (GRADE, 7, 88.0), (ATTENDANCE, date(2024, 3, 4).toordinal(), ATTENDANCE_CODES['late'])
+    ]
+    assert change_journal.flush() == 0
+
+def test_failed_flush_keeps_the_rows(clean_db):
+    change_journal.record_grade(1, 1, 5, 7, 91)
+    clean_db.session.commit()
+    with clean_db.engine.begin() as conn:
+        conn.exec_driver_sql('ALTER TABLE change_journal RENAME TO change_journal_away')
+    try:
+        with pytest.raises(Exception):
+            change_journal.flush()
+    finally:
+        with clean_db.engine.begin() as conn:
+            conn.exec_driver_sql('ALTER TABLE change_journal_away RENAME TO change_journal')
+    assert change_journal.flush() == 1
+    assert ChangeJournal.query.one().value == 91.0
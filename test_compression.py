@@ -0,0 +1,67 @@
+import gzip
+import zlib
+
+import pytest
+from werkzeug.test import Client
+
+from compression import CompressionMiddleware
+
+def _app(body, content_type='text/html', length=True, status='200 OK', extra=()):
+    """A WSGI app returning `body` (a list of chunks)"""
+    def app(environ, start_response):
+        headers = [('Content-Type', content_type), *extra]
+        if length:
+            headers.append(('Content-Length', str(sum(len(chunk) for chunk in body))))
+        start_response(status, headers)
+        return iter(body)
+    return app
+
+def _get(app, accept='gzip', **kwargs):
+    return Client(CompressionMiddleware(app, **kwargs)).get('/', headers={'Accept-Encoding': accept})
+
+def test_large_responses_are_gzipped():
+    body = b'<p>attendance</p>' * 200
+    response = _get(_app([body]))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.data) < len(body)
+    assert gzip.decompress(response.data) == body
+
+@pytest.mark.parametrize('app, accept', [
+    (_app([b'small']), 'gzip'),
+    (_app([b'x' * 2000]), 'identity'),
+    (_app([b'x' * 2000], content_type='image/png'), 'gzip'),
+    (_app([b'x' * 2000], extra=[('Cache-Control', 'no-transform')]), 'gzip'),
+    (_app([b'x' * 2000], status='404 NOT FOUND'), 'gzip'),
+    (_app([b'x' * 2000]), 'gzip;q=0'),
+])
+def test_responses_left_alone(app, accept):
+    response = _get(app, accept)
+    assert 'Content-Encoding' not in response.headers
+
+def test_streamed_response_is_flushed_as_it_goes():
+    chunks = [b'row,%d\n' % i * 100 for i in range(50)]
+    app = _app(chunks, content_type='text/csv', length=False)
+    middleware = CompressionMiddleware(app, min_size=500, flush_size=4096)
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['headers'] = dict(headers)
+    pieces = list(middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, start_response))
+
+    assert started['headers']['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in started['headers']
+    assert len([piece for piece in pieces if piece]) > 2  # sent in several pieces
+    # Sync flushes make most of the body decodable before the stream ends
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert len(decoder.decompress(b''.join(pieces[:-1]))) > len(b''.join(chunks)) - 4096
+    assert gzip.decompress(b''.join(pieces)) == b''.join(chunks)
+
+def test_generator_app_that_starts_late():
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        yield b'a' * 300
+        yield b'b' * 300
+
+    response = _get(app)
+    assert gzip.decompress(response.data) == b'a' * 300 + b'b' * 300
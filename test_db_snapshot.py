@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from db_snapshot import DatabaseSnapshot, snapshot_database, restore_database
+
+def _make_db(path, names):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE IF NOT EXISTS item (name TEXT)')
+    conn.execute('DELETE FROM item')
+    conn.executemany('INSERT INTO item VALUES (?)', [(name,) for name in names])
+    conn.commit()
+    conn.close()
+
+def _names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute('SELECT name FROM item ORDER BY name')]
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('method', ['backup', 'copy'])
+def test_restore_database_undoes_changes(tmp_path, method):
+    db_path, snapshot_path = str(tmp_path / 'live.db'), str(tmp_path / 'snap.db')
+    _make_db(db_path, ['a', 'b'])
+    snapshot_database(db_path, snapshot_path)
+
+    _make_db(db_path, ['c'])
+    restore_database(snapshot_path, db_path, method)
+    assert _names(db_path) == ['a', 'b']
+
+def test_restore_database_needs_a_snapshot(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        restore_database(str(tmp_path / 'missing.db'), str(tmp_path / 'live.db'))
+
+def test_database_snapshot_restores_repeatedly_under_an_open_connection(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    _make_db(db_path, ['a'])
+    snapshot = DatabaseSnapshot(db_path).capture()
+    reader = sqlite3.connect(db_path)
+    try:
+        for name in ('x', 'y'):
+            _make_db(db_path, [name])
+            snapshot.restore()
+            assert [row[0] for row in reader.execute('SELECT name FROM item')] == ['a']
+    finally:
+        reader.close()
+        snapshot.close()
+
+def test_database_snapshot_restore_before_capture(tmp_path):
+    with pytest.raises(RuntimeError):
+        DatabaseSnapshot(str(tmp_path / 'live.db')).restore()
+
+# Run twice: whichever runs second would see the first one's user if the
+# fixture did not restore the seeded database
+@pytest.mark.parametrize('attempt', [1, 2])
+def test_clean_db_starts_every_test_from_the_seed(clean_db, attempt):
+    from models import User
+
+    assert User.query.filter_by(username='scratch').first() is None
+    assert User.query.filter_by(username='student1').first() is not None
+    clean_db.session.add(User(username='scratch', email='scratch@school.com', role='student'))
+    clean_db.session.commit()
@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+import app as app_module
+import migrations
+from models import Attendance, Grade, GradeCategory, Student, Teacher, User
+
+@pytest.fixture
+def category(clean_db):
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    category = GradeCategory(name='Quiz 1', teacher_id=teacher.id, subject_id=teacher.subject_id)
+    clean_db.session.add(category)
+    clean_db.session.commit()
+    return category.id
+
+@pytest.fixture
+def student(clean_db):
+    return Student.query.filter_by(student_id='S001').one().id
+
+def _grade(category, student):
+    return Grade.query.filter_by(category_id=category, student_id=student).one()
+
+def _save(client, category, student, grade, version):
+    return client.post(f'/teacher/grades/{category}', data={
+        'student_id': student, 'grade': grade, 'version': version}).get_data(as_text=True)
+
+def test_grade_saved_from_a_stale_page_is_refused(clean_db, login, category, student):
+    client = login('teacher1', 'teacher123')
+    assert 'Grade saved successfully' in _save(client, category, student, 80, 0)
+    assert 'Grade saved successfully' in _save(client, category, student, 85, 1)
+
+    # A second tab still showing version 1
+    page = _save(client, category, student, 60, 1)
+    assert 'changed by someone else (now 85.00%)' in page
+    grade = _grade(category, student)
+    assert (grade.grade, grade.version) == (85, 2)
+
+def test_simultaneous_first_grades_keep_one_row(clean_db, login, category, student, monkeypatch):
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    run = app_module.write_queue.run
+
+    def racing_run(fn, *args, **kwargs):
+        # Another request inserts the first grade after this one looked and found none
+        def save():
+            result = fn(*args, **kwargs)
+            with clean_db.engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO grade (student_id, teacher_id, subject_id, category_id, grade, date, version) "
+                    "VALUES (:student, :teacher, :subject, :category, 70, '2024-09-02 00:00:00', 1)"
+                ), {'student': student, 'teacher': teacher.id, 'subject': teacher.subject_id, 'category': category})
+            return result
+        return run(save)
+    monkeypatch.setattr(app_module.write_queue, 'run', racing_run)
+
+    page = _save(login('teacher1', 'teacher123'), category, student, 90, 0)
+    assert 'This grade was changed while saving' in page
+    assert _grade(category, student).grade == 70
+
+def test_duplicate_grades_are_rejected(clean_db, category, student):
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    for value in (70, 80):
+        clean_db.session.add(Grade(student_id=student, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                   category_id=category, grade=value))
+    with pytest.raises(IntegrityError):
+        clean_db.session.commit()
+    clean_db.session.rollback()
+
+def test_concurrent_attendance_updates_raise_stale_data(clean_db, student):
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    clean_db.session.add(Attendance(student_id=student, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                    date=date(2024, 9, 2), status='present'))
+    clean_db.session.commit()
+
+    with Session(clean_db.engine) as first, Session(clean_db.engine) as second:
+        mine = first.query(Attendance).filter_by(student_id=student).one()
+        theirs = second.query(Attendance).filter_by(student_id=student).one()
+        theirs.status = 'late'
+        second.commit()
+        mine.status = 'absent'
+        with pytest.raises(StaleDataError):
+            first.commit()
+    record = Attendance.query.filter_by(student_id=student).one()
+    assert (record.status, record.version) == ('late', 2)
+
+def test_migration_moves_duplicate_grades_aside(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("""
+            CREATE TABLE grade (
+                id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL, teacher_id INTEGER NOT NULL,
+                subject_id INTEGER NOT NULL, category_id INTEGER NOT NULL, grade FLOAT NOT NULL,
+                date DATETIME, version INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        conn.exec_driver_sql('CREATE INDEX ix_grade_student_category ON grade (student_id, category_id)')
+        conn.exec_driver_sql("""
+            INSERT INTO grade VALUES
+                (1, 1, 1, 1, 1, 60, '2024-09-03', 1),
+                (2, 1, 1, 1, 1, 70, '2024-09-02', 1),
+                (3, 2, 1, 1, 1, 80, '2024-09-02', 1)
+        """)
+
+    assert 7 in migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT id, grade FROM grade ORDER BY id').all() == [(1, 60), (3, 80)]
+        assert conn.exec_driver_sql(
+            'SELECT id, student_id, category_id, grade, date, kept_id FROM grade_duplicate').all() == [
+            (2, 1, 1, 70, '2024-09-02', 1)]
+    index = next(index for index in inspect(engine).get_indexes('grade')
+                 if index['name'] == 'ix_grade_student_category')
+    assert index['unique']
+    engine.dispose()
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import event
+
+from models import User, Teacher
+from identity_cache import identity_cache
+
+@pytest.fixture
+def cached_identities(clean_db, monkeypatch):
+    monkeypatch.setattr(identity_cache, 'enabled', True)
+    monkeypatch.setattr(identity_cache, 'poll_interval', 0)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(clean_db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(clean_db.engine, 'before_cursor_execute', record)
+
+def _user_loads(statements):
+    return sum('FROM user' in statement and 'user.id = ?' in statement for statement in statements)
+
+def test_cached_identity_skips_the_user_query(login, cached_identities):
+    client = login('admin', 'admin123')
+    client.get('/dashboard')  # the first load stores the record
+    cached_identities.clear()
+
+    assert client.get('/dashboard').status_code == 200
+    assert _user_loads(cached_identities) == 0
+
+def test_role_or_approval_change_revokes_the_cached_identity(clean_db, login, cached_identities):
+    client = login('teacher1', 'teacher123')
+    client.get('/get_subjects')
+    cached_identities.clear()
+    client.get('/get_subjects')
+    assert _user_loads(cached_identities) == 0
+
+    teacher = Teacher.query.join(User).filter(User.username == 'teacher1').one()
+    teacher.is_approved = False
+    clean_db.session.commit()
+    cached_identities.clear()
+    client.get('/dashboard')
+    assert _user_loads(cached_identities) == 1
+
+def test_disabled_cache_always_loads_the_user(login, clean_db):
+    statements = []
+    client = login('admin', 'admin123')
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(clean_db.engine, 'before_cursor_execute', record)
+    try:
+        client.get('/dashboard')
+        client.get('/dashboard')
+    finally:
+        event.remove(clean_db.engine, 'before_cursor_execute', record)
+    assert _user_loads(statements) == 2
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+import attendance_bitmap
+import attendance_rollup
+import integrity
+from models import AttendanceBitmap, AttendanceDaily, Student, Teacher, User
+
+DAY = date(2024, 9, 2)
+MISSING = 99999  # an id with no row behind it
+
+@pytest.fixture
+def teacher(clean_db):
+    return Teacher.query.join(User).filter(User.username == 'teacher1').one()
+
+@pytest.fixture
+def students(clean_db):
+    return {student.student_id: student.id for student in Student.query}
+
+def _insert_marks(db, teacher, rows):
+    """Write attendance rows directly, the way a damaged database might hold them"""
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        for student_id, teacher_id, status, updated_at in rows:
+            conn.execute(text(
+                "INSERT INTO attendance (student_id, teacher_id, subject_id, date, status, updated_at, version) "
+                "VALUES (:student, :teacher, :subject, :day, :status, :updated_at, 1)"
+            ), {'student': student_id, 'teacher': teacher_id or teacher.id, 'subject': teacher.subject_id,
+                'day': DAY.isoformat(), 'status': status, 'updated_at': updated_at})
+        conn.commit()
+    # The bitmaps and rollup counted every row, as saves of the time did
+    attendance_bitmap.record_marks(teacher.subject_id, DAY, [(row[0], row[2]) for row in rows if row[0] != MISSING])
+    attendance_rollup.refresh_day(teacher.subject_id, DAY)
+    db.session.commit()
+
+def _derived(teacher):
+    bitmaps = {bitmap.student_id: attendance_bitmap.counts(bitmap.bits) for bitmap in AttendanceBitmap.query}
+    daily = AttendanceDaily.query.filter_by(subject_id=teacher.subject_id, date=DAY).one()
+    return ({student_id: tally for student_id, tally in bitmaps.items() if tally['total']},
+            (daily.present, daily.absent, daily.late, daily.total))
+
+def test_report_only_changes_nothing(clean_db, teacher, students):
+    _insert_marks(clean_db, teacher, [(students['S001'], None, 'present', '2024-09-02 08:00:00'),
+                                      (students['S001'], None, 'absent', '2024-09-02 09:00:00')])
+    assert integrity.check(clean_db.engine) == 1
+    assert integrity.check(clean_db.engine) == 1
+
+def test_fix_recounts_bitmaps_and_rollup(clean_db, teacher, students):
+    _insert_marks(clean_db, teacher, [
+        (students['S001'], None, 'present', '2024-09-02 08:00:00'),
+        (students['S001'], None, 'absent', '2024-09-02 09:00:00'),    # newer copy, kept
+        (students['S002'], MISSING, 'late', '2024-09-02 08:00:00'),   # teacher gone
+        (MISSING, None, 'present', '2024-09-02 08:00:00'),            # student gone
+        (students['S003'], None, 'present', '2024-09-02 08:00:00'),
+    ])
+    assert _derived(teacher)[1] == (3, 1, 1, 5)
+
+    assert integrity.check(clean_db.engine, fix=True, pause=0) == 3
+    assert integrity.check(clean_db.engine) == 0
+
+    bitmaps, daily = _derived(teacher)
+    assert daily == (1, 1, 0, 2)
+    assert bitmaps[students['S001']]['absent'] == 1
+    assert students['S002'] not in bitmaps
+
+    # Same result as regenerating both from scratch
+    attendance_bitmap.rebuild_bitmaps()
+    attendance_rollup.rebuild()
+    assert _derived(teacher) == (bitmaps, daily)
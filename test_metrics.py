@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, _labels, _statement_kind
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = MetricsRegistry()
+    registry.directory = str(tmp_path)
+    registry.define('jobs_total', 'counter', 'Jobs run')
+    registry.define('queue_depth', 'gauge', 'Jobs waiting')
+    registry.define('job_seconds', 'histogram', 'Job time', (0.1, 1.0))
+    return registry
+
+def _other_worker(directory, pid, counter=5, age=0):
+    """A snapshot as another worker process would have written it"""
+    path = os.path.join(directory, f'metrics_{pid}.json')
+    with open(path, 'w') as f:
+        json.dump({'pid': pid, 'counters': [['jobs_total', [], counter]],
+                   'gauges': [['queue_depth', [], 2]],
+                   'histograms': [['job_seconds', [], [[1, 0, 0], 0.05, 1]]]}, f)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+def test_render_exposes_counters_gauges_and_histograms(registry):
+    registry.inc('jobs_total', (('kind', 'grade'),), 3)
+    registry.set_gauge('queue_depth', value=4)
+    for value in (0.05, 0.5, 5.0):
+        registry.observe('job_seconds', value)
+
+    text = registry.render()
+    assert 'jobs_total{kind="grade"} 3' in text
+    assert 'queue_depth 4' in text
+    assert 'job_seconds_bucket{le="0.1"} 1' in text
+    assert 'job_seconds_bucket{le="1.0"} 2' in text
+    assert 'job_seconds_bucket{le="+Inf"} 3' in text
+    assert 'job_seconds_count 3' in text
+
+def test_live_workers_are_summed(registry, tmp_path):
+    worker = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        _other_worker(str(tmp_path), worker.pid)
+        registry.inc('jobs_total', amount=1)
+        text = registry.render()
+    finally:
+        worker.kill()
+        worker.wait()
+    assert 'jobs_total 6' in text
+    assert 'queue_depth 2' in text
+    assert 'job_seconds_count 1' in text
+
+def test_dead_and_stale_snapshots_are_archived(registry, tmp_path):
+    worker = subprocess.Popen([sys.executable, '-c', 'pass'])
+    worker.wait()
+    dead = _other_worker(str(tmp_path), worker.pid)
+    stale = _other_worker(str(tmp_path), os.getppid(), age=3600)  # a live pid that stopped writing
+    registry.inc('jobs_total', amount=1)
+
+    text = registry.render()
+    assert 'jobs_total 11' in text
+    assert 'job_seconds_count 2' in text
+    assert 'queue_depth' not in text.replace('# HELP queue_depth', '').replace('# TYPE queue_depth', '')
+    assert not os.path.exists(dead) and not os.path.exists(stale)
+    assert 'jobs_total 11' in registry.render()  # archived once, not on every scrape
+
+def test_scraped_counter_never_decreases_when_workers_go_away(registry, tmp_path):
+    worker = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        _other_worker(str(tmp_path), worker.pid, counter=5)
+        registry.inc('jobs_total', amount=1)
+        before = registry.render()
+    finally:
+        worker.kill()
+        worker.wait()
+    registry.inc('jobs_total', amount=1)
+    after = registry.render()
+    assert 'jobs_total 6' in before
+    assert 'jobs_total 7' in after
+    assert 'job_seconds_count 1' in after
+
+def test_exiting_worker_archives_its_snapshot(registry, tmp_path):
+    registry.inc('jobs_total', amount=3)
+    registry.set_gauge('queue_depth', value=4)
+    registry.write_snapshot()
+    path = tmp_path / f'metrics_{os.getpid()}.json'
+    assert path.exists()
+    registry.archive_snapshot()
+    assert not path.exists()
+
+    survivor = MetricsRegistry()
+    survivor.directory = str(tmp_path)
+    survivor._definitions = registry._definitions
+    text = survivor.render()
+    assert 'jobs_total 3' in text
+    assert 'queue_depth 0' not in text and 'queue_depth 4' not in text
+
+def test_worker_reaped_while_running_is_not_counted_twice(registry, tmp_path):
+    registry.inc('jobs_total', amount=2)
+    registry.observe('job_seconds', 0.5)
+    registry.write_snapshot()
+    # Another worker found this snapshot stale, e.g. during a long pause
+    with registry._directory_lock():
+        registry._archive(str(tmp_path / f'metrics_{os.getpid()}.json'))
+
+    registry.inc('jobs_total', amount=1)
+    text = registry.render()
+    assert 'jobs_total 3' in text
+    assert 'job_seconds_count 1' in text
+
+def test_label_escaping_and_statement_kinds():
+    assert _labels((('path', 'a"b\\c'),)) == '{path="a\\"b\\\\c"}'
+    assert _labels(()) == ''
+    assert _statement_kind('  select 1') == 'SELECT'
+    assert _statement_kind('PRAGMA foreign_keys') == 'OTHER'
+
+def test_app_metrics_count_requests_and_sql(app, clean_db, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    client = app.test_client()
+    client.get('/')
+    assert client.get('/metrics').status_code == 401
+
+    text = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).get_data(as_text=True)
+    assert 'gams_http_requests_total{endpoint="index",status="200"}' in text
+    assert 'gams_sql_statements_total{kind="SELECT"}' in text
+
+def test_journal_flush_counts_lock_retries(clean_db, monkeypatch):
+    from change_journal import change_journal
+
+    class LockedEngine:
+        def begin(self):
+            raise sqlite3.OperationalError('database is locked')
+
+    key = ('gams_sql_lock_retries_total', (('source', 'change_journal'),))
+    before = metrics.registry._counters.get(key, 0)
+    change_journal.record_grade(1, 1, 5, 7, 88)
+    monkeypatch.setattr(change_journal, '_engine', LockedEngine())
+    with pytest.raises(sqlite3.OperationalError):
+        change_journal.flush()
+    assert metrics.registry._counters[key] == before + 1
+
+    monkeypatch.undo()
+    assert change_journal.flush() == 1  # the rows waited for the retry
@@ -0,0 +1,150 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import migrations
+from migrations import Migrator
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    yield engine
+    engine.dispose()
+
+def _run(engine, *statements):
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+
+def _rows(engine, sql):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(sql).all()
+
+def test_upgrade_brings_an_old_database_up_to_date(engine, capsys):
+    # The shape of a database from before any of the migrations
+    _run(engine,
+         'CREATE TABLE student (id INTEGER PRIMARY KEY, student_id VARCHAR(20))',
+         'CREATE TABLE teacher (id INTEGER PRIMARY KEY)',
+         'CREATE TABLE attendance (id INTEGER PRIMARY KEY, student_id INTEGER, subject_id INTEGER, '
+         'date DATE, status VARCHAR(20))',
+         'CREATE TABLE grade (id INTEGER PRIMARY KEY, student_id INTEGER, category_id INTEGER, '
+         'grade FLOAT, date DATETIME)',
+         "INSERT INTO student VALUES (1, 'S001')",
+         "INSERT INTO attendance VALUES (1, 1, 3, '2024-09-02', 'present'), (2, 1, 3, '2024-09-03', 'late')",
+         "INSERT INTO grade VALUES (1, 1, 1, 80, '2024-09-02')")
+
+    assert migrations.upgrade(engine, target=3) == [1, 2, 3]
+    assert migrations.upgrade(engine) == [4, 5, 6, 7, 8]
+    assert migrations.upgrade(engine) == []
+    assert sorted(migrations.applied_versions(engine)) == [1, 2, 3, 4, 5, 6, 7, 8]
+
+    assert _rows(engine, 'SELECT is_approved FROM student') == [(1,)]
+    assert _rows(engine, 'SELECT updated_at, version FROM attendance ORDER BY id') == [
+        ('2024-09-02 00:00:00.000000', 1), ('2024-09-03 00:00:00.000000', 1)]
+    assert _rows(engine, 'SELECT * FROM attendance_daily ORDER BY date') == [
+        (3, '2024-09-02', 1, 0, 0, 1), (3, '2024-09-03', 0, 0, 1, 1)]
+    assert {index['name'] for index in inspect(engine).get_indexes('attendance')} == {'ix_attendance_subject_date'}
+
+    capsys.readouterr()
+    migrations.status(engine)
+    assert capsys.readouterr().out.count('applied') == len(migrations.MIGRATIONS)
+
+def test_upgrade_fills_attendance_bitmaps_from_existing_attendance(engine, monkeypatch):
+    from attendance_bitmap import calendar
+
+    _run(engine,
+         'CREATE TABLE attendance (id INTEGER PRIMARY KEY, student_id INTEGER, subject_id INTEGER, '
+         'date DATE, status VARCHAR(20))',
+         'CREATE TABLE attendance_bitmap (id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL, '
+         'subject_id INTEGER NOT NULL, term VARCHAR(10) NOT NULL, bits BLOB NOT NULL, '
+         'UNIQUE (student_id, subject_id, term))',
+         "INSERT INTO attendance VALUES (1, 1, 3, '2025-05-05', 'present'), (2, 1, 3, '2025-05-06', 'absent'), "
+         "(3, 1, 3, '2025-09-01', 'late'), (4, 2, 4, '2025-05-05', 'present')",
+         # Written by a save after deploy; knows nothing of the earlier days
+         "INSERT INTO attendance_bitmap VALUES (1, 1, 3, '2025-T1', X'00')")
+
+    sleeps = []
+    monkeypatch.setattr(migrations.time, 'sleep', sleeps.append)
+    migrations.attendance_bitmaps(Migrator(engine, pause=0.5))
+    assert sleeps == [0.5] * 3  # one commit per subject and term
+
+    bitmaps = {row[:3]: row[3] for row in _rows(
+        engine, 'SELECT student_id, subject_id, term, bits FROM attendance_bitmap')}
+    assert sorted(bitmaps) == [(1, 3, '2025-T1'), (1, 3, '2025-T2'), (2, 4, '2025-T1')]
+    assert [(str(day), status) for day, status in calendar(bitmaps[(1, 3, '2025-T1')], '2025-T1')] == [
+        ('2025-05-05', 'present'), ('2025-05-06', 'absent')]
+    assert [(str(day), status) for day, status in calendar(bitmaps[(1, 3, '2025-T2')], '2025-T2')] == [
+        ('2025-09-01', 'late')]
+
+def test_steps_skip_tables_that_do_not_exist(engine):
+    assert migrations.upgrade(engine) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert inspect(engine).get_table_names() == ['schema_version']
+
+def test_backfill_commits_in_rowid_chunks(engine, monkeypatch):
+    _run(engine, 'CREATE TABLE item (id INTEGER PRIMARY KEY, flag INTEGER)',
+         'INSERT INTO item (flag) VALUES ' + ', '.join(['(NULL)'] * 7 + ['(0)']))
+    sleeps = []
+    monkeypatch.setattr(migrations.time, 'sleep', sleeps.append)
+
+    m = Migrator(engine, chunk=3, pause=0.5)
+    assert m.backfill('item', 'flag = :value', where='flag IS NULL', params={'value': 1}) == 7
+    assert sleeps == [0.5] * 3  # rowids 1-3, 4-6, 7-8
+    assert _rows(engine, 'SELECT COUNT(*) FROM item WHERE flag = 1') == [(7,)]
+    assert m.backfill('item', 'flag = 1', where='flag IS NULL') == 0
+    assert m.backfill('missing', 'flag = 1') == 0
+
+def test_rollup_backfill_commits_per_subject_and_term(engine, monkeypatch):
+    _run(engine,
+         'CREATE TABLE attendance (id INTEGER PRIMARY KEY, student_id INTEGER, subject_id INTEGER, '
+         'date DATE, status VARCHAR(20))',
+         "INSERT INTO attendance VALUES (1, 1, 3, '2025-06-30', 'present'), (2, 2, 3, '2025-06-30', 'absent'), "
+         "(3, 1, 3, '2026-01-05', 'late'), (4, 1, 4, '2025-05-05', 'present')")
+    sleeps = []
+    monkeypatch.setattr(migrations.time, 'sleep', sleeps.append)
+
+    migrations.attendance_daily_rollup(Migrator(engine, pause=0.5))
+    assert sleeps == [0.5] * 4  # subject 3: 2025-T1, 2025-T2, 2026-T1; subject 4: 2025-T1
+    assert _rows(engine, 'SELECT * FROM attendance_daily ORDER BY subject_id, date') == [
+        (3, '2025-06-30', 1, 1, 0, 2), (3, '2026-01-05', 0, 0, 1, 1), (4, '2025-05-05', 1, 0, 0, 1)]
+
+def test_add_column_only_once(engine):
+    _run(engine, 'CREATE TABLE item (id INTEGER PRIMARY KEY)', 'INSERT INTO item VALUES (1)')
+    m = Migrator(engine)
+    assert m.add_column('item', 'flag', 'INTEGER NOT NULL', default='5')
+    assert not m.add_column('item', 'flag', 'INTEGER NOT NULL', default='5')
+    assert not m.add_column('missing', 'flag', 'INTEGER')
+    assert _rows(engine, 'SELECT flag FROM item') == [(5,)]
+
+def test_rebuild_table_keeps_rows_indexes_and_triggers(engine):
+    _run(engine,
+         'CREATE TABLE parent (id INTEGER PRIMARY KEY)',
+         'CREATE TABLE item (id INTEGER PRIMARY KEY, parent_id INTEGER REFERENCES parent (id), '
+         'name VARCHAR(10), obsolete TEXT)',
+         'CREATE INDEX ix_item_name ON item (name)',
+         'CREATE TABLE log (name TEXT)',
+         'CREATE TRIGGER item_log AFTER INSERT ON item BEGIN INSERT INTO log VALUES (new.name); END',
+         "INSERT INTO parent VALUES (1)",
+         "INSERT INTO item VALUES (1, 1, 'a', 'x'), (2, 1, 'b', 'y')",
+         'DELETE FROM log')
+
+    Migrator(engine).rebuild_table('item', """
+        id INTEGER PRIMARY KEY,
+        parent_id INTEGER REFERENCES parent (id),
+        name VARCHAR(10) NOT NULL UNIQUE
+    """, copy_columns=['id', 'parent_id', 'name'])
+
+    assert _rows(engine, 'SELECT * FROM item ORDER BY id') == [(1, 1, 'a'), (2, 1, 'b')]
+    assert {column['name'] for column in inspect(engine).get_columns('item')} == {'id', 'parent_id', 'name'}
+    assert [index['name'] for index in inspect(engine).get_indexes('item')] == ['ix_item_name']
+    assert not inspect(engine).has_table('item__rebuild')
+    _run(engine, "INSERT INTO item VALUES (3, 1, 'c')")
+    assert _rows(engine, 'SELECT name FROM log') == [('c',)]
+
+def test_rebuild_table_rolls_back_on_error(engine):
+    _run(engine, 'CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)',
+         "INSERT INTO item VALUES (1, 'a'), (2, 'a')")
+    with pytest.raises(Exception):
+        Migrator(engine).rebuild_table('item', 'id INTEGER PRIMARY KEY, name TEXT UNIQUE')
+    assert _rows(engine, 'SELECT COUNT(*) FROM item') == [(2,)]
+    assert not inspect(engine).has_table('item__rebuild')
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA foreign_keys').scalar() == 0
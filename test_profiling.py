@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from profiling import RequestProfiler, StackSampler
+
+@pytest.fixture
+def profiled(tmp_path):
+    app = Flask(__name__)
+    app.config.update(PROFILE_ENABLED=True, PROFILE_DIR=str(tmp_path), PROFILE_TOKEN='secret')
+    engine = create_engine('sqlite://')
+    profiler = RequestProfiler()
+    profiler.init_app(app, engine)
+
+    @app.route('/work')
+    def work():
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text('SELECT 1'))
+        return 'done'
+
+    return app, profiler, tmp_path
+
+def _summaries(directory):
+    summaries = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                summaries.append(json.load(f))
+    return summaries
+
+def test_requests_without_the_header_are_not_profiled(profiled):
+    app, _, directory = profiled
+    assert app.test_client().get('/work').data == b'done'
+    assert os.listdir(directory) == []
+
+def test_token_header_writes_a_cprofile_and_sql_summary(profiled):
+    app, _, directory = profiled
+    app.test_client().get('/work', headers={'X-Profile': 'secret'})
+
+    [summary] = _summaries(directory)
+    assert summary['endpoint'] == 'work' and summary['mode'] == 'cprofile'
+    assert summary['sql'][0]['statement'] == 'SELECT 1'
+    assert summary['sql_count'] == 3
+    assert os.path.exists(os.path.join(directory, summary['profile']))
+
+def test_sample_mode_writes_collapsed_stacks(profiled):
+    app, _, directory = profiled
+    app.test_client().get('/work', headers={'X-Profile': 'sample:secret'})
+
+    [summary] = _summaries(directory)
+    assert summary['mode'] == 'sample'
+    assert summary['profile'].endswith('.collapsed')
+
+def test_sampling_is_limited_to_the_chosen_endpoints(profiled):
+    app, profiler, directory = profiled
+    profiler.sample_rate = 1.0
+    profiler.endpoints = {'other'}
+    app.test_client().get('/work')
+    assert _summaries(directory) == []
+
+    profiler.endpoints = None
+    app.test_client().get('/work')
+    assert len(_summaries(directory)) == 1
+
+def test_disabled_profiler_installs_no_hooks():
+    app = Flask(__name__)
+    RequestProfiler().init_app(app, create_engine('sqlite://'))
+    assert app.before_request_funcs == {}
+
+def test_stack_sampler_counts_stacks(tmp_path):
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            sum(range(1000))
+    worker = threading.Thread(target=busy)
+    worker.start()
+    sampler = StackSampler(worker.ident, interval=0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    done.set()
+    worker.join()
+
+    sampler.write(str(tmp_path / 'out.collapsed'))
+    lines = (tmp_path / 'out.collapsed').read_text().splitlines()
+    assert lines and all('busy (test_profiling.py' in line for line in lines)
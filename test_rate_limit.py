@@ -0,0 +1,70 @@
+import pytest
+
+from rate_limit import MemoryBackend, SQLiteBackend, rate_limiter
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'ratelimit.db'))
+
+def test_burst_then_throttle_then_refill(backend):
+    capacity, rate = 3, 0.5  # 3 requests, then one every 2 seconds
+    assert [backend.take('k', capacity, rate, 100.0)[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = backend.take('k', capacity, rate, 100.0)
+    assert not allowed
+    assert retry_after == pytest.approx(2.0)
+
+    assert not backend.take('k', capacity, rate, 101.0)[0]
+    assert backend.take('k', capacity, rate, 102.1)[0]
+    assert not backend.take('k', capacity, rate, 102.2)[0]
+
+    # Idle long enough and the whole burst is available again, but no more
+    assert [backend.take('k', capacity, rate, 1000.0)[0] for _ in range(4)] == [True, True, True, False]
+
+def test_keys_are_independent(backend):
+    assert backend.take('a', 1, 1.0, 0.0)[0]
+    assert not backend.take('a', 1, 1.0, 0.0)[0]
+    assert backend.take('b', 1, 1.0, 0.0)[0]
+
+def test_memory_backend_prunes_the_oldest_keys():
+    backend = MemoryBackend(max_keys=10)
+    for index in range(11):
+        backend.take(f'k{index}', 5, 1.0, float(index))
+    assert len(backend._buckets) <= 6
+    assert 'k10' in backend._buckets and 'k0' not in backend._buckets
+
+def test_sqlite_backend_deletes_refilled_buckets(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'ratelimit.db'), prune_every=1000)
+    for index in range(50):
+        backend.take(f'ip:{index}', 5, 0.5, 100.0)  # each one token short of full for 2s
+    backend.take('busy', 5, 0.5, 100.0)
+    for _ in range(4):
+        backend.take('busy', 5, 0.5, 101.0)  # down to half a token; full again at 110
+
+    assert backend.prune(101.0) == 0
+    assert backend.prune(102.0) == 50
+    assert backend.prune(109.9) == 0
+    assert not backend.take('busy', 5, 0.5, 101.5)[0]  # still limited after the prune
+    assert backend.prune(200.0) == 1
+
+def test_sqlite_backend_prunes_every_n_checks(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'ratelimit.db'), prune_every=10)
+    for index in range(10):
+        backend.take(f'ip:{index}', 2, 1.0, float(index * 10))
+    count = backend._connection().execute('SELECT COUNT(*) FROM bucket').fetchone()[0]
+    assert count == 1  # only the bucket that had not refilled yet at the tenth check
+
+def test_login_is_throttled_per_username(app, clean_db, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'enabled', True)
+    monkeypatch.setattr(rate_limiter, 'backend', MemoryBackend())
+    client = app.test_client()
+    statuses = [client.post('/login', data={'username': 'Admin', 'password': 'wrong'}).status_code
+                for _ in range(6)]
+    assert statuses == [302] * 5 + [429]
+
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert client.post('/login', data={'username': 'student1', 'password': 'student123'}).status_code == 302
@@ -0,0 +1,49 @@
+from datetime import date, datetime
+
+import pytest
+
+from attendance_bitmap import record_marks
+from models import Attendance, Grade, GradeCategory, Student, Teacher, User
+from report_cards import collect_cohort
+
+@pytest.fixture
+def teacher(clean_db):
+    return Teacher.query.join(User).filter(User.username == 'teacher1').one()
+
+def _grade(db, teacher, student_id, name, value, when):
+    category = GradeCategory(name=name, teacher_id=teacher.id, subject_id=teacher.subject_id)
+    db.session.add(category)
+    db.session.flush()
+    db.session.add(Grade(student_id=student_id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                         category_id=category.id, grade=value, date=when))
+
+def _subject(cards, student_id, subject_id):
+    card = next(card for card in cards if card['student_id'] == student_id)
+    return next(subject for subject in card['subjects'] if subject['subject_id'] == subject_id)
+
+def test_cards_only_count_the_terms_grades_and_attendance(clean_db, teacher):
+    student = Student.query.filter_by(student_id='S001').one()
+    _grade(clean_db, teacher, student.id, 'Spring quiz', 95, datetime(2024, 3, 4, 9, 0))
+    _grade(clean_db, teacher, student.id, 'Spring test', 85, datetime(2024, 6, 30, 23, 59))
+    _grade(clean_db, teacher, student.id, 'Autumn quiz', 55, datetime(2024, 7, 1, 0, 0))
+    day = date(2024, 9, 2)
+    clean_db.session.add(Attendance(student_id=student.id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                    date=day, status='late'))
+    record_marks(teacher.subject_id, day, [(student.id, 'late')])
+    clean_db.session.commit()
+
+    spring = _subject(collect_cohort('2024-T1'), 'S001', teacher.subject_id)
+    assert [grade['category'] for grade in spring['grades']] == ['Spring quiz', 'Spring test']
+    assert (spring['average'], spring['letter']) == (90, 'A')
+    assert spring['attendance']['total'] == 0
+
+    autumn = _subject(collect_cohort('2024-T2'), 'S001', teacher.subject_id)
+    assert [grade['grade'] for grade in autumn['grades']] == [55]
+    assert autumn['letter'] == 'F'
+    assert (autumn['attendance']['late'], autumn['attendance']['total']) == (1, 1)
+
+def test_filters_narrow_the_cohort(clean_db, teacher):
+    cards = collect_cohort('2024-T2', subject_id=teacher.subject_id)
+    assert [card['student_id'] for card in cards] == ['S002', 'S003', 'S001']
+    assert all(subject['average'] is None for card in cards for subject in card['subjects'])
+    assert collect_cohort('2024-T2', class_id=12345) == []
@@ -0,0 +1,62 @@
+from sqlalchemy import event
+
+from models import Student, StudentSubject, Class, ClassStudent, Teacher, User
+from roster_cache import roster_cache
+
+def _teacher(username='teacher1'):
+    return Teacher.query.join(User).filter(User.username == username).one()
+
+def _count_queries(db):
+    counter = {'n': 0}
+
+    def count(*args):
+        counter['n'] += 1
+    event.listen(db.engine, 'before_cursor_execute', count)
+    return counter, lambda: event.remove(db.engine, 'before_cursor_execute', count)
+
+def test_roster_is_served_from_cache(clean_db):
+    subject_id = _teacher().subject_id
+    first = roster_cache.get(subject_id)
+    assert [entry.student_id for entry in first] == ['S002', 'S003', 'S001']  # by last name
+
+    counter, stop = _count_queries(clean_db)
+    try:
+        assert roster_cache.get(subject_id) is first
+    finally:
+        stop()
+    assert counter['n'] == 0
+
+def test_enrollment_commit_invalidates(clean_db):
+    subject_id = _teacher().subject_id
+    student = Student.query.filter_by(student_id='S001').one()
+    before = roster_cache.get(subject_id)
+
+    link = StudentSubject.query.filter_by(student_id=student.id, subject_id=subject_id).one()
+    clean_db.session.delete(link)
+    clean_db.session.flush()
+    clean_db.session.rollback()
+    assert roster_cache.get(subject_id) is before  # rolled back: the cache survives
+
+    link = StudentSubject.query.filter_by(student_id=student.id, subject_id=subject_id).one()
+    clean_db.session.delete(link)
+    clean_db.session.commit()
+    assert [entry.student_id for entry in roster_cache.get(subject_id)] == ['S002', 'S003']
+
+def test_class_rosters_are_cached_separately(clean_db):
+    teacher = _teacher()
+    section = Class(name='A', teacher_id=teacher.id, subject_id=teacher.subject_id)
+    clean_db.session.add(section)
+    clean_db.session.flush()
+    student = Student.query.filter_by(student_id='S002').one()
+    clean_db.session.add(ClassStudent(class_id=section.id, student_id=student.id))
+    clean_db.session.commit()
+
+    assert [entry.student_id for entry in roster_cache.get(teacher.subject_id, section.id)] == ['S002']
+    assert len(roster_cache.get(teacher.subject_id)) == 3
+
+def test_roster_endpoint_pages_the_cached_roster(login):
+    client = login('teacher1', 'teacher123')
+    page = client.get('/teacher/attendance/roster?per_page=2&page=2').get_json()
+    assert page['total'] == 3
+    assert [student['student_id'] for student in page['students']] == ['S001']
+    assert page['students'][0]['status'] is None
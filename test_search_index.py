@@ -0,0 +1,42 @@
+import pytest
+
+import search_index
+from models import Student, Subject, StudentSubject, User
+
+def test_build_match_makes_prefix_terms():
+    assert search_index.build_match('Jan  smi') == '"jan"* "smi"*'
+    assert search_index.build_match('jane.smith@school.com') == '"jane.smith@school.com"*'
+    assert search_index.build_match('"; DROP') == '"drop"*'
+    assert search_index.build_match('!!') == ''
+
+def test_search_ranks_and_filters(clean_db):
+    results = search_index.search('smi')
+    assert [(row['kind'], row['student_id']) for row in results] == [('student', 'S001')]
+    assert {row['kind'] for row in search_index.search('teacher')} == {'teacher'}
+    assert search_index.search('teacher', kind='student') == []
+
+def test_triggers_keep_the_index_current(clean_db):
+    student = Student.query.filter_by(student_id='S002').one()
+    student.last_name = 'Zimmerman'
+    clean_db.session.commit()
+    assert [row['ref_id'] for row in search_index.search('zimm')] == [student.id]
+    assert search_index.search('doe') == []
+
+    clean_db.session.get(User, student.user_id).username = 'johnny'
+    clean_db.session.commit()
+    assert [row['username'] for row in search_index.search('johnny')] == ['johnny']
+
+def test_subject_filter_limits_to_the_roster(clean_db):
+    subject = Subject.query.order_by(Subject.id).first()
+    student = Student.query.filter_by(student_id='S003').one()
+    StudentSubject.query.filter_by(student_id=student.id, subject_id=subject.id).delete()
+    clean_db.session.commit()
+
+    assert search_index.search('alice') != []
+    assert search_index.search('alice', kind='student', subject_id=subject.id) == []
+
+@pytest.mark.parametrize('limit, expected', [(-1, 1), (0, 1), (2, 2), (1000, 3)])
+def test_search_endpoint_clamps_the_limit(login, limit, expected):
+    client = login('admin', 'admin123')
+    response = client.get(f'/search?q=s00&kind=student&limit={limit}').get_json()
+    assert len(response['results']) == expected
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+import slow_queries
+from slow_queries import SlowQueryLog, normalize, param_shape, scans_watched_table, shape_id
+
+def test_normalize_groups_statements_by_shape():
+    first = normalize("SELECT * FROM grade WHERE student_id IN (?, ?, ?) AND note = 'it''s'")
+    second = normalize("SELECT *  FROM grade\n WHERE student_id IN (?,?) AND note = 'x'")
+    assert first == second == "SELECT * FROM grade WHERE student_id IN (?...) AND note = '?'"
+    assert shape_id(first) == shape_id(second)
+
+def test_param_shape_never_records_values():
+    assert param_shape((1, 'Jane', None)) == '(int, str, NoneType)'
+    assert param_shape({'name': 'Jane'}) == '{name: str}'
+    assert param_shape([(1, 'a'), (2, 'b')], executemany=True) == '2 x (int, str)'
+
+def test_scans_of_watched_tables_are_flagged():
+    assert scans_watched_table('SCAN attendance')
+    assert not scans_watched_table('SEARCH attendance USING INDEX ix_attendance_subject_date (subject_id=?)')
+    assert not scans_watched_table('SCAN attendance_daily')
+
+@pytest.fixture
+def logged(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_PATH=str(tmp_path / 'slow.db'))
+    engine = create_engine(f'sqlite:///{tmp_path / "app.db"}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE attendance (id INTEGER PRIMARY KEY, status TEXT)'))
+    log = SlowQueryLog()
+    log.init_app(app, engine)
+    return engine, str(tmp_path / 'slow.db')
+
+def test_slow_statements_are_logged_with_their_plan_once(logged, capsys):
+    engine, path = logged
+    with engine.connect() as conn:
+        for status in ('present', 'absent'):
+            conn.execute(text('SELECT COUNT(*) FROM attendance WHERE status = :status'), {'status': status})
+
+    log = sqlite3.connect(path)
+    shapes = log.execute('SELECT statement, plan FROM statement_shape WHERE statement LIKE ?',
+                         ('%FROM attendance%',)).fetchall()
+    assert len(shapes) == 1
+    assert 'SCAN attendance' in shapes[0][1]
+    rows = log.execute('SELECT endpoint, param_shape FROM slow_statement s JOIN statement_shape p '
+                       'ON p.shape = s.shape WHERE p.statement LIKE ?', ('%FROM attendance%',)).fetchall()
+    assert rows == [('thread:MainThread', '(str)')] * 2
+
+    slow_queries.report(path, top=1, scans_only=True)
+    out = capsys.readouterr().out
+    assert '2 slow' in out and '[full scan]' in out
+
+def test_disabled_log_installs_no_listeners(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SLOW_QUERY_LOG=False, SLOW_QUERY_LOG_PATH=str(tmp_path / 'slow.db'))
+    SlowQueryLog().init_app(app, create_engine('sqlite://'))
+    assert not (tmp_path / 'slow.db').exists()
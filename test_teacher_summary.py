@@ -0,0 +1,127 @@
+from datetime import date
+
+import pytest
+
+import attendance_rollup
+import teacher_summary as summaries
+from models import Attendance, Grade, GradeCategory, Student, StudentSubject, Teacher, User
+from teacher_summary import teacher_summary
+
+def _teacher(username='teacher1'):
+    return Teacher.query.join(User).filter(User.username == username).one()
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Teachers summarised by compute(), in call order"""
+    calls = []
+    compute = summaries.compute
+
+    def counting(teacher, today):
+        calls.append(teacher.id)
+        return compute(teacher, today)
+    monkeypatch.setattr(summaries, 'compute', counting)
+    return calls
+
+def _mark(db, teacher, student_ids, status='present'):
+    today = date.today()
+    for student_id in student_ids:
+        db.session.add(Attendance(student_id=student_id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                  date=today, status=status))
+    attendance_rollup.refresh_day(teacher.subject_id, today)
+    db.session.commit()
+
+def test_figures_follow_the_days_attendance_and_grades(clean_db):
+    teacher = _teacher()
+    students = [student.id for student in Student.query.order_by(Student.id)]
+    summary = summaries.compute(teacher, date.today())
+    assert summary['roster_size'] == 3
+    assert (summary['today']['status'], summary['average'], summary['categories']) == ('not_taken', None, 0)
+
+    _mark(clean_db, teacher, students[:2])
+    assert summaries.compute(teacher, date.today())['today']['status'] == 'partial'
+    _mark(clean_db, teacher, students[2:], status='absent')
+    summary = summaries.compute(teacher, date.today())
+    assert (summary['today']['status'], summary['today']['present'], summary['today']['absent']) == ('complete', 2, 1)
+    assert summary['week_rate'] == pytest.approx(66.7)
+
+    category = GradeCategory(name='Quiz', teacher_id=teacher.id, subject_id=teacher.subject_id)
+    clean_db.session.add(category)
+    clean_db.session.flush()
+    for student_id, value in zip(students[:2], (90, 70)):
+        clean_db.session.add(Grade(student_id=student_id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                                   category_id=category.id, grade=value))
+    clean_db.session.commit()
+    summary = summaries.compute(teacher, date.today())
+    assert (summary['average'], summary['letter']) == (80, 'B')
+    assert summary['missing_grades'] == [{'id': category.id, 'name': 'Quiz', 'graded': 2, 'missing': 1}]
+
+def test_summary_is_cached_until_the_teacher_writes(clean_db, computed):
+    first, second = _teacher('teacher1'), _teacher('teacher2')
+    cached = teacher_summary.get(first)
+    teacher_summary.get(second)
+    assert teacher_summary.get(first) is cached
+    assert computed == [first.id, second.id]
+
+    # Another teacher's write leaves this one's entry alone
+    clean_db.session.add(GradeCategory(name='Essay', teacher_id=second.id, subject_id=second.subject_id))
+    clean_db.session.commit()
+    assert teacher_summary.get(first) is cached
+    teacher_summary.get(second)
+    assert computed == [first.id, second.id, second.id]
+
+    _mark(clean_db, first, [Student.query.first().id])
+    assert teacher_summary.get(first)['today']['marked'] == 1
+    assert computed[-1] == first.id
+
+def test_rolled_back_writes_do_not_invalidate(clean_db, computed):
+    teacher = _teacher()
+    cached = teacher_summary.get(teacher)
+    clean_db.session.add(GradeCategory(name='Essay', teacher_id=teacher.id, subject_id=teacher.subject_id))
+    clean_db.session.flush()
+    clean_db.session.rollback()
+    assert teacher_summary.get(teacher) is cached
+
+def test_enrollment_changes_invalidate_every_teacher(clean_db, computed):
+    first, second = _teacher('teacher1'), _teacher('teacher2')
+    teacher_summary.get(first)
+    teacher_summary.get(second)
+    clean_db.session.delete(StudentSubject.query.filter_by(subject_id=first.subject_id).first())
+    clean_db.session.commit()
+
+    assert teacher_summary.get(first)['roster_size'] == 2
+    teacher_summary.get(second)
+    assert computed == [first.id, second.id, first.id, second.id]
+
+def test_mark_changed_covers_bulk_statements(clean_db, computed):
+    teacher = _teacher()
+    teacher_summary.get(teacher)
+    summaries.mark_changed(clean_db.session, teacher.id)
+    clean_db.session.commit()
+    teacher_summary.get(teacher)
+    assert computed == [teacher.id, teacher.id]
+
+def test_entries_expire_after_the_ttl(clean_db, computed, monkeypatch):
+    teacher = _teacher()
+    monkeypatch.setattr(teacher_summary, 'ttl', 0)
+    teacher_summary.get(teacher)
+    teacher_summary.get(teacher)
+    assert computed == [teacher.id, teacher.id]
+
+def test_invalidation_during_compute_is_not_overwritten(clean_db, monkeypatch):
+    teacher = _teacher()
+    compute = summaries.compute
+
+    def racing(teacher, today):
+        summary = compute(teacher, today)
+        teacher_summary.invalidate([teacher.id])  # a commit lands meanwhile
+        return summary
+    monkeypatch.setattr(summaries, 'compute', racing)
+    first = teacher_summary.get(teacher)
+    monkeypatch.setattr(summaries, 'compute', compute)
+    assert teacher_summary.get(teacher) is not first
+
+def test_dashboard_reuses_the_summary(login, computed):
+    client = login('teacher1', 'teacher123')
+    assert client.get('/dashboard').status_code == 200
+    assert client.get('/dashboard').status_code == 200
+    assert computed == [_teacher().id]
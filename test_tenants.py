@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+from flask import Flask, session
+
+import tenants
+from tenants import EngineCache, TenantRouter, _TenantMiddleware, _TenantSessionInterface
+from models import db, User
+
+class _Engine:
+    def __init__(self, name):
+        self.name = name
+        self.disposed = False
+
+    def dispose(self):
+        self.disposed = True
+
+@pytest.mark.parametrize('name', ['north', 'st-marys', 'a', '2024'])
+def test_valid_school_names(name, tmp_path):
+    assert tenants.database_path(name, str(tmp_path)) == str(tmp_path / f'{name}.db')
+
+@pytest.mark.parametrize('name', ['', None, 'North', '../north', 'north/db', '-north', 'north-', 'a' * 64])
+def test_invalid_school_names(name):
+    with pytest.raises(ValueError):
+        tenants.database_path(name)
+
+def test_school_names_lists_valid_databases(tmp_path):
+    for entry in ('north.db', 'south.db', 'Bad Name.db', 'notes.txt', 'north.db-wal'):
+        (tmp_path / entry).write_text('')
+    assert tenants.school_names(str(tmp_path)) == ['north', 'south']
+    assert tenants.school_names(str(tmp_path / 'missing')) == []
+
+def test_engine_cache_evicts_the_least_recently_used():
+    cache = EngineCache(size=2)
+    a = cache.get('a', lambda: _Engine('a'))
+    b = cache.get('b', lambda: _Engine('b'))
+    assert cache.get('a', lambda: pytest.fail('reopened')) is a
+    c = cache.get('c', lambda: _Engine('c'))
+
+    assert 'b' not in cache and b.disposed
+    assert 'a' in cache and 'c' in cache and not a.disposed
+    assert (len(cache), cache.evictions) == (2, 1)
+
+    cache.clear()
+    assert len(cache) == 0 and a.disposed and c.disposed
+
+def test_engine_cache_keeps_the_first_of_two_racing_opens():
+    cache = EngineCache()
+    extra = _Engine('late')
+
+    def slow_factory():
+        # Another thread finishes opening the same school meanwhile
+        first = threading.Thread(target=cache.get, args=('a', lambda: _Engine('first')))
+        first.start()
+        first.join()
+        return extra
+
+    assert cache.get('a', slow_factory).name == 'first'
+    assert extra.disposed and len(cache) == 1
+
+@pytest.fixture
+def subdomain_router():
+    router = TenantRouter()
+    router.mode, router.domain = 'subdomain', 'gams.example.org'
+    return router
+
+@pytest.mark.parametrize('host, expected', [
+    ('north.gams.example.org', 'north'),
+    ('NORTH.gams.example.org:8443', 'north'),
+    ('www.gams.example.org', None),
+    ('gams.example.org', None),
+    ('north.other.org', None),
+    ('bad_name.gams.example.org', None),
+])
+def test_subdomain_routing(subdomain_router, host, expected):
+    assert subdomain_router.tenant_for({'HTTP_HOST': host}) == expected
+
+def test_path_routing_moves_the_prefix_into_script_name():
+    router = TenantRouter()
+    router.mode = 'path'
+    environ = {'PATH_INFO': '/s/north/dashboard', 'SCRIPT_NAME': ''}
+    assert router.tenant_for(environ) == 'north'
+    assert (environ['SCRIPT_NAME'], environ['PATH_INFO']) == ('/s/north', '/dashboard')
+
+    assert router.tenant_for({'PATH_INFO': '/dashboard'}) is None
+    assert router.tenant_for({'PATH_INFO': '/s/North/dashboard'}) is None
+    assert TenantRouter().tenant_for({'PATH_INFO': '/s/north/'}) is None  # routing off
+
+@pytest.fixture
+def school_app(tmp_path):
+    for name in ('north', 'south'):
+        (tmp_path / f'{name}.db').write_text('')
+    router = TenantRouter()
+    router.mode, router.directory = 'path', str(tmp_path)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = _TenantSessionInterface()
+    app.wsgi_app = _TenantMiddleware(app.wsgi_app, router)
+
+    @app.route('/login')
+    def login():
+        session['user'] = f'user of {tenants.current()}'
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return session.get('user', 'nobody')
+
+    return app
+
+def test_each_school_has_its_own_session_cookie(school_app):
+    client = school_app.test_client()
+    client.get('/s/north/login')
+    cookie = client.get_cookie('session-north')
+    assert cookie is not None and client.get_cookie('session') is None
+    assert client.get('/s/north/whoami').text == 'user of north'
+    assert client.get('/s/south/whoami').text == 'nobody'
+    assert client.get('/whoami').text == 'nobody'
+
+    # A cookie copied across by hand is signed for the wrong school
+    client.set_cookie('session-south', cookie.value)
+    assert client.get('/s/south/whoami').text == 'nobody'
+
+def test_unknown_schools_get_a_404(school_app):
+    assert school_app.test_client().get('/s/east/whoami').status_code == 404
+
+def test_use_routes_the_session_to_the_school(clean_db, app):
+    tenants.prepare(app, 'testschool', seed=False)
+    assert tenants.tenant_router.exists('testschool')
+    with tenants.use('testschool'), app.app_context():
+        assert tenants.current() == 'testschool'
+        assert db.engine is tenants.tenant_router.engine('testschool')
+        assert User.query.count() == 0
+    assert tenants.current() is None
+    assert User.query.filter_by(username='admin').count() == 1
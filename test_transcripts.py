@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+
+import transcripts
+from models import Grade, GradeCategory, Student, Teacher, User
+
+def _teacher(username):
+    return Teacher.query.join(User).filter(User.username == username).one()
+
+def _grade(db, username, student_id, value, when):
+    teacher = _teacher(username)
+    category = GradeCategory(name=f'Test {when:%Y-%m-%d}', teacher_id=teacher.id, subject_id=teacher.subject_id)
+    db.session.add(category)
+    db.session.flush()
+    db.session.add(Grade(student_id=student_id, teacher_id=teacher.id, subject_id=teacher.subject_id,
+                         category_id=category.id, grade=value, date=when))
+
+@pytest.fixture
+def student(clean_db):
+    return Student.query.filter_by(student_id='S001').one().id
+
+def test_each_term_freezes_its_own_grades(clean_db, student):
+    _grade(clean_db, 'teacher1', student, 95, datetime(2024, 3, 4))   # A
+    _grade(clean_db, 'teacher1', student, 75, datetime(2024, 9, 2))   # C
+    _grade(clean_db, 'teacher2', student, 85, datetime(2024, 9, 3))   # B
+    clean_db.session.commit()
+
+    assert transcripts.close_term('2024-T1') == 3
+    transcripts.close_term('2024-T2')
+    clean_db.session.commit()
+    assert transcripts.is_closed('2024-T1')
+
+    record = transcripts.transcript(student)
+    assert [(term['term'], term['gpa']) for term in record['terms']] == [('2024-T1', 4.0), ('2024-T2', 2.5)]
+    letters = {subject['subject_id']: subject['letter'] for subject in record['terms'][0]['subjects']}
+    assert letters == {_teacher('teacher1').subject_id: 'A', _teacher('teacher2').subject_id: None}
+    # Weighted by graded subjects (9 points over 3), not the mean of the two term GPAs
+    assert record['terms'][0]['cumulative_gpa'] == 4.0
+    assert record['cumulative_gpa'] == 3.0
+
+def test_reclosing_a_term_rolls_later_totals_forward(clean_db, student):
+    _grade(clean_db, 'teacher1', student, 95, datetime(2024, 3, 4))
+    _grade(clean_db, 'teacher1', student, 75, datetime(2024, 9, 2))
+    clean_db.session.commit()
+    transcripts.close_term('2024-T1')
+    transcripts.close_term('2024-T2')
+    clean_db.session.commit()
+
+    _grade(clean_db, 'teacher2', student, 65, datetime(2024, 5, 6))   # D, given late for T1
+    with pytest.raises(ValueError):
+        transcripts.close_term('2024-T1')
+    transcripts.close_term('2024-T1', force=True)
+    clean_db.session.commit()
+
+    record = transcripts.transcript(student)
+    assert [term['gpa'] for term in record['terms']] == [2.5, 2.0]
+    assert record['cumulative_gpa'] == 2.33
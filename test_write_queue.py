@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from models import db, GradeCategory, Teacher
+from write_queue import write_queue
+
+def _add_category(name, teacher_id, subject_id):
+    if name == 'bad':
+        raise ValueError('bad category')
+    category = GradeCategory(name=name, teacher_id=teacher_id, subject_id=subject_id)
+    db.session.add(category)
+    db.session.flush()
+    return category.id
+
+@pytest.fixture
+def teacher(clean_db):
+    teacher = Teacher.query.first()
+    return teacher.id, teacher.subject_id
+
+def test_disabled_queue_commits_in_the_caller(clean_db, teacher):
+    assert not write_queue.enabled
+    category_id = write_queue.run(_add_category, 'Quiz', *teacher)
+    clean_db.session.rollback()
+    assert clean_db.session.get(GradeCategory, category_id).name == 'Quiz'
+
+    with pytest.raises(ValueError):
+        write_queue.run(_add_category, 'bad', *teacher)
+    assert GradeCategory.query.count() == 1
+
+def test_enabled_queue_groups_jobs_and_isolates_failures(app, clean_db, teacher, monkeypatch):
+    monkeypatch.setattr(write_queue, 'enabled', True)
+    monkeypatch.setattr(write_queue, 'window', 0.2)
+    commits = []
+
+    def count_commit(conn):
+        commits.append(1)
+    event.listen(clean_db.engine, 'commit', count_commit)
+    names = [f'Quiz {index}' for index in range(8)] + ['bad']
+    results = {}
+    start = threading.Barrier(len(names))
+
+    def submit(name):
+        with app.app_context():
+            start.wait()
+            try:
+                results[name] = write_queue.run(_add_category, name, *teacher)
+            except Exception as e:
+                results[name] = e
+
+    threads = [threading.Thread(target=submit, args=(name,)) for name in names]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        event.remove(clean_db.engine, 'commit', count_commit)
+
+    assert isinstance(results.pop('bad'), ValueError)
+    assert all(isinstance(category_id, int) for category_id in results.values())
+    assert len(commits) < len(names) - 1  # several jobs shared a commit
+    assert sorted(c.name for c in GradeCategory.query) == sorted(results)
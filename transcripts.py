@@ -0,0 +1,138 @@
+import argparse
+import json
+from datetime import datetime
+from models import db, TranscriptTerm, TermClosure
+
+# Unweighted four-point scale over the letter grades from get_letter_grade()
+GRADE_POINTS = {'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}
+
+ID_CHUNK = 500
+
+def is_closed(term):
+    return db.session.get(TermClosure, term) is not None
+
+def close_term(term, force=False):
+    """Freeze every student's subject results for `term` into transcript rows.
+
+    Only grades given and attendance taken during the term count.
+    Cumulative totals are carried forward from each student's earlier
+    terms; with force an already closed term is recomputed, and the
+    cumulative totals of any later terms are rolled forward again.
+    The caller commits.
+    """
+    import report_cards
+
+    closure = db.session.get(TermClosure, term)
+    if closure and not force:
+        raise ValueError(f"Term {term} is already closed")
+
+    cards = report_cards.collect_cohort(term)
+    rows = {}
+    for card in cards:
+        results, points, graded = [], 0.0, 0
+        present = recorded = 0
+        for subject in card['subjects']:
+            grade_points = GRADE_POINTS.get(subject['letter'])
+            results.append([
+                subject['subject_id'],
+                subject['name'],
+                round(subject['average'], 2) if subject['average'] is not None else None,
+                subject['letter'],
+                grade_points,
+            ])
+            if grade_points is not None:
+                points += grade_points
+                graded += 1
+            present += subject['attendance']['present']
+            recorded += subject['attendance']['total']
+        rows[card['id']] = TranscriptTerm(
+            student_id=card['id'],
+            term=term,
+            results=json.dumps(results, separators=(',', ':')),
+            points=points,
+            graded=graded,
+            present_days=present,
+            recorded_days=recorded,
+        )
+
+    TranscriptTerm.query.filter_by(term=term).delete()
+    db.session.add_all(rows.values())
+    db.session.flush()
+
+    ids = list(rows)
+    for start in range(0, len(ids), ID_CHUNK):
+        _roll_cumulative(ids[start:start + ID_CHUNK])
+
+    if closure is None:
+        closure = TermClosure(term=term)
+        db.session.add(closure)
+    closure.closed_at = datetime.utcnow()
+    closure.students = len(rows)
+    return len(rows)
+
+def _roll_cumulative(student_ids):
+    """Recompute running totals across each student's terms, oldest first"""
+    running = {}
+    for row in TranscriptTerm.query.filter(TranscriptTerm.student_id.in_(student_ids)) \
+            .order_by(TranscriptTerm.student_id, TranscriptTerm.term):
+        points, graded = running.get(row.student_id, (0.0, 0))
+        points += row.points
+        graded += row.graded
+        row.cumulative_points = points
+        row.cumulative_graded = graded
+        running[row.student_id] = (points, graded)
+
+def gpa(points, graded):
+    return round(points / graded, 2) if graded else None
+
+def transcript(student_id):
+    """All closed terms for a student, and the cumulative GPA, from one indexed read"""
+    terms = []
+    last = None
+    for row in TranscriptTerm.query.filter_by(student_id=student_id).order_by(TranscriptTerm.term):
+        terms.append({
+            'term': row.term,
+            'gpa': gpa(row.points, row.graded),
+            'cumulative_gpa': gpa(row.cumulative_points, row.cumulative_graded),
+            'attendance': (row.present_days / row.recorded_days) * 100 if row.recorded_days else None,
+            'subjects': [
+                {'subject_id': subject_id, 'name': name, 'average': average, 'letter': letter, 'points': points}
+                for subject_id, name, average, letter, points in json.loads(row.results)
+            ],
+        })
+        last = row
+    return {
+        'terms': terms,
+        'cumulative_gpa': gpa(last.cumulative_points, last.cumulative_graded) if last else None,
+    }
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Close terms and view frozen transcripts.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    close_parser = commands.add_parser('close', help='Freeze results for a term, e.g. 2024-T2')
+    close_parser.add_argument('term')
+    close_parser.add_argument('--force', action='store_true', help='Recompute a term that is already closed')
+    show_parser = commands.add_parser('show', help="Print a student's transcript")
+    show_parser.add_argument('student_id', type=int, help='Student row id')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'close':
+            try:
+                count = close_term(args.term, force=args.force)
+                db.session.commit()
+                print(f"Closed {args.term}: froze results for {count} students")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error closing term: {str(e)}")
+                raise
+        else:
+            record = transcript(args.student_id)
+            for term in record['terms']:
+                print(f"{term['term']}: GPA {term['gpa']}, cumulative {term['cumulative_gpa']}")
+                for subject in term['subjects']:
+                    print(f"    {subject['name']:<30} {subject['average'] if subject['average'] is not None else '-':>7} "
+                          f"{subject['letter'] or '-'}")
+            print(f"Cumulative GPA: {record['cumulative_gpa']}")
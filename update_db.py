@@ -1,10 +1,12 @@
 from app import app, db
 from models import GradeCategory
+from migrations import upgrade
 
 def update_database():
     with app.app_context():
         # Create the GradeCategory table
         db.create_all()
+        upgrade(db.engine)
         print("Database updated successfully!")
 
 if __name__ == "__main__":
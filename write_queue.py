@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+import metrics
+import tenants
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'tenant', 'result', 'error', 'done')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.tenant = tenants.current()
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+def _is_locked(error):
+    return isinstance(error, OperationalError) and 'database is locked' in str(error)
+
+class WriteCoordinator:
+    """Funnels mutating work from request threads through one writer thread.
+
+    Jobs are plain callables that use db.session and return plain data;
+    they run in the writer's own app context, so they must not touch the
+    request, and ORM objects from the caller's session may only be read.
+    Jobs arriving within WRITE_QUEUE_WINDOW seconds share one commit, each
+    in its own savepoint so a failing job does not sink the others; a
+    batch spanning several schools commits once per school. When disabled,
+    run() executes the job and commits in the calling thread.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.app = None
+        self.window = 0.01
+        self.max_batch = 64
+        self.timeout = 30.0
+        self.retries = 5
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('WRITE_QUEUE_ENABLED', False)
+        self.window = app.config.get('WRITE_QUEUE_WINDOW', 0.01)
+        self.max_batch = app.config.get('WRITE_QUEUE_MAX_BATCH', 64)
+        self.timeout = app.config.get('WRITE_QUEUE_TIMEOUT', 30.0)
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a committed transaction and return its result"""
+        if not self.enabled:
+            try:
+                result = fn(*args, **kwargs)
+                db.session.commit()
+                return result
+            except Exception:
+                db.session.rollback()
+                raise
+
+        # Hand the caller's pooled connection back while it waits, or a
+        # burst of waiting requests can starve the writer of connections.
+        # Loaded attributes of its objects stay readable once detached.
+        db.session.close()
+        self._ensure_writer()
+        job = _Job(fn, args, kwargs)
+        self._queue.put(job)
+        if not job.done.wait(self.timeout):
+            raise TimeoutError('Timed out waiting for the database writer')
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _ensure_writer(self):
+        # Started lazily so each forked worker process gets its own writer
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._writer, name='db-writer', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _writer(self):
+        with self.app.app_context():
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                by_tenant = {}
+                for job in batch:
+                    by_tenant.setdefault(job.tenant, []).append(job)
+                for tenant, jobs in by_tenant.items():
+                    with tenants.use(tenant):
+                        self._commit_batch(jobs)
+
+    def _commit_batch(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                # Take the write lock up front; it also keeps pysqlite from
+                # committing when the first savepoint is released
+                db.session.execute(text('BEGIN IMMEDIATE'))
+                for job in batch:
+                    job.result, job.error = None, None
+                    try:
+                        with db.session.begin_nested():
+                            job.result = job.fn(*job.args, **job.kwargs)
+                    except Exception as e:
+                        if _is_locked(e):
+                            raise
+                        job.error = e
+                db.session.commit()
+                break
+            except Exception as e:
+                db.session.rollback()
+                if _is_locked(e) and attempt < self.retries:
+                    # Another process holds the lock; redo the whole batch
+                    metrics.record_lock_retry('write_queue')
+                    time.sleep(0.01 * 2 ** attempt)
+                    continue
+                for job in batch:
+                    job.result, job.error = None, e
+                break
+            finally:
+                db.session.remove()
+        for job in batch:
+            job.done.set()
+
+write_queue = WriteCoordinator()